@@ -2,13 +2,16 @@ import copy
 from datetime import datetime, date, time, timedelta
 import numpy as np
 
+from .time_utilities import *
+
 class Bout(object):
 
 	def __init__(self, start_timestamp, end_timestamp):
 
 		#self.label = label
-		self.start_timestamp = start_timestamp
-		self.end_timestamp = end_timestamp
+		# Timestamps taken from a Channel's datetime64 array are kept as datetimes, so Bout arithmetic gives timedeltas
+		self.start_timestamp = to_datetime(start_timestamp)
+		self.end_timestamp = to_datetime(end_timestamp)
 		self.length = self.end_timestamp - self.start_timestamp
 		self.draw_properties = {'lw':0, 'alpha':0.8, 'facecolor':[0.78431,0.78431,0.78431]}
 
@@ -123,9 +123,9 @@ class Bout_Collection(object):
                 channel_list[i].append_data(window.start_timestamp, results[i])
 
         for channel in channel_list:
-            channel.calculate_timeframe()
             channel.data = np.array(channel.data)
-            channel.timestamps = np.array(channel.timestamps)
+            channel.timestamps = to_datetime64(channel.timestamps)
+            channel.calculate_timeframe()
 
         ts = Time_Series(name)
         ts.add_channels(channel_list)
@@ -5,10 +5,7 @@ from struct import *
 from math import *
 import sys
 import re
-from scipy.io.wavfile import write
-import zipfile
 from collections import OrderedDict
-from scipy.interpolate import interp1d
 from bisect import bisect_left, bisect_right
 
 from .Bout  import *
@@ -17,6 +14,213 @@ from .time_utilities import *
 from .pampro_utilities import *
 from .hdf5 import *
 
+class Regular_Timestamps(object):
+    """
+    The timestamps of data sampled at a fixed frequency, generated when they are asked for rather than stored.
+    Sample k after the start is timestamped k/frequency seconds after it, rounded down to the microsecond.
+    gaps is a list of (index, timestamp) pairs, for when sampling stopped and restarted at the given timestamp with the sample at that index.
+    It can be indexed, sliced and iterated like the datetime64 array of timestamps it stands for, and np.asarray() builds that array.
+    """
+
+    dtype = np.dtype("datetime64[us]")
+
+    def __init__(self, start, frequency, length, gaps=[]):
+
+        self.frequency = frequency
+        self.length = int(length)
+
+        # Each segment is a run of regular samples, starting at a data index and a timestamp
+        self.segment_indices = np.array([0] + [index for index, timestamp in gaps], dtype=np.int64)
+        self.segment_starts = to_datetime64([start] + [timestamp for index, timestamp in gaps]).astype(np.int64)
+
+        # The same as Python ints, for looking up one timestamp at a time
+        self.segment_start_list = self.segment_starts.tolist()
+
+        if np.any(np.diff(self.segment_indices) <= 0) or np.any(np.diff(self.segment_starts) <= 0):
+            raise Exception("Gaps in regular timestamps must be in order of index and time.")
+
+        self.start = to_datetime(self.segment_starts.astype("datetime64[us]")[0])
+
+    @property
+    def gaps(self):
+        """ The (index, timestamp) pairs at which sampling restarted after a gap. """
+
+        return [(int(index), to_datetime(np.datetime64(int(start), "us"))) for index, start in zip(self.segment_indices[1:], self.segment_starts[1:])]
+
+    @property
+    def shape(self):
+
+        return (self.length,)
+
+    def microseconds_after(self, counts):
+        """ The microseconds from the start of a segment to the sample counts after it. """
+
+        counts = np.asarray(counts, dtype=np.int64)
+
+        # Integer arithmetic is exact when the frequency is a whole number of hertz
+        if float(self.frequency).is_integer():
+            return counts * 1000000 // int(self.frequency)
+        else:
+            return np.floor(counts * 1000000 / self.frequency).astype(np.int64)
+
+    def at(self, indices):
+        """ The timestamps of the given data indices, as datetime64. """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        segment = np.searchsorted(self.segment_indices, indices, side="right") - 1
+        microseconds = self.segment_starts[segment] + self.microseconds_after(indices - self.segment_indices[segment])
+
+        return np.asarray(microseconds).astype("datetime64[us]")
+
+    def get_index(self, timestamp):
+        """
+        The index of the first sample timestamped at or after timestamp, as np.searchsorted() would find in the full array of timestamps.
+        """
+
+        # This is called for every window summarised, so it sticks to Python integers rather than numpy scalars
+        if isinstance(timestamp, datetime):
+            microseconds = (timestamp - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+        else:
+            microseconds = to_microseconds(timestamp)
+
+        starts = self.segment_start_list
+        segment = bisect_right(starts, microseconds) - 1
+
+        if segment < 0:
+            return 0
+
+        elapsed = microseconds - starts[segment]
+
+        if float(self.frequency).is_integer():
+            # The first count with count * 1000000 // frequency >= elapsed
+            count = -(-elapsed * int(self.frequency) // 1000000)
+        else:
+            # Estimate the number of samples into the segment, and correct any rounding of that estimate
+            count = max(0, int(ceil(elapsed * self.frequency / 1000000)))
+            while count > 0 and int(self.microseconds_after(count-1)) >= elapsed:
+                count -= 1
+            while int(self.microseconds_after(count)) < elapsed:
+                count += 1
+
+        # A timestamp inside a gap points at the first sample after it
+        if segment+1 < len(starts):
+            end = int(self.segment_indices[segment+1])
+        else:
+            end = self.length
+
+        return min(int(self.segment_indices[segment]) + count, end)
+
+    def get_indices(self, timestamps):
+        """
+        Vectorised get_index(), for an array of timestamps.
+        """
+
+        microseconds = to_datetime64(np.atleast_1d(timestamps)).astype(np.int64)
+
+        segment = np.searchsorted(self.segment_starts, microseconds, side="right") - 1
+        before_start = segment < 0
+        segment = np.maximum(segment, 0)
+
+        elapsed = microseconds - self.segment_starts[segment]
+
+        if float(self.frequency).is_integer():
+            count = -(-elapsed * int(self.frequency) // 1000000)
+        else:
+            count = np.maximum(0, np.ceil(elapsed * self.frequency / 1000000)).astype(np.int64)
+            while True:
+                too_far = (count > 0) & (self.microseconds_after(count-1) >= elapsed)
+                if not np.any(too_far):
+                    break
+                count -= too_far
+            while True:
+                too_short = self.microseconds_after(count) < elapsed
+                if not np.any(too_short):
+                    break
+                count += too_short
+
+        # A timestamp inside a gap points at the first sample after it
+        ends = np.append(self.segment_indices[1:], self.length)[segment]
+        indices = np.minimum(self.segment_indices[segment] + count, ends)
+
+        return np.where(before_start, 0, indices)
+
+    def append(self, other):
+        """
+        Return the Regular_Timestamps of these samples followed by those of other, or None if they are at different frequencies.
+        """
+
+        if other.frequency != self.frequency:
+            return None
+
+        if len(self) == 0:
+            return Regular_Timestamps(other.start, other.frequency, other.length, other.gaps)
+
+        # other carries straight on from the last segment if it starts where the next sample would, on a whole microsecond
+        count = self.length - int(self.segment_indices[-1])
+        carries_on = np.datetime64(other.start, "us") == self.at(self.length) and (count * 1000000 / self.frequency).is_integer()
+
+        gaps = self.gaps
+        for index, start in [(0, other.start)] + other.gaps:
+            if index > 0 or not carries_on:
+                gaps.append((self.length + index, start))
+
+        return Regular_Timestamps(self.start, self.frequency, self.length + other.length, gaps)
+
+    def __len__(self):
+
+        return self.length
+
+    def __getitem__(self, key):
+
+        if isinstance(key, slice):
+            return self.at(np.arange(*key.indices(self.length)))
+
+        indices = np.asarray(key)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+
+        indices = np.where(indices < 0, indices + self.length, indices)
+        if np.any((indices < 0) | (indices >= self.length)):
+            raise IndexError("Index {} is out of range for {} timestamps.".format(key, self.length))
+
+        timestamps = self.at(indices)
+        return timestamps[()] if timestamps.ndim == 0 else timestamps
+
+    def __iter__(self):
+
+        # Generate the timestamps a block at a time, so iterating doesn't build them all at once
+        for block_start in range(0, self.length, 100000):
+            for timestamp in self.at(np.arange(block_start, min(block_start + 100000, self.length))):
+                yield timestamp
+
+    def __array__(self, dtype=None, copy=None):
+
+        timestamps = self.at(np.arange(self.length))
+        return timestamps if dtype is None else timestamps.astype(dtype)
+
+def regular_timestamps(timestamps, frequency):
+    """
+    Describe an array of timestamps as Regular_Timestamps at the given frequency, with a gap wherever the spacing breaks.
+    Returns None if the timestamps are not exactly those Regular_Timestamps would generate.
+    """
+
+    timestamps = to_datetime64(timestamps)
+
+    if len(timestamps) == 0:
+        return None
+
+    # Consecutive regular timestamps are always the period apart, or 1 microsecond more when the period isn't whole
+    period = int(1000000 // frequency)
+    steps = np.diff(timestamps.astype(np.int64))
+    restarts = np.flatnonzero((steps < period) | (steps > period + 1)) + 1
+
+    regular = Regular_Timestamps(timestamps[0], frequency, len(timestamps), [(int(i), timestamps[i]) for i in restarts])
+
+    if not np.array_equal(np.asarray(regular), timestamps):
+        return None
+
+    return regular
+
 class Channel(object):
 
     def __init__(self, name):
@@ -41,7 +245,22 @@ class Channel(object):
         return copy.deepcopy(self)
 
     def set_contents(self, data, timestamps, timestamp_policy="normal"):
-        """ Override current contents of data and timestamp arrays, and update timeframe accordingly. """
+        """
+        Override current contents of data and timestamp arrays, and update timeframe accordingly.
+        Unless they are offsets, timestamps are stored as a datetime64[us] array.
+        Regular_Timestamps are kept as they are, and imply the "regular" timestamp policy.
+        """
+
+        if isinstance(timestamps, Regular_Timestamps):
+            timestamp_policy = "regular"
+            self.frequency = timestamps.frequency
+            self.start = timestamps.start
+
+        elif timestamp_policy == "regular":
+            raise Exception("Regularly timestamped data needs its timestamps given as Regular_Timestamps.")
+
+        elif timestamp_policy != "offset":
+            timestamps = to_datetime64(timestamps)
 
         self.data = data
         self.timestamps = timestamps
@@ -57,50 +276,92 @@ class Channel(object):
         """
 
         # This allows us to call self.get_index_appropriately() rather than be slowed down by various if statements.
-        get_index_methods = {"normal":self.get_data_index, "sparse":self.get_sparse_data_index, "offset":self.get_offset_data_index}
+        get_index_methods = {"normal":self.get_data_index, "sparse":self.get_sparse_data_index, "offset":self.get_offset_data_index, "regular":self.get_regular_data_index}
         self.get_index_appropriately = get_index_methods[self.timestamp_policy]
 
-    def set_timestamp_policy(self, new_timestamp_policy):
+        get_indices_methods = {"normal":self.get_data_indices, "sparse":self.get_sparse_data_indices, "offset":self.get_offset_data_indices, "regular":self.get_regular_data_indices}
+        self.get_indices_appropriately = get_indices_methods[self.timestamp_policy]
+
+    def set_timestamp_policy(self, new_timestamp_policy, page_size=None):
         """
-        Not yet implemented.
+        Convert the timestamps of this Channel to a different timestamp_policy: "normal", "sparse", "offset" or "regular".
+        Every sample is first given its own timestamp, then those are expressed the new way:
+            sparse timestamps are spread evenly over the samples of each page, as hdf5.convert() does
+            offset timestamps are whole milliseconds after self.start, rounded down
+            regular timestamps require the normal ones to be exactly regular at self.frequency, see regular_timestamps()
+        Converting to sparse keeps the timestamp of every page_size-th sample and the last one, where page_size defaults to 1 second of samples.
         """
 
         if self.timestamp_policy == new_timestamp_policy:
             print("Channel {} is already timestamped according to policy {}".format(self.name, self.timestamp_policy))
+            return
 
-        else:
+        if new_timestamp_policy not in ["normal", "sparse", "offset", "regular"]:
+            raise Exception("Unknown timestamp policy {}, the supported policies are: normal, sparse, offset, regular.".format(new_timestamp_policy))
+
+        microseconds = self.microseconds_per_sample()
+        timestamps = microseconds.astype("datetime64[us]")
+        indices = []
+
+        if new_timestamp_policy == "sparse":
 
-            if self.timestamp_policy == "sparse":
+            if page_size is None:
+                page_size = int(round(self.frequency)) if hasattr(self, "frequency") else 100
 
-                if new_timestamp_policy == "normal":
-                    print("sparse -> normal not yet implemented.")
+            indices = np.unique(np.append(np.arange(0, len(microseconds), max(1, int(page_size))), len(microseconds)-1))
+            timestamps = timestamps[indices]
 
-                elif new_timestamp_policy == "offset":
-                    print("sparse -> offset not yet implemented.")
+        elif new_timestamp_policy == "offset":
 
-            elif self.timestamp_policy == "normal":
+            self.start = to_datetime(timestamps[0])
+            timestamps = (microseconds - microseconds[0]) // 1000
 
-                if new_timestamp_policy == "sparse":
-                    print("normal -> sparse not yet implemented.")
+        elif new_timestamp_policy == "regular":
+
+            if not hasattr(self, "frequency"):
+                raise Exception("Channel {} needs a frequency to be regularly timestamped.".format(self.name))
+
+            timestamps = regular_timestamps(timestamps, self.frequency)
+
+            if timestamps is None:
+                raise Exception("Channel {} is not sampled regularly at {} Hz, so it cannot use the regular timestamp policy.".format(self.name, self.frequency))
+
+        self.set_contents(self.data, timestamps, timestamp_policy=new_timestamp_policy)
+        self.indices = indices
+        self.cached_indices = {}
+
+    def microseconds_per_sample(self):
+        """
+        Return the timestamp of every sample as integer microseconds since 1970, whatever the timestamp_policy.
+        """
+
+        if self.timestamp_policy == "offset":
 
-                elif new_timestamp_policy == "offset":
-                    print("normal -> offset not yet implemented.")
+            start = to_microseconds(self.start)
+            return start + (np.asarray(self.timestamps, dtype=np.float64) * 1000).astype(np.int64)
 
-            elif self.timestamp_policy == "offset":
+        microseconds = to_datetime64(self.timestamps).astype(np.int64)
 
-                if new_timestamp_policy == "sparse":
-                    print("offset -> sparse not yet implemented.")
+        # Sparse timestamps point at the first sample of each page, or are 1 per sample for page level data without indices
+        if self.timestamp_policy == "sparse" and len(self.indices) > 0:
 
-                elif new_timestamp_policy == "normal":
-                    print("offset -> normal not yet implemented.")
+            # Only the lengths of the samples matter here, so a stand-in array is expanded rather than the data
+            batch = (microseconds.astype("datetime64[us]"), np.asarray(self.indices), OrderedDict([("data", np.broadcast_to(np.int8(0), (len(self.data),)))]), OrderedDict())
+            expanded = [times for level, times, samples in expand_page_timestamps([batch], getattr(self, "frequency", None)) if level == "samples"]
+            microseconds = np.concatenate(expanded)
 
-            self.determine_appropriate_methods()
+        if len(microseconds) != len(self.data):
+            raise Exception("Channel {} has {} timestamps for {} samples, so they cannot be given 1 each.".format(self.name, len(microseconds), len(self.data)))
+
+        return microseconds
 
     def resample(self, frequency):
         """
         Resample channel data to a given frequency
         """
 
+        from scipy.interpolate import interp1d
+
         # This code will only produce sensible results for offset data right now!
         if self.timestamp_policy == "offset":
 
@@ -132,7 +393,7 @@ class Channel(object):
             new_timestamps = np.arange(0, max(offsets), delta)
             new_data = func(new_timestamps)
 
-            new_timestamps = start + new_timestamps.astype("int64") * timedelta(microseconds=1000)
+            new_timestamps = to_datetime64([start])[0] + new_timestamps.astype("int64") * np.timedelta64(1000, "us")
 
             self.cached_indices = {}
             self.set_contents(new_data, new_timestamps, timestamp_policy=self.timestamp_policy)
@@ -145,20 +406,36 @@ class Channel(object):
         """ Take the data and timestamps from another Channel and incorporate them into this one. """
 
         self.data = np.concatenate((self.data, other_channel.data))
-        self.timestamps = np.concatenate((self.timestamps, other_channel.timestamps))
+
+        if self.timestamp_policy == "offset":
+            self.timestamps = np.concatenate((self.timestamps, other_channel.timestamps))
+
+        elif self.timestamp_policy == "regular" and other_channel.timestamp_policy == "regular" and self.timestamps.frequency == other_channel.timestamps.frequency:
+            self.timestamps = self.timestamps.append(other_channel.timestamps)
+
+        else:
+            self.timestamps = np.concatenate((to_datetime64(self.timestamps), to_datetime64(other_channel.timestamps)))
+            if self.timestamp_policy == "regular":
+                self.timestamp_policy = "normal"
+                self.determine_appropriate_methods()
 
     def calculate_timeframe(self):
         """ Update timeframe and time_period variables to reflect start and end of timestamps. """
 
         self.size = len(self.data)
 
+        # timeframe is kept as datetimes, whatever the type of the timestamps array
         if self.timestamp_policy == "normal":
 
-            self.timeframe = self.timestamps[0], self.timestamps[-1]
+            self.timeframe = to_datetime(self.timestamps[0]), to_datetime(self.timestamps[-1])
 
         elif self.timestamp_policy == "sparse":
 
-            self.timeframe = self.timestamps[0], self.timestamps[-1]
+            self.timeframe = to_datetime(self.timestamps[0]), to_datetime(self.timestamps[-1])
+
+        elif self.timestamp_policy == "regular":
+
+            self.timeframe = to_datetime(self.timestamps[0]), to_datetime(self.timestamps[-1])
 
         elif self.timestamp_policy == "offset":
 
@@ -182,7 +459,7 @@ class Channel(object):
         except:
             pass
 
-        if channel.timestamp_policy == "offset":
+        if channel.timestamp_policy in ["offset", "regular"]:
             self.start = channel.start
 
         # If we inherit timestamps, we need to inherit the appropriate methods to interpret them!
@@ -232,22 +509,14 @@ class Channel(object):
 
     def get_index(self, datetimestamp):
         """
-        Return the data index of the given datetimestamp.
-        If it has already been cached, return the cached value.
-        Otherwise, call the appropriate method based on timestamp_policy, cache the result, and return it.
+        Return the data index of the given datetimestamp, calling the appropriate method based on timestamp_policy.
+        Looking up an index doesn't modify the Channel, so the same Channel can be used by several threads at once.
         """
 
         if datetimestamp < self.time_period[0] or datetimestamp > self.time_period[1]:
             return -1
         else:
-
-            try:
-                i = self.cached_indices[datetimestamp]
-            except:
-                i = self.get_index_appropriately(datetimestamp)
-                self.cached_indices[datetimestamp] = i
-
-            return i
+            return self.get_index_appropriately(datetimestamp)
 
     def get_window(self, datetime_start, datetime_end):
         """
@@ -280,39 +549,152 @@ class Channel(object):
 
         return (start,end)
 
+    def get_indices(self, datetimestamps):
+        """
+        Vectorised get_index(), returning an array of the data index of each of an array of timestamps, or -1 for those outside the time period.
+        """
+
+        datetimestamps = to_datetime64(np.atleast_1d(datetimestamps))
+        first, last = to_datetime64(list(self.time_period))
+
+        indices = np.asarray(self.get_indices_appropriately(datetimestamps), dtype=np.int64)
+
+        return np.where((datetimestamps < first) | (datetimestamps > last), -1, indices)
+
+    def get_windows(self, datetime_starts, datetime_ends):
+        """
+        Vectorised get_window(), returning arrays of the start and end indices of the data array for each pair of timestamps.
+        Windows are clipped to the data in the same 6 scenarios as get_window().
+        """
+
+        starts = to_datetime64(np.atleast_1d(datetime_starts))
+        ends = to_datetime64(np.atleast_1d(datetime_ends))
+        first, last = to_datetime64(list(self.time_period))
+
+        # Each scenario only applies to windows that didn't fall into an earlier one, as in get_window()
+        a = (starts <= first) & (ends > first) & (ends <= last)
+        b = ~a & (starts >= first) & (starts <= last) & (ends >= first) & (ends <= last)
+        c = ~a & ~b & (starts >= first) & (starts < last) & (ends >= last)
+        d = ~a & ~b & ~c & (starts <= first) & (ends >= last)
+        e_f = (ends <= first) | (starts >= last)
 
+        corner_cases = ~(a | b | c | d | e_f)
+        if np.any(corner_cases):
+            i = np.flatnonzero(corner_cases)[0]
+            raise Exception("Corner case in get_windows() of {}.\nChannel time period: {} to {}.\nQuery: {} to {}.".format(self.name, self.time_period[0], self.time_period[1], starts[i], ends[i]))
+
+        start_indices = np.full(len(starts), -1, dtype=np.int64)
+        end_indices = np.full(len(ends), -1, dtype=np.int64)
+
+        start_indices[a | d] = 0
+        start_indices[b | c] = self.get_indices(starts[b | c])
+        end_indices[a | b] = self.get_indices(ends[a | b])
+        end_indices[c | d] = len(self.data)
+
+        return start_indices, end_indices
 
     def get_data_index(self, datetimestamp):
         """
         Returns the indices of the data array to use if every observation is timestamped
         """
 
-        index = bisect_left(self.timestamps, datetimestamp)
+        index = np.searchsorted(self.timestamps, np.datetime64(datetimestamp, "us"))
 
-        return index
+        return int(index)
+
+    def get_data_indices(self, datetimestamps):
+        """ Vectorised get_data_index(), for an array of timestamps """
+
+        return np.searchsorted(self.timestamps, to_datetime64(datetimestamps))
 
     def get_sparse_data_index(self, datetimestamp):
-        """ Returns the indices of the data array to use if it is sparsely timestamped """
+        """ Returns the index of the data array to use if it is sparsely timestamped, the same as get_sparse_data_indices() but for one timestamp """
+
+        timestamp = np.datetime64(datetimestamp, "us")
+
+        search = min(int(np.searchsorted(self.timestamps, timestamp)), len(self.timestamps)-1)
+        index = int(self.indices[search])
 
-        self.ensure_timestamped_at(datetimestamp)
+        if timestamp > self.timestamps[0] and timestamp < self.timestamps[-1] and self.timestamps[search] != timestamp and hasattr(self, "frequency"):
 
-        search = bisect_left(self.timestamps, datetimestamp)
-        index = self.indices[max(0,search)]
+            overshoot = int((self.timestamps[search]-timestamp).astype(np.int64))
+            a = int(index - overshoot/1000000*self.frequency)
+
+            if a + 1 <= self.indices[-1]:
+                for candidate in [a, a+1]:
+                    if candidate < index and self.infer_timestamp(candidate) >= timestamp:
+                        return candidate
 
         return index
 
+    def get_sparse_data_indices(self, datetimestamps):
+        """
+        Returns the index of the data array to use for each of an array of timestamps, if it is sparsely timestamped.
+        A timestamp between two sparse timestamps is placed by counting samples back from the later one at self.frequency,
+        giving the first sample timestamped at or after it, as if ensure_timestamped_at() had been called first.
+        Neither the timestamps nor the indices arrays are modified.
+        """
+
+        times = to_datetime64(np.atleast_1d(datetimestamps)).astype(np.int64)
+        stamps = to_datetime64(self.timestamps).view(np.int64)
+        indices = np.asarray(self.indices, dtype=np.int64)
+
+        search = np.minimum(np.searchsorted(stamps, times), len(stamps)-1)
+        result = indices[search]
+
+        between = (times > stamps[0]) & (times < stamps[-1]) & (stamps[search] != times)
+
+        if hasattr(self, "frequency") and np.any(between):
+
+            page = search[between]
+            query = times[between]
+
+            # The later sparse timestamp is after the query time - but by how many samples?
+            num_samples_back = (stamps[page] - query)/1000000*self.frequency
+            a = (indices[page] - num_samples_back).astype(np.int64)
+            b = a + 1
+
+            # Samples after the last index can't be timestamped, so the later sparse timestamp is used as it is
+            inferable = b <= indices[-1]
+            a_time = self.infer_timestamps(np.minimum(a, indices[-1])).astype(np.int64)
+            b_time = self.infer_timestamps(np.minimum(b, indices[-1])).astype(np.int64)
+
+            chosen = indices[page]
+            chosen = np.where(inferable & (b < chosen) & (b_time >= query), b, chosen)
+            chosen = np.where(inferable & (a < chosen) & (a_time >= query), a, chosen)
+            result[between] = chosen
+
+        return result
+
     def get_offset_data_index(self, datetimestamp):
 
         start_index = (datetimestamp - self.time_period[0])/timedelta(microseconds=1000)
 
-        index = bisect_left(self.timestamps, start_index)
+        index = np.searchsorted(self.timestamps, start_index)
 
-        return index
+        return int(index)
+
+    def get_offset_data_indices(self, datetimestamps):
+        """ Vectorised get_offset_data_index(), for an array of timestamps """
+
+        offsets = (to_datetime64(datetimestamps).astype(np.int64) - to_microseconds(self.time_period[0]))/1000
+
+        return np.searchsorted(self.timestamps, offsets)
+
+    def get_regular_data_index(self, datetimestamp):
+        """ Returns the index of the data array to use if it is regularly timestamped, which is calculated rather than searched for """
+
+        return self.timestamps.get_index(datetimestamp)
+
+    def get_regular_data_indices(self, datetimestamps):
+        """ Vectorised get_regular_data_index(), for an array of timestamps """
+
+        return self.timestamps.get_indices(datetimestamps)
 
     def inject_timestamp_index(self, timestamp, index):
-        """ Add a new timestamp pointing at the given index in the data array. Used to be more specific with timestamps when data is sparsely timestamped. """
+        """ Add a new timestamp pointing at the given index in the data array. get_sparse_data_indices() gives the same indices without doing this. """
 
-        i = bisect_left(self.indices, index)
+        i = np.searchsorted(self.indices, index)
         if self.indices[i] != index:
 
             self.timestamps = np.insert(self.timestamps, i, timestamp)
@@ -322,20 +704,22 @@ class Channel(object):
         """ Guarantees a timestamp will be in the timestamps array """
 
 
+        timestamp = np.datetime64(timestamp, "us")
+
         # Is this check necessary?
         if timestamp >= self.timestamps[0] and timestamp < self.timestamps[-1]:
 
-            start = bisect_left(self.timestamps, timestamp)
+            start = np.searchsorted(self.timestamps, timestamp)
 
             # If this timestamp didn't exactly match an existing timestamp in the array
             # And the index is a useable range in the timestamp array
             if self.timestamps[start] != timestamp and (start > 0) and (start < len(self.timestamps)):
 
                 try:
-                    # self.timestamps[start] > desired timestamp - but by how much?
-                    overshoot = (self.timestamps[start]-timestamp).total_seconds()
+                    # self.timestamps[start] > desired timestamp - but by how many microseconds?
+                    overshoot = int((self.timestamps[start]-timestamp).astype(np.int64))
                     # seconds difference * num samples per second = sample difference
-                    num_samples_back = overshoot*self.frequency
+                    num_samples_back = overshoot/1000000*self.frequency
                     a = int(self.indices[start] - num_samples_back)
                     b = a + 1
 
@@ -348,12 +732,17 @@ class Channel(object):
                 except:
                     pass
 
-    def window_statistics(self, start_dts, end_dts, statistics):
-        """ Summarise the data between these timestamps using the statistics listed. """
+    def window_statistics(self, start_dts, end_dts, statistics, window_indices=None):
+        """
+        Summarise the data between these timestamps using the statistics listed.
+        window_indices is the (start, end) of the window in the data array, if it has already been looked up with get_windows().
+        """
 
         # Allow direct indexing numerically, or by timestamp
         index_type = str(type(start_dts))
-        if "int" in index_type:
+        if window_indices is not None:
+            start_index,end_index = window_indices
+        elif "int" in index_type:
             start_index,end_index = start_dts, end_dts
         else:
             start_index,end_index = self.get_window(start_dts, end_dts)
@@ -636,9 +1025,13 @@ class Channel(object):
 
         num_expected_results = len(channel_list)
 
-        for window in windows:
+        # Find where every window starts and ends in the data array at once
+        windows = list(windows)
+        start_indices, end_indices = self.get_windows([w.start_timestamp for w in windows], [w.end_timestamp for w in windows])
+
+        for window, start_index, end_index in zip(windows, start_indices.tolist(), end_indices.tolist()):
 
-            results = self.window_statistics(window.start_timestamp, window.end_timestamp, statistics)
+            results = self.window_statistics(window.start_timestamp, window.end_timestamp, statistics, window_indices=(start_index, end_index))
 
             if len(results) != num_expected_results:
 
@@ -650,7 +1043,7 @@ class Channel(object):
         for channel in channel_list:
             channel.missing_value = -1
             channel.data = np.array(channel.data)
-            channel.timestamps = np.array(channel.timestamps)
+            channel.timestamps = to_datetime64(channel.timestamps)
             channel.calculate_timeframe()
             channel.determine_appropriate_methods()
 
@@ -667,7 +1060,7 @@ class Channel(object):
     def infer_timestamp(self, index):
         """ Given an index of the data array, approximate its timestamp using the sparse timestamps around it """
 
-        start = bisect_left(self.indices, index)
+        start = np.searchsorted(self.indices, index)
         #print("infer_timestamp | start:", start)
         if self.indices[start] == index:
 
@@ -682,21 +1075,35 @@ class Channel(object):
             time_difference = index_difference * timedelta(seconds=1)/self.frequency
             #print("infer_timestamp | index_difference:", index_difference)
             #print("infer_timestamp | time_difference:", time_difference)
-            return self.timestamps[start] - time_difference
+            return self.timestamps[start] - np.timedelta64(time_difference)
+
+    def infer_timestamps(self, indices):
+        """ Vectorised infer_timestamp(), for an array of indices of the data array """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        sparse_indices = np.asarray(self.indices, dtype=np.int64)
+        stamps = to_datetime64(self.timestamps).view(np.int64)
+
+        start = np.minimum(np.searchsorted(sparse_indices, indices), len(sparse_indices)-1)
+        index_difference = np.maximum(sparse_indices[start] - indices, 0)
+
+        return (stamps[start] - samples_to_microseconds(index_difference, self.frequency)).astype("datetime64[us]")
 
     def infer_timestamp_delta(self):
 
         deltas = np.diff(self.timestamps)
+        if deltas.dtype.kind == "m":
+            deltas = deltas.astype(timedelta)
         self.mean_timedelta = np.mean(deltas)
         self.max_timedelta = np.max(deltas)
         self.min_timedelta = np.min(deltas)
 
     def generate_sliding_windows(self, window_size):
 
-        for timestamp in self.timestamps:
+        half_window = np.timedelta64(window_size/2.0)
+        timestamps = to_datetime64(self.timestamps)
 
-            start_dts = timestamp - (window_size/2.0)
-            end_dts = timestamp + (window_size/2.0)
+        for start_dts, end_dts in zip((timestamps - half_window).tolist(), (timestamps + half_window).tolist()):
 
             yield Bout(start_dts, end_dts)
 
@@ -714,15 +1121,15 @@ class Channel(object):
 
     def generate_piecewise_windows(self, start, end, window_size):
 
-        start_dts = start
-        end_dts = start + window_size
+        # Window boundaries are counted in integer microseconds, every window_size from start until one passes end
+        step = timedelta_to_microseconds(window_size)
+        num_windows = max(0, -(-(to_microseconds(end) - to_microseconds(start)) // step))
 
-        while start_dts < end:
+        starts = np.datetime64(start, "us") + np.arange(num_windows, dtype=np.int64) * np.timedelta64(step, "us")
 
-            yield Bout(start_dts, end_dts)
+        for start_dts, end_dts in zip(starts.tolist(), (starts + np.timedelta64(step, "us")).tolist()):
 
-            start_dts = start_dts + window_size
-            end_dts = end_dts + window_size
+            yield Bout(start_dts, end_dts)
 
     def piecewise_statistics(self, window_size, statistics=[("generic", ["mean"])], time_period=False, name=""):
 
@@ -755,61 +1162,22 @@ class Channel(object):
     def bouts(self, low, high):
         """ Return a list of Bout objects where data is >= low and <= high. """
 
-        # 0 indicates not currently in a bout, 1 indicates in
-        state = 0
-
-        # start_index will be the variable that tracks the start of bouts
-        start_index = 0
-
-        # end_index will track the end
-        end_index = 1
-        bouts = []
+        # 1 where the data is in the range, padded with 0s so every bout has a rising and a falling edge
+        in_range = (np.asarray(self.data) >= low) & (np.asarray(self.data) <= high)
+        edges = np.diff(np.concatenate(([0], in_range.astype(np.int8), [0])))
 
-        for i, value in enumerate(self.data):
-
-            # If we're currently not in a bout
-            if state == 0:
-
-                # And if this value is in the range we want
-                if value >= low and value <= high:
-
-                    # Start a bout
-                    state = 1
-                    start_index = i
-                    end_index = i
-
-            # Else, we're currently in a bout
-            else:
-
-                # And this value is in the range we want
-                if value >= low and value <= high:
-
-                    # So the bout expands to include this value
-                    end_index = i
-
-                # But this value is out of our range
-                else:
-
-                    # So we end the bout at the previous value
-                    state = 0
-
-                    start_time =  self.timestamps[start_index]
-                    end_time = self.timestamps[end_index]
-                    if end_index+1 < self.size:
-                        end_time = self.timestamps[end_index+1]
-
-                    bouts.append(Bout(start_time, end_time))
+        # A bout starts at its first value, and ends at the timestamp of the value after its last
+        start_indices = np.flatnonzero(edges == 1)
+        end_indices = np.flatnonzero(edges == -1)
 
+        start_times = self.timestamps[start_indices]
+        end_times = self.timestamps[np.minimum(end_indices, len(self.data)-1)]
 
         # Bout finishes at end of file
-        if state == 1:
-            start_time = self.timestamps[start_index]
-            end_time = self.timestamps[end_index]
-
-            #if not self.sparsely_timestamped:
-            end_time += self.timestamps[-1]-self.timestamps[-2]
+        if len(end_indices) > 0 and end_indices[-1] == len(self.data):
+            end_times[-1] += self.timestamps[-1]-self.timestamps[-2]
 
-            bouts.append(Bout(start_time, end_time))
+        bouts = [Bout(start_time, end_time) for start_time, end_time in zip(start_times.tolist(), end_times.tolist())]
 
         if self.timestamp_policy == "offset":
 
@@ -836,9 +1204,9 @@ class Channel(object):
         # Don't delete the data anymore, just mask the data outside of the range
 
         # First bout represents all time up to "start"
-        bout1 = Bout(self.timestamps[0]-timedelta(days=1), start-timedelta(microseconds=1))
+        bout1 = Bout(self.timeframe[0]-timedelta(days=1), start-timedelta(microseconds=1))
         # Second bout represents all time after "end"
-        bout2 = Bout(end+timedelta(microseconds=1), self.timestamps[-1]+timedelta(days=1))
+        bout2 = Bout(end+timedelta(microseconds=1), self.timeframe[1]+timedelta(days=1))
 
         self.delete_windows([bout1, bout2])
 
@@ -850,10 +1218,13 @@ class Channel(object):
         self.data[start_index:end_index] = fill_value
 
     def fill_windows(self, bouts, fill_value=0):
-        """ Given a list of Bouts, iteratively call self.fill() with each Bout."""
+        """ Given a list of Bouts, replace the data within each of them with fill_value, as self.fill() does for one Bout."""
 
-        for b in bouts:
-            self.fill(b, fill_value = fill_value)
+        bouts = list(bouts)
+        start_indices, end_indices = self.get_windows([b.start_timestamp for b in bouts], [b.end_timestamp for b in bouts])
+
+        for start_index, end_index in zip(start_indices.tolist(), end_indices.tolist()):
+            self.data[start_index:end_index] = fill_value
 
     def fft(self):
 
@@ -861,6 +1232,8 @@ class Channel(object):
 
     def output_as_tone(self, filename, note_duration=0.15, volume=10000):
 
+        from scipy.io.wavfile import write
+
         rate = 1378.125
 
         self.normalise(floor=83,ceil=880)
@@ -924,6 +1297,23 @@ class Channel(object):
 
         return output
 
+def samples_to_microseconds(num_samples, frequency):
+    """
+    The duration of an array of numbers of samples at the given frequency, in microseconds.
+    Rounds half to even like index_difference * timedelta(seconds=1)/frequency does, which is exact when frequency is a ratio of small integers.
+    """
+
+    numerator, denominator = float(frequency).as_integer_ratio()
+    num_samples = np.asarray(num_samples, dtype=np.int64)
+
+    if len(num_samples) == 0 or int(np.max(np.abs(num_samples))) * 1000000 * denominator * 2 >= 2**63:
+        return np.round(num_samples * 1000000 / frequency).astype(np.int64)
+
+    quotient, remainder = np.divmod(num_samples * 1000000 * denominator, numerator)
+    round_up = (remainder * 2 > numerator) | ((remainder * 2 == numerator) & (quotient % 2 == 1))
+
+    return quotient + round_up
+
 def channel_from_coefficients(coefs, timestamps):
     chan = Channel("Recreated")
 
@@ -948,7 +1338,7 @@ def channel_from_bouts(bouts, time_period, time_resolution, channel_name, skelet
         #    timestamps.append(timestamp)
         #    timestamp += time_resolution
 
-        timestamps = [time_period[0] + time_resolution*x for x in range(num_epochs)]
+        timestamps = np.datetime64(time_period[0], "us") + np.arange(num_epochs, dtype=np.int64) * np.timedelta64(time_resolution)
 
         filled = np.empty(len(timestamps))
         filled.fill(out_value)
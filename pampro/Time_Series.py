@@ -1,10 +1,5 @@
-import matplotlib
-matplotlib.use("Agg") # So that plotting doesn't require X and can be done remotely
-
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-
 from datetime import datetime, date, time, timedelta
+import sys
 import numpy as np
 from collections import OrderedDict
 
@@ -209,9 +204,11 @@ class Time_Series(object):
         #    print(len(chan.data))
         #    print(len(chan.timestamps))
 
+        timestamps = np.asarray(channel_sources[0].timestamps).astype("datetime64[us]").tolist()
+
         for i in range(0,len(channel_sources[0].data)):
 
-            pretty_timestamp = channel_sources[0].timestamps[i].strftime(timestamp_format)
+            pretty_timestamp = timestamps[i].strftime(timestamp_format)
             file_output.write(self.name + "," + pretty_timestamp + ",")
 
             for n,chan in enumerate(channel_sources):
@@ -228,6 +225,14 @@ class Time_Series(object):
 
     def draw(self, channel_combinations, time_period=False, file_target=False, width=6.3, height=4.35):
 
+        # matplotlib is slow to import, so it is only imported when something is drawn
+        import matplotlib
+        if "matplotlib.pyplot" not in sys.modules:
+            matplotlib.use("Agg") # So that plotting doesn't require X and can be done remotely
+
+        import matplotlib.pyplot as plt
+        from matplotlib import rcParams
+
         try:
             rcParams['font.size'] = '8'
 
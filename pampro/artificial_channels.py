@@ -1,10 +1,16 @@
 import numpy as np
 from .Channel import *
 
+def minute_of_day(timestamps):
+	''' The whole number of minutes since midnight of each timestamp '''
+
+	timestamps = to_datetime64(timestamps)
+	return ((timestamps - timestamps.astype("datetime64[D]")) // np.timedelta64(1, "m")).astype(float)
+
 
 def sine_wave(channel, wavelength_minutes=1440.0):
 
-	sine_data = np.sin([2.0*np.pi*(float(t.time().hour*60+t.time().minute)/ wavelength_minutes) for t in channel.timestamps])
+	sine_data = np.sin(2.0*np.pi*minute_of_day(channel.timestamps)/wavelength_minutes)
 
 	sine_wave = Channel.Channel(channel.name + "_sine")
 	sine_wave.set_contents(sine_data, channel.timestamps)
@@ -13,7 +19,7 @@ def sine_wave(channel, wavelength_minutes=1440.0):
 
 def cosine_wave(channel, wavelength_minutes=1440.0):
 
-	cosine_data = np.cos([2.0*np.pi*(float(t.time().hour*60+t.time().minute)/wavelength_minutes) for t in channel.timestamps])
+	cosine_data = np.cos(2.0*np.pi*minute_of_day(channel.timestamps)/wavelength_minutes)
 
 	cosine_wave = Channel.Channel(channel.name + "_cosine")
 	cosine_wave.set_contents(cosine_data, channel.timestamps)
@@ -230,7 +230,7 @@ def infer_nonwear_triaxial(x, y, z, minimum_length=timedelta(hours=1), noise_cut
 def infer_valid_days(channel, wear_bouts, valid_criterion=timedelta(hours=10)):
 
     #Generate day-long windows
-    start = start_of_day(channel.timestamps[0])
+    start = start_of_day(to_datetime(channel.timestamps[0]))
     day_windows = []
     while start < channel.timeframe[1]:
         day_windows.append(Bout(start, start+timedelta(days=1)))
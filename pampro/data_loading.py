@@ -1,5 +1,4 @@
 import numpy as np
-import scipy as sp
 from datetime import datetime, date, time, timedelta
 import copy
 from struct import *
@@ -7,12 +6,12 @@ from math import *
 import time as timestdlib
 import sys
 import io
+import itertools
+import mmap
+import os
 import re
 import string
-from scipy.io.wavfile import write
-import zipfile
 from collections import OrderedDict
-import h5py
 
 from .Channel import *
 from .Bout  import *
@@ -20,13 +19,9 @@ from .Time_Series import *
 from .time_utilities import *
 from .pampro_utilities import *
 from .hdf5 import *
+from .formats import register_format, get_format, get_handler, detect_source_type
+from .formats import formats as registered_formats
 
-# Axivity import code adapted from source provided by Open Movement: https://code.google.com/p/openmovement/. Their license terms are reproduced here in full, and apply only to the Axivity related code:
-# Copyright (c) 2009-2014, Newcastle University, UK. All rights reserved.
-# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
-# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
-# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
-# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 def twos_comp(val, bits):
 
     if( (val&(1<<(bits-1))) != 0 ):
@@ -42,122 +37,267 @@ def ushort(value):
 def short(value):
     return (value + 2 ** 15) % 2 ** 16 - 2 ** 15
 
-def axivity_read_timestamp(stamp):
-    stamp = unpack('I', stamp)[0]
-    year = ((stamp >> 26) & 0x3f) + 2000
-    month = (stamp >> 22) & 0x0f
-    day   = (stamp >> 17) & 0x1f
-    hours = (stamp >> 12) & 0x1f
-    mins  = (stamp >>  6) & 0x3f
-    secs  = (stamp >>  0) & 0x3f
+def sample_dtype(dtype, native):
+    """
+    The NumPy dtype to store samples in: the device's own type native if dtype is "native", otherwise dtype itself.
+    """
+
+    if dtype == "native":
+        return np.dtype(native)
+    return np.dtype(dtype)
+
+def sample_channels(channels, axes=["X", "Y", "Z"]):
+    """
+    The channels to decode from a file of sample level axes, which must include at least 1 axis to count the samples by.
+    """
+
+    if channels is None or any(axis in channels for axis in axes):
+        return channels
+    return list(channels) + [axes[0]]
+
+def wanted_channels(names, channels=None):
+    """
+    The names that are in channels, keeping their order, or all of them if channels is None.
+    """
+
+    return [name for name in names if channels is None or name in channels]
+
+def set_scales(channel_list, scales):
+    """
+    Record how to convert the native values of each channel to physical units: data * scale_factor + scale_offset.
+    scales maps a channel name to its (scale_factor, scale_offset).
+    """
+
+    for c in channel_list:
+        if c.name in scales:
+            c.scale_factor, c.scale_offset = scales[c.name]
+
+def map_file(source):
+    """
+    Memory map a file for reading, so its contents can be viewed and sliced without reading a copy into RAM.
+    """
+
+    handle = open(source, "rb")
+    mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    handle.close()
+
+    return mapped
+
+def bisect_pages(lo, hi, page_time, target, side="right"):
+    """
+    Binary search for the first position in lo to hi whose page_time is after target, or None (there is no page from there on).
+    With side="left", the first position whose page_time is at or after target, like np.searchsorted().
+    page_time must not decrease with position.
+    """
+
+    while lo < hi:
+
+        mid = (lo + hi) // 2
+        t = page_time(mid)
+
+        if t is None or t > target or (side == "left" and t == target):
+            hi = mid
+        else:
+            lo = mid + 1
+
+    return lo
+
+# One row per page (block) of a raw file, as stored in its sidecar index
+# timestamp is in microseconds since 1970, and first_sample is where the page's samples start in the loaded data
+page_index_dtype = np.dtype([
+    ("offset", "<i8"),
+    ("first_sample", "<i8"),
+    ("timestamp", "<i8"),
+    ("sequence_id", "<i8"),
+    ("status", "u1"),
+    ("checksum_ok", "?")
+])
+
+# Page status codes: only pages that are "ok" hold data
+page_ok = 0
+page_unusable = 1
+page_invalid_timestamp = 2
+
+page_index_version = 1
+
+def datetimes_to_microseconds(timestamps):
+    """
+    Convert datetimes to integer microseconds since 1970.
+    """
+
+    return np.array(timestamps, dtype="datetime64[us]").astype(np.int64)
+
+def microseconds_to_datetimes(microseconds):
+    """
+    Convert integer microseconds since 1970 to an array of datetimes.
+    """
+
+    return np.asarray(microseconds, dtype=np.int64).astype("datetime64[us]").astype(datetime)
+
+def page_index_filename(source, index):
+    """
+    Where the sidecar index of source lives: alongside it by default, or wherever index says if it's a filename.
+    """
+
+    if index is True:
+        return source + ".index.hdf5"
+    return index
+
+def read_page_index(filename, source, source_type):
+    """
+    Read a sidecar index, but only if it exists and was made from source as it is now. Otherwise return None.
+    """
+
+    if not os.path.isfile(filename):
+        return None
+
+    stat = os.stat(source)
+
+    import h5py
+
+    try:
+        with h5py.File(filename, "r") as f:
+
+            attributes = f["pages"].attrs
+            if attributes["version"] != page_index_version or attributes["source_type"] != source_type or attributes["source_size"] != stat.st_size or attributes["source_mtime"] != stat.st_mtime_ns:
+                return None
+
+            return f["pages"][:]
+
+    except (OSError, KeyError):
+        return None
+
+def write_page_index(filename, source, source_type, page_index):
+    """
+    Write a sidecar index for source, recording the file's size and modification time so a stale index can be recognised.
+    Failing to write it (e.g. the directory is read only) isn't an error, the index just won't be reused.
+    """
+
+    import h5py
+
+    stat = os.stat(source)
+
     try:
-        t = datetime(year, month, day, hours, mins, secs)
-    except ValueError:
-        t = None
-    return t
-
-def axivity_read_timestamp_raw(stamp):
-    year = ((stamp >> 26) & 0x3f) + 2000
-    month = (stamp >> 22) & 0x0f
-    day   = (stamp >> 17) & 0x1f
-    hours = (stamp >> 12) & 0x1f
-    mins  = (stamp >>  6) & 0x3f
-    secs  = (stamp >>  0) & 0x3f
+        with h5py.File(filename, "w") as f:
+
+            dataset = f.create_dataset("pages", data=page_index)
+            dataset.attrs["version"] = page_index_version
+            dataset.attrs["source_type"] = source_type
+            dataset.attrs["source_size"] = stat.st_size
+            dataset.attrs["source_mtime"] = stat.st_mtime_ns
+
+    except OSError:
+        pass
+
+def get_page_index(source, source_type, index, build):
+    """
+    Reuse the sidecar index of source if it is up to date, otherwise build it by calling build() and save it for next time.
+    """
+
+    filename = page_index_filename(source, index)
+
+    page_index = read_page_index(filename, source, source_type)
+    if page_index is None:
+        page_index = build()
+        write_page_index(filename, source, source_type, page_index)
+
+    return page_index
+
+def attach_shared_arrays(shared):
+    """
+    Attach to the blocks of shared memory described by shared, (names, number of samples, dtype), and view each of them as an array.
+    """
+
+    from multiprocessing import shared_memory
+
+    shared_names, num_samples, dtype = shared
+
+    memories = [shared_memory.SharedMemory(name=name) for name in shared_names]
+    arrays = [np.ndarray(num_samples, dtype=dtype, buffer=memory.buf) for memory in memories]
+
+    return memories, arrays
+
+def decode_in_parallel(task, arguments, num_samples, names, workers, dtype=np.float64):
+    """
+    Run task once for each tuple of arguments, in a pool of worker processes.
+    Every task is first given a description of shared arrays of num_samples values of dtype (one per channel name), and writes its decoded samples straight into them.
+    Returns the result of each task in order, and the filled arrays.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    dtype = np.dtype(dtype)
+    shared = OrderedDict([(name, shared_memory.SharedMemory(create=True, size=max(1, num_samples*dtype.itemsize))) for name in names])
+
     try:
-        t = datetime(year, month, day, hours, mins, secs)
-    except ValueError:
-        t = None
-    return t
-
-def axivity_read(fh, bytes):
-    data = fh.read(bytes)
-    if len(data) == bytes:
-        return data
-    else:
-        raise IOError
-
-def axivity_parse_header(fh):
-
-    ax_header = OrderedDict()
-
-    blockSize = unpack('H', axivity_read(fh,2))[0]
-    performClear = unpack('B', axivity_read(fh,1))[0]
-    deviceId = unpack('H', axivity_read(fh,2))[0]
-    sessionId = unpack('I', axivity_read(fh,4))[0]
-    shippingMinLightLevel = unpack('H', axivity_read(fh,2))[0]
-    loggingStartTime = axivity_read(fh,4)
-    loggingEndTime = axivity_read(fh,4)
-    loggingCapacity = unpack('I', axivity_read(fh,4))[0]
-    allowStandby = unpack('B', axivity_read(fh,1))[0]
-    debuggingInfo = unpack('B', axivity_read(fh,1))[0]
-    batteryMinimumToLog = unpack('H', axivity_read(fh,2))[0]
-    batteryWarning = unpack('H', axivity_read(fh,2))[0]
-    enableSerial = unpack('B', axivity_read(fh,1))[0]
-    lastClearTime = axivity_read(fh,4)
-    samplingRate = unpack('B', axivity_read(fh,1))[0]
-    lastChangeTime = axivity_read(fh,4)
-    firmwareVersion = unpack('B', axivity_read(fh,1))[0]
-
-    reserved = axivity_read(fh,22)
-
-    annotationBlock = axivity_read(fh, 448 + 512)
-
-    if len(annotationBlock) < 448 + 512:
-        annotationBlock = ""
-
-    annotation = ""
-    for x in annotationBlock:
-        if x != 255 and x != ' ':
-            if x == '?':
-                x = '&'
-            annotation += str(x)
-    annotation = annotation.strip()
-
-    annotationElements = annotation.split('&')
-    annotationNames = {
-        '_c': 'studyCentre',
-        '_s': 'studyCode',
-        '_i': 'investigator',
-        '_x': 'exerciseCode',
-        '_v': 'volunteerNum', '_p':
-        'bodyLocation', '_so':
-        'setupOperator', '_n': 'notes',
-        '_b': 'startTime', '_e': 'endTime',
-        '_ro': 'recoveryOperator',
-        '_r': 'retrievalTime',
-        '_co': 'comments'
-    }
-
-    for element in annotationElements:
-        kv = element.split('=', 2)
-        if kv[0] in annotationNames:
-            ax_header[annotationNames[kv[0]]] = kv[1]
-
-    for x in ('startTime', 'endTime', 'retrievalTime'):
-        if x in ax_header:
-            if '/' in ax_header[x]:
-                ax_header[x] = time.strptime(ax_header[x], '%d/%m/%Y')
-            else:
-                ax_header[x] = time.strptime(ax_header[x], '%Y-%m-%d %H:%M:%S')
 
+        description = ([memory.name for memory in shared.values()], num_samples, dtype.str)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(task, description, *args) for args in arguments]
+            results = [future.result() for future in futures]
+
+        # Copy each channel out of shared memory and free it before the next, so only one extra channel is held at a time
+        samples = OrderedDict()
+        for name, memory in shared.items():
+            samples[name] = np.ndarray(num_samples, dtype=dtype, buffer=memory.buf).copy()
+            memory.close()
+            memory.unlink()
+
+    finally:
+
+        for memory in shared.values():
+            if memory.buf is not None:
+                memory.close()
+                memory.unlink()
+
+    return results, samples
 
-    lastClearTime = axivity_read_timestamp(lastClearTime)
-    lastChangeTime = axivity_read_timestamp(lastChangeTime)
-    firmwareVersion = firmwareVersion if firmwareVersion != 255 else 0
+def channels_from_pages(timestamps, indices, samples, pages=OrderedDict(), frequency=None, channels=None):
+    """
+    Build Channels from decoded data.
+    samples are sample level data, timestamped "sparsely" at the given indices, or with a timestamp for every sample if indices is None.
+    timestamps can also be Regular_Timestamps, for samples at a fixed frequency.
+    pages are page level data, with 1 value per timestamp.
+    Only the named channels are built, or all of them if channels is None.
+    """
+
+    wanted = channels
+    channels = []
+
+    # Converted once here, so every channel shares the same datetime64 array
+    if not isinstance(timestamps, Regular_Timestamps):
+        timestamps = to_datetime64(timestamps)
+
+    for name, data in samples.items():
+
+        if name not in wanted_channels([name], wanted):
+            continue
+
+        channel = Channel(name)
+
+        if indices is None:
+            channel.set_contents(data, timestamps)
+        else:
+            channel.set_contents(data, timestamps, timestamp_policy="sparse")
+            channel.indices = indices
 
+        if frequency is not None:
+            channel.frequency = frequency
 
-    #ax_header["sample_rate"] = samplingRate
-    ax_header["device"] = deviceId
-    ax_header["session"] = sessionId
-    ax_header["firmware"] = firmwareVersion
-    #ax_header["logging_start_time"] = axivity_read_timestamp_raw(loggingStartTime)
-    #ax_header["logging_end_time"] = axivity_read_timestamp_raw(loggingEndTime)
+        channels.append(channel)
 
+    for name, data in pages.items():
 
-    ax_header["frequency"] = 3200/(1<<(15-(int(samplingRate) & 0x0f)))
+        if name not in wanted_channels([name], wanted):
+            continue
 
+        channel = Channel(name)
+        channel.set_contents(data, timestamps, timestamp_policy="sparse")
+        channels.append(channel)
 
-    return ax_header
+    return channels
 
 def parse_header(header, type, datetime_format):
 
@@ -334,975 +474,561 @@ def parse_header(header, type, datetime_format):
 
     return header_info
 
-def convert_actigraph_timestamp(t):
-    return datetime(*map(int, [t[6:10],t[3:5],t[0:2],t[11:13],t[14:16],t[17:19],int(t[20:])*1000]))
+def infer_source_type(source):
+    """
+    Assume the type of a file from its extension and the bytes it starts with, and throw an error if unsure.
+    """
 
-def load(source, source_type="infer", datetime_format="%d/%m/%Y %H:%M:%S:%f", datetime_column=0, ignore_columns=False, unique_names=False, hdf5_mode="r", hdf5_group="Raw"):
+    return detect_source_type(source)
 
-    load_start = datetime.now()
+def load(source, source_type="infer", datetime_format="%d/%m/%Y %H:%M:%S:%f", datetime_column=0, ignore_columns=False, unique_names=False, hdf5_mode="r", hdf5_group="Raw", workers=1, header_only=False, time_period=None, index=False, channels=None, dtype="float64", epoch=None, features=("enmo",)):
 
-    header = OrderedDict()
-    channels = []
-    ts = Time_Series("")
-
-    # when the source_type is left blank, we can assume using the filename extension
-    # throw an error if unsure
-    extension_map = {
-        "dat":"Actigraph", "DAT":"Actigraph", "Dat":"Actigraph",
-        "csv":"CSV",
-        "bin":"GeneActiv",
-        "hdf5":"HDF5", "h5":"HDF5",
-        "datx":"activPAL",
-        "cwa":"Axivity", "CWA":"Axivity"
-    }
+    load_start = datetime.now()
 
+    # when the source_type is left blank, we can assume it from the filename extension and the start of the file
     if source_type == "infer":
+        source_type = infer_source_type(source)
 
-        extension = source.split(".")[-1]
-        if extension in extension_map:
-
-            source_type = extension_map[extension]
-        else:
-
-            raise Exception("Cannot assume file type from extension ({}), specify source_type when trying to load this file.".format(extension))
-
-
-    if (source_type == "Actiheart"):
-
-        first_lines = []
-        f = open(source, 'r')
-        for i in range(0,30):
-            s = f.readline().strip()
-            first_lines.append(s)
-        f.close()
-
-        header_info = parse_header(first_lines, "Actiheart", "%d-%b-%Y  %H:%M")
-
-        start_date = header_info["start_date"]
-        epoch_length = header_info["epoch_length"]
-        data_start = header_info["data_start"]
-
-        mapping = {"comma":",", "tab":"\t"}
-
-        activity, ecg  = np.loadtxt(source, delimiter=mapping[header_info["delimiter"]], unpack=True, skiprows=data_start, usecols=[1,2])
-
-        timestamp_list = [start_date+i*epoch_length for i in range(len(activity))]
-        timestamps = np.array(timestamp_list)
-
+    file_format = get_format(source_type)
 
-        if "Start trimmed to" in header_info:
-            indices1 = (timestamps > header_info["Start trimmed to"])
-            activity = activity[indices1]
-            ecg = ecg[indices1]
-            timestamps = timestamps[indices1]
-
-        ecg[(ecg <= 0)] = -1
-
-        actiheart_activity = Channel("Chest")
-        actiheart_activity.set_contents(activity, timestamps)
-
-        actiheart_ecg = Channel("HR")
-        actiheart_ecg.set_contents(ecg, timestamps)
-
-        actiheart_ecg.missing_value = -1
+    # Only page-structured formats can skip straight to the requested time period, though any can be summarised into epochs within one
+    if time_period is not None and epoch is None and not file_format["time_period"]:
+        raise Exception("Loading a time_period is not supported for source type {}.".format(source_type))
 
-        actiheart_ecg.draw_properties = {"c":[0.8,0.05,0.05]}
-        actiheart_activity.draw_properites = {"c":[0.05,0.8,0.8]}
+    # dtype "native" keeps the device's own integer values, with a scale_factor and scale_offset on each Channel to convert them
+    if dtype == "native" and not file_format["native"]:
+        raise Exception("Loading native values is not supported for source type {}.".format(source_type))
 
-        header = header_info
-        channels = [actiheart_activity, actiheart_ecg]
+    options = dict(datetime_format=datetime_format, datetime_column=datetime_column, ignore_columns=ignore_columns, unique_names=unique_names, hdf5_mode=hdf5_mode, hdf5_group=hdf5_group)
 
-    elif (source_type == "activPAL_CSV"):
+    # Only read enough of the file to describe it, and return an empty Time_Series
+    if header_only:
+        return Time_Series(""), probe(source, source_type, **options)
 
-        ap_timestamp, ap_x, ap_y, ap_z = np.loadtxt(source, delimiter=',', unpack=True, skiprows=5, dtype={'names':('ap_timestamp','ap_x','ap_y','ap_z'), 'formats':('S16','f8','f8','f8')})
-        #print("A")
-        dt = datetime.strptime("30-Dec-1899", "%d-%b-%Y")
+    # With an epoch length, the file is summarised into epoch level features as it is decoded, and no sample level data is kept
+    if epoch is not None:
 
-        ap_timestamps = []
-        for val in ap_timestamp:
+        handler = get_handler(source_type)
+        if not hasattr(handler, "batches"):
+            raise Exception("Loading epochs is not supported for source type {}.".format(source_type))
 
-            test = val.split(".")
+        decoded = handler.batches(source, source_type, channels=epoch_channels(features), **options)
+        if decoded is None:
+            raise Exception("Loading epochs is not supported for source type {}.".format(source_type))
 
-            while len(test[1]) < 10:
-                test[1] = test[1] + "0"
+        header, batches = decoded
+        ts = summarise_epochs(batches, epoch, features, header.get("frequency", None), time_period)
+        file_channels = ts.channels
 
-            finaltest = dt + timedelta(days=int(test[0]), microseconds=int(test[1])*8.64)
-            ap_timestamps.append(finaltest)
+    else:
 
-        ap_timestamps = np.array(ap_timestamps)
-        #print("B")
-        x = Channel("AP_X")
-        y = Channel("AP_Y")
-        z = Channel("AP_Z")
+        # The handler of each format reads the file into a header and a list of Channel objects, importing whatever it needs to do so
+        header, file_channels = get_handler(source_type).load(source, source_type, workers=workers, time_period=time_period, index=index, channels=channels, dtype=dtype, **options)
 
-        ap_x = (ap_x-128.0)/64.0
-        ap_y = (ap_y-128.0)/64.0
-        ap_z = (ap_z-128.0)/64.0
+    # Only the requested channels are kept (all of them if None), and float data is stored as dtype unless that is the default
+    if channels is not None and epoch is None:
+        file_channels = [c for c in file_channels if c.name in channels]
 
-        x.set_contents(np.array(ap_x, dtype=np.float64), ap_timestamps)
-        y.set_contents(np.array(ap_y, dtype=np.float64), ap_timestamps)
-        z.set_contents(np.array(ap_z, dtype=np.float64), ap_timestamps)
-        #print("C")
-        channels = [x,y,z]
+    if dtype not in ["float64", "native"]:
+        for c in file_channels:
+            if c.data.dtype.kind == "f":
+                c.data = c.data.astype(dtype)
 
-    elif (source_type == "activPAL"):
+    ts = Time_Series("")
+    ts.add_channels(file_channels)
 
-        f = open(source, "rb")
-        data = f.read()
-        filesize = len(data)
-        data = io.BytesIO(data)
+    # Calculate how long it took to load this file
+    load_end = datetime.now()
+    load_duration = (load_end - load_start).total_seconds()
 
-        A = unpack('1024s', data.read(1024))[0]
+    header["generic_num_channels"] = ts.number_of_channels
+    header["generic_first_timestamp"] = ts.earliest.strftime("%d/%m/%Y %H:%M:%S:%f")
+    header["generic_last_timestamp"] = ts.latest.strftime("%d/%m/%Y %H:%M:%S:%f")
+    header["generic_num_samples"] = len(ts.channels[0].data)
+    header["generic_loading_time"] = load_duration
+    header["generic_processing_timestamp"] = load_start.strftime("%d/%m/%Y %H:%M:%S:%f")
 
-        start_time = str((A[256])).rjust(2, "0") + ":" + str((A[257])).rjust(2, "0") + ":" + str((A[258])).rjust(2, "0")
-        start_date = str((A[259])).rjust(2, "0") + "/" + str((A[260])).rjust(2, "0") + "/" + str(2000 + (A[261]))
+    return ts, header
 
-        end_time = str((A[262])).rjust(2, "0") + ":" + str((A[263])).rjust(2, "0") + ":" + str((A[264])).rjust(2, "0")
-        end_date = str((A[265])).rjust(2, "0") + "/" + str((A[266])).rjust(2, "0") + "/" + str(2000 + (A[267]))
+def probe(source, source_type="infer", **load_kwargs):
+    """
+    Describe a file without decoding its samples: the file header, plus generic_first_timestamp, generic_last_timestamp and generic_num_samples as load() would report them.
+    For Axivity and GeneActiv files only the metadata and the first and last pages are read, and for activPAL files only the 1024 byte header.
+    The number of samples (and pages, for Axivity) is estimated from the file size for Axivity, and from the header otherwise.
+    Other formats, whose handler has no probe() or whose probe() returns None, are fully loaded, and the header of that is returned.
+    """
 
-        start = start_date + " " + start_time
-        end = end_date + " " + end_time
+    if source_type == "infer":
+        source_type = infer_source_type(source)
 
-        #print(start_date, start_time)
-        #print(end_date, end_time)
+    handler = get_handler(source_type)
+    probe_file = getattr(handler, "probe", None)
 
-        # Given in Hz
-        sampling_frequency = A[35]
+    description = None
+    if probe_file is not None:
+        description = probe_file(source, source_type, **load_kwargs)
 
-        # 0 = 2g, 1 = 4g (therefore double the raw values), 2 = 8g (therefore quadruple the raw values)
-        dynamic_range = A[38]
-        dynamic_multiplier = 2**dynamic_range
+    if description is None:
+        ts, header = load(source, source_type, **load_kwargs)
+        return header
 
-        start_python = datetime.strptime(start, "%d/%m/%Y %H:%M:%S")
-        end_python = datetime.strptime(end, "%d/%m/%Y %H:%M:%S")
-        duration = end_python - start_python
+    header, first_timestamp, last_timestamp, num_samples = description
 
-        num_records = int(duration.total_seconds() / (timedelta(seconds=1)/sampling_frequency).total_seconds())
+    header["generic_first_timestamp"] = first_timestamp.strftime("%d/%m/%Y %H:%M:%S:%f")
+    header["generic_last_timestamp"] = last_timestamp.strftime("%d/%m/%Y %H:%M:%S:%f")
+    header["generic_num_samples"] = num_samples
 
-        #print("expected records:", num_records)
-        #print("sampling frequency", (A[35]))
-        #print("header end", A[1012:1023])
+    return header
 
-        n = 0
-        data_cache = False
-        # extract timestamp
+def load_in_worker(source, load_kwargs):
+    """
+    Load a file in a worker process of load_many(), closing any HDF5 file left open in the header so the result can be sent back.
+    """
 
-        x = np.zeros(num_records)
-        y = np.zeros(num_records)
-        z = np.zeros(num_records)
+    ts, header = load(source, **load_kwargs)
 
-        x.fill(-1.1212121212121)
-        y.fill(-1.1212121212121)
-        z.fill(-1.1212121212121)
+    if "hdf5_file" in header:
+        header.pop("hdf5_file").close()
 
-        last_a,last_b,last_c = 0,0,0
+    return ts, header
 
-        while n < num_records and data.tell() < filesize:
+def load_many(sources, workers=1, max_pending=None, **load_kwargs):
+    """
+    A generator that loads each of the given files with load(sources[i], **load_kwargs), and yields (source, Time_Series, header) as each one is finished.
+    With workers > 1 the files are decoded in a pool of that many processes, each file by a single process, and yielded in the order they finish.
+    At most max_pending files (2 per worker by default) are being loaded or waiting to be collected at once, so only that many are held in memory.
+    A file that fails to load doesn't stop the rest; it is yielded as (source, None, the exception raised).
+    """
 
+    if workers <= 1:
+        for source in sources:
             try:
-                data_cache = data.read(3)
-                a,b,c = unpack('ccc', data_cache)
-                a,b,c = ord(a), ord(b), ord(c)
-
-                #print(a,b,c)
-
-                # activPAL writes TAIL but these values could legitimately turn up
-                if a == 116 and b == 97 and c == 105:
-                    # if a,b,c spell TAI
-
-                    d = ord(unpack('c', data.read(1))[0])
-                    # and if d == T, so TAIL just came up
-                    if d == 108:
-                        #print ("Found footer!")
-                        #print (data.tell())
-                        remainder = data.read()
-                    else:
-                    # Otherwise TAI came up coincidently
-                    # Meaning a,b,c was a legitimate record, and we just read in a from another record
-                    # So read in the next 2 bytes and record 2 records: a,b,c and d,e,f
-                        e,f = unpack('cc', data.read(2))
-                        e,f = ord(e), ord(f)
-                        x[n] = a
-                        y[n] = b
-                        z[n] = c
-                        n += 1
-                        x[n] = d
-                        y[n] = e
-                        z[n] = f
-                        n += 1
-
-                else:
-                    if a == 0 and b == 0:
-                        # repeat last abc C-1 times
-                        x[n:(n+c+1)] = [last_a for val in range(c+1)]
-                        y[n:(n+c+1)] = [last_b for val in range(c+1)]
-                        z[n:(n+c+1)] = [last_c for val in range(c+1)]
-                        n += c+1
-                    else:
-                        x[n] = a
-                        y[n] = b
-                        z[n] = c
-                        n += 1
-
-                last_a, last_b, last_c = a,b,c
-
-
-            except:
-                """
-                print("Exception tell", data.tell())
-                print(str(sys.exc_info()))
-                print("data_cache:", data_cache)
-                print("len(data_cache)", len(data_cache))
-
-                for a in data_cache:
-                    print(a)
-                """
-                break
-
-
-        x.resize(n)
-        y.resize(n)
-        z.resize(n)
-
-        x = (x-128.0)/64.0
-        y = (y-128.0)/64.0
-        z = (z-128.0)/64.0
-
-        if dynamic_multiplier > 1:
-            x *= dynamic_multiplier
-            y *= dynamic_multiplier
-            z *= dynamic_multiplier
-
-        delta = timedelta(seconds=1)/sampling_frequency
-        timestamps = np.array([start_python + delta*i for i in range(n)])
-
-        x_channel = Channel("X")
-        y_channel = Channel("Y")
-        z_channel = Channel("Z")
-
-        x_channel.set_contents(x, timestamps)
-        y_channel.set_contents(y, timestamps)
-        z_channel.set_contents(z, timestamps)
-
-        for c in [x_channel, y_channel, z_channel]:
-            c.sparsely_timestamped = False
-            c.frequency = sampling_frequency
-
-        header["frequency"] = sampling_frequency
-        header["dynamic_range"] = dynamic_range
-
-
-        channels = [x_channel, y_channel, z_channel]
-
-    elif (source_type == "GeneActiv_CSV"):
-
-        ga_timestamp, ga_x, ga_y, ga_z, ga_lux, ga_event, ga_temperature = np.genfromtxt(source, delimiter=',', unpack=True, skip_header=80, dtype=str)
-
-        ga_x = np.array(ga_x, dtype=np.float64)
-        ga_y = np.array(ga_y, dtype=np.float64)
-        ga_z = np.array(ga_z, dtype=np.float64)
-        ga_lux = np.array(ga_lux, dtype=np.int32)
-        ga_event = np.array(ga_event, dtype=np.bool_)
-        ga_temperature = np.array(ga_temperature, dtype=np.float32)
-
-        ga_timestamps = []
-
-        for i in range(0, len(ga_timestamp)):
-            ts = datetime.strptime(ga_timestamp[i], "%Y-%m-%d %H:%M:%S:%f")
-            ga_timestamps.append(ts)
-        ga_timestamps = np.array(ga_timestamps)
-
-        x = Channel("GA_X")
-        y = Channel("GA_Y")
-        z = Channel("GA_Z")
-        lux = Channel("GA_Lux")
-        event = Channel("GA_Event")
-        temperature = Channel("GA_Temperature")
-
-        x.set_contents(ga_x, ga_timestamps)
-        y.set_contents(ga_y, ga_timestamps)
-        z.set_contents(ga_z, ga_timestamps)
-        lux.set_contents(ga_lux, ga_timestamps)
-        event.set_contents(ga_event, ga_timestamps)
-        temperature.set_contents(ga_temperature, ga_timestamps)
-
-        channels = [x,y,z,lux,event,temperature]
-
-    elif (source_type == "Actigraph"):
-
-        first_lines = []
-        f = open(source, 'r')
-        for i in range(0,10):
-            s = f.readline().strip()
-            first_lines.append(s)
-
-
-        header_info = parse_header(first_lines, "Actigraph", datetime_format)
-
-        time = header_info["start_datetime"]
-        epoch_length = timedelta(seconds=header_info["epoch_length_seconds"])
-        mode = header_info["mode"]
-
-        # If the mode is not one of those currently supported, raise an error
-        if mode not in [0,1,3,4,5]:
-            raise Exception("Mode {} is not currently supported.".format(mode))
+                ts, header = load(source, **load_kwargs)
+            except Exception as e:
+                yield source, None, e
+                continue
+            yield source, ts, header
+        return
 
-        count_list = []
-        timestamp_list = []
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-        line = f.readline().strip()
-        while (len(line) > 0):
+    if max_pending is None:
+        max_pending = 2*workers
 
-            counts = line.split()
-            count_list = count_list + counts
-            line = f.readline().strip()
-        f.close()
+    sources = iter(sources)
+    pending = {}
+    executor = ProcessPoolExecutor(max_workers=workers)
 
-        # Cast the strings to integers
-        count_list = [int(c) for c in count_list]
-
-        # If the mode implies the data is count, steps
-        if mode == 1 or mode == 3 or mode == 4:
-
-            count_list = [a for a,b in zip(*[iter(count_list)]*2)]
-
-        # If the mode implies the data is count X, count Y, count Z
-        elif mode == 5:
-
-            count_list = [a for a,b,c in zip(*[iter(count_list)]*3)]
-
-        timestamp_list = [time+t*epoch_length for t in range(len(count_list))]
-
-        timestamps = np.array(timestamp_list)
-        counts = np.abs(np.array(count_list))
-
-        chan = Channel("AG_Counts")
-        chan.set_contents(counts, timestamps)
-
-        channels = [chan]
-        header = header_info
-
-    elif (source_type == "GT3X+_CSV"):
-
-        first_lines = []
-        f = open(source, 'r')
-        for i in range(0,10):
-            s = f.readline().strip()
-            first_lines.append(s)
-        f.close()
-
-        header_info = parse_header(first_lines, "GT3X+_CSV", "")
-
-        time = header_info["start_datetime"]
-        epoch_length = header_info["epoch_length"]
-
-        timestamps = np.genfromtxt(source, delimiter=',', converters={0:convert_actigraph_timestamp}, skip_header=11, usecols=(0))
-
-        x,y,z = np.genfromtxt(source, delimiter=',', skip_header=11, usecols=(1,2,3), unpack=True)
-
-
-        x_chan = Channel("X")
-        y_chan = Channel("Y")
-        z_chan = Channel("Z")
-
-        x_chan.set_contents(x, timestamps)
-        y_chan.set_contents(y, timestamps)
-        z_chan.set_contents(z, timestamps)
-
-        for c in [x_chan, y_chan, z_chan]:
-            c.frequency = header_info["frequency"]
-
-
-        channels = [x_chan,y_chan,z_chan]
-        header = header_info
-
-    elif (source_type == "GT3X+_CSV_ZIP"):
-
-        filename = source.split("/")[-1].replace(".zip", ".csv")
-        archive = zipfile.ZipFile(source)
-        file_handle = archive.open(filename)
-
-        first_lines = []
-        for i in range(0,10):
-            s = file_handle.readline().strip().decode("utf-8")
-            #print(s)
-            first_lines.append(s)
-
-        #print(first_lines)
-
-        header_info = parse_header(first_lines, "GT3X+_CSV", "")
-
-        time = header_info["start_datetime"]
-        epoch_length = header_info["epoch_length"]
-
-        file_handle = archive.open(filename)
-        timestamps = np.genfromtxt(file_handle, delimiter=',', converters={0:convert_actigraph_timestamp}, skip_header=11, usecols=(0))
-
-
-        file_handle = archive.open(filename)
-        x,y,z = np.genfromtxt(file_handle, delimiter=',', skip_header=11, usecols=(1,2,3), unpack=True)
-
-
-
-        x_chan = Channel("X")
-        y_chan = Channel("Y")
-        z_chan = Channel("Z")
-
-        x_chan.set_contents(x, timestamps)
-        y_chan.set_contents(y, timestamps)
-        z_chan.set_contents(z, timestamps)
-
-        channels = [x_chan,y_chan,z_chan]
-        header = header_info
-
-    elif (source_type == "CSV"):
-
-        f = open(source, 'r')
-        s = f.readline().strip()
-        f.close()
-
-        test = s.split(",")
-
-        source_split = source.split("/")
-
-
-        data = np.loadtxt(source, delimiter=',', skiprows=1, dtype='S').astype("U")
-
-
-        timestamps = []
-        for date_row in data[:,datetime_column]:
-            #print(date_row)
-            #print(str(date_row))
-            #print(type(date_row))
-            timestamps.append(datetime.strptime(date_row, datetime_format))
-        timestamps = np.array(timestamps)
-
-        data_columns = list(range(0,len(test)))
-        del data_columns[datetime_column]
-
-        if ignore_columns != False:
-            for ic in ignore_columns:
-                del data_columns[ic]
-
-        #print data_columns
-
-        channels = []
-        for col in data_columns:
-            #print col
-            if unique_names:
-                name = source_split[-1] + " - " + test[col]
-            else:
-                name = test[col]
-            c = Channel(name)
-            c.set_contents(np.array(data[:,col], dtype=np.float64), timestamps)
-            channels.append(c)
-
-    elif (source_type == "Axivity"):
-
-        channel_x = Channel("X")
-        channel_y = Channel("Y")
-        channel_z = Channel("Z")
-        channel_light = Channel("Light")
-        channel_temperature = Channel("Temperature")
-
-        handle = open(source, "rb")
-        raw_bytes = handle.read()
-        #print("Number of bytes:", len(raw_bytes))
-        #print("/512 = ", len(raw_bytes)/512)
-
-        fh = io.BytesIO(raw_bytes)
-
-        n = 0
-        num_samples = 0
-        num_pages = 0
-
-        start = datetime(2014, 1, 1)
-
-        # Rough number of pages expected = length of file / size of block (512 bytes)
-        # Rough number of samples expected = pages * 120
-        # Add 1% buffer just to be cautious - it's trimmed later
-        estimated_num_pages = int(len(raw_bytes)/512 * 1.01)
-        estimated_num_samples = int(estimated_num_pages*120)
-        #print("Estimated number of samples:", estimated_num_samples)
-
-        axivity_x = np.empty(estimated_num_samples)
-        axivity_y = np.empty(estimated_num_samples)
-        axivity_z = np.empty(estimated_num_samples)
-        axivity_light = np.empty(estimated_num_pages)
-        axivity_temperature = np.empty(estimated_num_pages)
-        axivity_timestamps = np.empty(estimated_num_pages, dtype=type(start))
-        axivity_indices = np.empty(estimated_num_pages)
-
-        file_header = OrderedDict()
-
-        lastSequenceId = None
-        lastTimestampOffset = None
-        lastTimestamp = None
-
-        try:
-            header = axivity_read(fh,2)
-
-            while len(header) == 2:
-
-                if header == b'MD':
-                    #print('MD')
-                    file_header = axivity_parse_header(fh)
-                elif header == b'UB':
-                    #print('UB')
-                    blockSize = unpack('H', axivity_read(fh,2))[0]
-                elif header == b'SI':
-                    #print('SI')
-                    pass
-                elif header == b'AX':
-
-                    packetLength, deviceId, sessionId, sequenceId, sampleTimeData, light, temperature, events, battery, sampleRate, numAxesBPS, timestampOffset, sampleCount = unpack('HHIIIHHcBBBhH', axivity_read(fh,28))
-
-                    if packetLength != 508 or sampleRate == 0:
-                        continue
-
-                    if ((numAxesBPS >> 4) & 15) != 3:
-                        print('[ERROR: num-axes not expected]')
-
-                    if (numAxesBPS & 15) == 2:
-                        bps = 6
-                    elif (numAxesBPS & 15) == 0:
-                        bps = 4
-
-                    freq = 3200 / (1 << (15 - sampleRate & 15))
-                    if freq <= 0:
-                        freq = 1
-
-                    timestamp_original = axivity_read_timestamp_raw(sampleTimeData)
-
-                    if timestamp_original is None:
-                        continue
-
-                    # if top-bit set, we have a fractional date
-                    if deviceId & 0x8000:
-                        # Need to undo backwards-compatible shim by calculating how many whole samples the fractional part of timestamp accounts for.
-                        timeFractional = (deviceId & 0x7fff) * 2     # use original deviceId field bottom 15-bits as 16-bit fractional time
-                        timestampOffset += (timeFractional * int(freq)) // 65536 # undo the backwards-compatible shift (as we have a true fractional)
-                        timeFractional = float(timeFractional) / 65536
-
-                        # Add fractional time to timestamp
-                        timestamp = timestamp_original + timedelta(seconds=timeFractional)
-
-                    else:
-
-                        timestamp = timestamp_original
-
-                    # --- Time interpolation ---
-                    # Reset interpolator if there's a sequence break or there was no previous timestamp
-                    if lastSequenceId == None or (lastSequenceId + 1) & 0xffff != sequenceId or lastTimestampOffset == None or lastTimestamp == None:
-                        # Bootstrapping condition is a sample one second ago (assuming the ideal frequency)
-                        lastTimestampOffset = timestampOffset - freq
-                        lastTimestamp = timestamp - timedelta(seconds=1)
-                        lastSequenceId = sequenceId - 1
-
-                    localFreq = timedelta(seconds=(timestampOffset - lastTimestampOffset)) / (timestamp - lastTimestamp)
-                    final_timestamp = timestamp + -timedelta(seconds=timestampOffset) / localFreq
-
-                    # Update for next loop
-                    lastSequenceId = sequenceId
-                    lastTimestampOffset = timestampOffset - sampleCount
-                    lastTimestamp = timestamp
-
-                    axivity_indices[num_pages] = num_samples
-                    axivity_timestamps[num_pages] = final_timestamp
-                    axivity_light[num_pages] = light
-                    axivity_temperature[num_pages] = temperature
-                    num_pages += 1
-
-                    for sample in range(sampleCount):
-
-                        if bps == 6:
-
-                            x, y, z = unpack('hhh', fh.read(6))
-                            x, y, z = x/256.0, y/256.0, z/256.0
-
-                        elif bps == 4:
-
-                            temp = unpack('I', fh.read(4))[0]
-                            temp2 = (6 - byte(temp >> 30))
-                            x = short(short((ushort(65472) & ushort(temp << 6))) >> temp2) / 256.0
-                            y = short(short((ushort(65472) & ushort(temp >> 4))) >> temp2) / 256.0
-                            z = short(short((ushort(65472) & ushort(temp >> 14))) >> temp2) / 256.0
-
-                            # Optimisation: cache value of ushort(65472) ?
+    try:
 
-                        axivity_x[num_samples] = x
-                        axivity_y[num_samples] = y
-                        axivity_z[num_samples] = z
+        while True:
 
-                        num_samples += 1
+            # Keep the pool topped up, without queueing more files than can be held at once
+            for source in itertools.islice(sources, max_pending - len(pending)):
+                pending[executor.submit(load_in_worker, source, load_kwargs)] = source
 
-                    checksum = unpack('H', axivity_read(fh,2))[0]
+            if len(pending) == 0:
+                break
 
-                else:
-                    pass
-                    #print("Unrecognised header", header)
+            finished, not_finished = wait(pending, return_when=FIRST_COMPLETED)
 
-                header = axivity_read(fh,2)
+            for future in finished:
+                source = pending.pop(future)
+                try:
+                    ts, header = future.result()
+                except Exception as e:
+                    yield source, None, e
+                    continue
+                yield source, ts, header
 
-                n=n+1
-        except IOError:
-            # End of file
-            pass
+    finally:
 
-        # We created oversized arrays at the start, to make sure we could fit all the data in
-        # Now we know how much data was there, we can shrink the arrays to size
-        axivity_x.resize(num_samples)
-        axivity_y.resize(num_samples)
-        axivity_z.resize(num_samples)
-        axivity_timestamps.resize(num_pages)
-        axivity_indices.resize(num_pages)
-        axivity_temperature.resize(num_pages)
-        axivity_light.resize(num_pages)
+        # If the caller stops early, files that haven't started yet are abandoned
+        executor.shutdown(wait=True, cancel_futures=True)
 
-        axivity_indices = axivity_indices.astype(int)
+def __getattr__(name):
+    """
+    The decoding functions of each format live in its module in pampro.formats, and can still be found here under their old names.
+    Each format module is only imported once something here can't be found otherwise.
+    """
 
-        # Map the page-level timestamps to the acceleration data "sparsely"
-        channel_x.set_contents(axivity_x, axivity_timestamps, timestamp_policy="sparse")
-        channel_y.set_contents(axivity_y, axivity_timestamps, timestamp_policy="sparse")
-        channel_z.set_contents(axivity_z, axivity_timestamps, timestamp_policy="sparse")
+    if not name.startswith("__"):
+        for source_type in registered_formats:
+            handler = get_handler(source_type)
+            if hasattr(handler, name):
+                return getattr(handler, name)
 
-        channel_light.set_contents(axivity_light, axivity_timestamps, timestamp_policy="sparse")
-        channel_temperature.set_contents(axivity_temperature, axivity_timestamps, timestamp_policy="sparse")
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
-        # Approximate the frequency in hertz, based on the difference between the first and last timestamp
-        approximate_frequency = timedelta(seconds=1)/ ((axivity_timestamps[-1]-axivity_timestamps[0])/num_samples)
+def csv_batches(handle, parse_rows, batch_size=100000):
+    """
+    A generator that parses the rows of an open text file batch_size lines at a time, using the given parse_rows function.
+    """
 
-        for c in [channel_x, channel_y, channel_z]:
-            c.indices = axivity_indices
-            c.frequency = file_header["frequency"]
+    while True:
 
-        file_header["approximate_frequency"] = approximate_frequency
-        file_header["num_pages"] = num_pages
-        file_header["num_samples"] = num_samples
-        channels = [channel_x, channel_y, channel_z, channel_light, channel_temperature]
-        header = file_header
+        lines = list(itertools.islice(handle, batch_size))
+        if len(lines) == 0:
+            break
 
-    elif (source_type == "Axivity_ZIP"):
+        timestamps, samples = parse_rows(lines)
 
-        channel_x = Channel("X")
-        channel_y = Channel("Y")
-        channel_z = Channel("Z")
-        channel_light = Channel("Light")
-        channel_temperature = Channel("Temperature")
+        yield timestamps, None, samples, OrderedDict()
 
-        #print("Opening file")
-        archive = zipfile.ZipFile(source, "r")
+    handle.close()
 
-        without_filepath = source.split("/")[-1]
+def concatenate_batches(batches):
+    """
+    Join consecutive batches of decoded data into one.
+    """
 
-        cwa_not_zip = without_filepath.replace(".zip", ".cwa")
+    if len(batches) == 1:
+        return batches[0]
 
-        handle = archive.open(cwa_not_zip)
+    timestamps = np.concatenate([b[0] for b in batches])
 
-        raw_bytes = handle.read()
-        #print("Number of bytes:", len(raw_bytes))
-        #print("/512 = ", len(raw_bytes)/512)
+    indices = None
+    if batches[0][1] is not None:
 
-        fh = io.BytesIO(raw_bytes)
+        # Each batch's indices are relative to its own samples, so shift them along
+        offsets = np.cumsum([0] + [len(list(b[2].values())[0]) for b in batches[:-1]])
+        indices = np.concatenate([b[1] + offset for b, offset in zip(batches, offsets)])
 
-        n = 0
-        num_samples = 0
-        num_pages = 0
+    samples = OrderedDict([(name, np.concatenate([b[2][name] for b in batches])) for name in batches[0][2]])
+    pages = OrderedDict([(name, np.concatenate([b[3][name] for b in batches])) for name in batches[0][3]])
 
-        start = datetime(2014, 1, 1)
+    return timestamps, indices, samples, pages
 
-        # Rough number of pages expected = length of file / size of block (512 bytes)
-        # Rough number of samples expected = pages * 120
-        # Add 1% buffer just to be cautious - it's trimmed later
-        estimated_size = int(((len(raw_bytes)/512)*120)*1.01)
+def slice_batch(batch, start, end=None):
+    """
+    Return the pages of a decoded batch which are timestamped >= start and < end, along with their samples.
+    """
 
-        #print("Estimated number of observations:", estimated_size)
+    timestamps, indices, samples, pages = batch
 
-        axivity_x = np.empty(estimated_size)
-        axivity_y = np.empty(estimated_size)
-        axivity_z = np.empty(estimated_size)
-        axivity_light = np.empty(int(len(raw_bytes)/512*1.01))
-        axivity_temperature = np.empty(int(len(raw_bytes)/512*1.01))
-        axivity_timestamps = np.empty(int((len(raw_bytes)/512)*1.01), dtype=type(start))
-        axivity_indices = np.empty(int(len(raw_bytes)/512*1.01))
+    first = np.searchsorted(timestamps, start, side="left")
+    last = len(timestamps) if end is None else np.searchsorted(timestamps, end, side="left")
 
-        file_header = OrderedDict()
+    if indices is None:
 
-        try:
-            header = axivity_read(fh,2)
+        # Every sample has its own timestamp
+        sample_slice = slice(first, last)
+        new_indices = None
 
-            while len(header) == 2:
+    else:
 
-                if header == b'MD':
-                    #print('MD')
-                    file_header = axivity_parse_header(fh)
-                elif header == b'UB':
-                    #print('UB')
-                    blockSize = unpack('H', axivity_read(fh,2))[0]
-                elif header == b'SI':
-                    #print('SI')
-                    pass
-                elif header == b'AX':
+        num_samples = len(list(samples.values())[0])
+        first_sample = indices[first] if first < len(indices) else num_samples
+        last_sample = indices[last] if last < len(indices) else num_samples
 
-                    packetLength, deviceId, sessionId, sequenceId, sampleTimeData, light, temperature, events, battery, sampleRate, numAxesBPS, timestampOffset, sampleCount = unpack('HHIIIHHcBBBhH', axivity_read(fh,28))
+        sample_slice = slice(first_sample, last_sample)
+        new_indices = indices[first:last] - first_sample
 
-                    timestamp = axivity_read_timestamp_raw(sampleTimeData)
+    new_samples = OrderedDict([(name, data[sample_slice]) for name, data in samples.items()])
+    new_pages = OrderedDict([(name, data[first:last]) for name, data in pages.items()])
 
-                    if packetLength != 508 or timestamp == None or sampleRate == 0:
-                        continue
+    return timestamps[first:last], new_indices, new_samples, new_pages
 
-                    if ((numAxesBPS >> 4) & 15) != 3:
-                        print('[ERROR: num-axes not expected]')
+def chunk_batches(batches, chunk, overlap):
+    """
+    Regroup consecutive batches of decoded data into consecutive chunks of time, each extended by overlap on either side.
+    Chunks are split at page boundaries, so a page belongs to the chunk its first timestamp falls in.
+    Yields the nominal start of each chunk, and the data in it.
+    """
 
-                    if (numAxesBPS & 15) == 2:
-                        bps = 6
-                    elif (numAxesBPS & 15) == 0:
-                        bps = 4
+    pending = []
+    chunk_start = None
 
-                    #freq = 3200 / (1 << (15 - sampleRate & 15))
-                    #if freq <= 0:
-                    #    freq = 1
-                    #offsetStart = float(-timestampOffset) / float(freq)
+    for batch in batches:
 
-                    time0 = timestamp# + timedelta(milliseconds=offsetStart)
-                    axivity_indices[num_pages] = num_samples
-                    axivity_timestamps[num_pages] = time0
-                    axivity_light[num_pages] = light
-                    axivity_temperature[num_pages] = temperature
-                    num_pages += 1
+        pending.append(batch)
 
-                    for sample in range(sampleCount):
+        if chunk_start is None:
+            chunk_start = batch[0][0]
 
-                        x,y,z = 0,0,0
+        # Once data beyond the end of the chunk (plus overlap) has been decoded, the chunk is complete
+        if batch[0][-1] >= chunk_start + chunk + overlap:
 
-                        if bps == 6:
+            buffered = concatenate_batches(pending)
 
-                            x,y,z = unpack('hhh', fh.read(6))
-                            x,y,z = x/256.0,y/256.0,z/256.0
+            while buffered[0][-1] >= chunk_start + chunk + overlap:
 
-                        elif bps == 4:
-                            temp = unpack('I', fh.read(4))[0]
-                            temp2 = (6 - byte(temp >> 30))
-                            x = short(short((ushort(65472) & ushort(temp << 6))) >> temp2) / 256.0
-                            y = short(short((ushort(65472) & ushort(temp >> 4))) >> temp2) / 256.0
-                            z = short(short((ushort(65472) & ushort(temp >> 14))) >> temp2) / 256.0
+                chunk_data = slice_batch(buffered, chunk_start - overlap, chunk_start + chunk + overlap)
+                if len(chunk_data[0]) > 0:
+                    yield chunk_start, chunk_data
 
-                            # Optimisation:
-                            # Cache value of ushort(65472) ?
+                chunk_start += chunk
+                buffered = slice_batch(buffered, chunk_start - overlap)
 
+            pending = [buffered]
 
-                        #t = sample*sampleOffset + time0
+    # Whatever remains is the end of the file
+    if len(pending) > 0:
 
-                        axivity_x[num_samples] = x
-                        axivity_y[num_samples] = y
-                        axivity_z[num_samples] = z
+        buffered = concatenate_batches(pending)
 
-                        num_samples += 1
+        while len(buffered[0]) > 0 and buffered[0][-1] >= chunk_start:
 
+            chunk_data = slice_batch(buffered, chunk_start - overlap, chunk_start + chunk + overlap)
+            if len(chunk_data[0]) > 0:
+                yield chunk_start, chunk_data
 
+            chunk_start += chunk
+            buffered = slice_batch(buffered, chunk_start - overlap)
 
-                    checksum = unpack('H', axivity_read(fh,2))[0]
+def stream(source, source_type="infer", chunk=timedelta(hours=6), overlap=timedelta(seconds=0), datetime_format="%d/%m/%Y %H:%M:%S:%f", datetime_column=0, ignore_columns=False, unique_names=False, channels=None, dtype="float64"):
+    """
+    Read a file piece by piece, yielding a (Time_Series, header) pair for each consecutive chunk of time, starting from the first timestamp.
+    Each chunk also contains overlap worth of data either side of it, for windowed operations that need context at the edges.
+    Only a chunk's worth of data is held in memory at once, however long the recording is.
+    channels and dtype select what is decoded, as they do for load().
+    Supports the formats whose handler has batches(): Axivity, GeneActiv, activPAL, GT3X, CSV, GT3X+_CSV, GT3X+_CSV_ZIP and GeneActiv_CSV files.
+    """
 
+    if source_type == "infer":
+        source_type = infer_source_type(source)
+
+    if dtype == "native" and not get_format(source_type)["native"]:
+        raise Exception("Loading native values is not supported for source type {}.".format(source_type))
+
+    handler = get_handler(source_type)
+    read_batches = getattr(handler, "batches", None)
+
+    decoded = None
+    if read_batches is not None:
+        decoded = read_batches(source, source_type, datetime_format=datetime_format, datetime_column=datetime_column, ignore_columns=ignore_columns, unique_names=unique_names, channels=channels, dtype=dtype)
+
+    if decoded is None:
+        raise Exception("Streaming is not supported for source type {}.".format(source_type))
+
+    header, batches = decoded
+    frequency = header.get("frequency", None)
+
+    for chunk_start, (timestamps, indices, samples, pages) in chunk_batches(batches, chunk, overlap):
+
+        chunk_channels = channels_from_pages(timestamps, indices, samples, pages, frequency, channels)
+
+        if dtype == "native":
+            set_scales(chunk_channels, handler.scales(header))
+        elif dtype != "float64":
+            for c in chunk_channels:
+                if c.data.dtype.kind == "f":
+                    c.data = c.data.astype(dtype)
+
+        ts = Time_Series("")
+        ts.add_channels(chunk_channels)
+
+        chunk_header = header.copy()
+        chunk_header["chunk_start"] = chunk_start
+        chunk_header["chunk_end"] = chunk_start + chunk
+
+        yield ts, chunk_header
+
+# The epoch level features load() can calculate while decoding: the axes each needs, and the name of the Channel it is returned in
+# Each is the mean over the epoch of a sample level signal, named as Channel.piecewise_statistics() would name the mean of that signal
+epoch_features = OrderedDict([
+    ("vm", (["X", "Y", "Z"], "VM_mean")),
+    ("enmo", (["X", "Y", "Z"], "ENMO_mean")),
+    ("enmo_a", (["X", "Y", "Z"], "ENMOa_mean")),
+    ("vm_hpf", (["X", "Y", "Z"], "VM_HPF_mean")),
+    ("x_mean", (["X"], "X_mean")),
+    ("y_mean", (["Y"], "Y_mean")),
+    ("z_mean", (["Z"], "Z_mean"))
+])
+
+def epoch_channels(features):
+    """
+    The axes that have to be decoded to calculate the given epoch level features.
+    """
+
+    for feature in features:
+        if feature not in epoch_features:
+            raise Exception("Unknown epoch feature {}, the supported features are: {}.".format(feature, ", ".join(epoch_features)))
+
+    return [axis for axis in ["X", "Y", "Z"] if any(axis in epoch_features[feature][0] for feature in features)]
+
+def sparse_epoch_boundaries(page_times, page_starts, boundaries, frequency, first_time, num_samples=None):
+    """
+    Find the index of the first sample in each epoch starting at the given boundaries (all in microseconds since 1970), for samples timestamped at the start of each page.
+    This is what Channel.get_windows() finds for a sparsely timestamped Channel: boundaries up to first_time (the first page of the file) are index 0,
+    and once num_samples says the file has ended, boundaries after its last page are num_samples.
+    Only the pages around the boundaries are needed, so page_times and page_starts can leave out the pages before them.
+    """
+
+    pages = Channel("")
+    pages.timestamps = page_times.astype("datetime64[us]")
+    pages.indices = page_starts
+    if frequency is not None:
+        pages.frequency = frequency
+
+    found = pages.get_sparse_data_indices(boundaries.astype("datetime64[us]"))
+    found = np.where(boundaries <= first_time, 0, found)
+    if num_samples is not None:
+        found = np.where(boundaries > page_times[-1], num_samples, found)
+
+    return found
+
+def summarise_epochs(batches, epoch, features, frequency=None, time_period=None):
+    """
+    Calculate epoch level features from a generator of decoded batches, one batch at a time, so that only 1 batch of samples is ever held in memory.
+    The signals are those of channel_inference: VM, ENMO and ENMOa from infer_vector_magnitude(), infer_enmo() and infer_enmo_a(), and VM_HPF from infer_vm_hpf(), whose filter carries on from one batch to the next.
+    Returns a Time_Series with a Channel for each feature, like Channel.piecewise_statistics() gives for the mean of that signal:
+    epochs start at midnight before the first sample and run up to midnight after the last, and are -1 where there is no data.
+    Samples timestamped at the start of each page are split into epochs exactly as piecewise_statistics() splits a sparsely timestamped Channel (see sparse_epoch_boundaries()),
+    so the samples after the last page all fall in the epoch holding its timestamp, like load() gives for .cwa files.
+    GeneActiv's load() also timestamps the end of the last page, which batches don't, so epochs after the start of its last page can differ slightly.
+    Only samples within time_period count towards the epochs, if it is given.
+    """
+
+    epoch_length = epoch // timedelta(microseconds=1)
+    origin = None
+    last_time = None
+    totals = []
+
+    if time_period is not None:
+        period = np.array(datetimes_to_microseconds(time_period), dtype=np.int64)
+
+    # Page timestamped samples wait here until the pages after them say which epoch they are in
+    page_times = np.zeros(0, dtype=np.int64)
+    page_starts = np.zeros(0, dtype=np.int64)
+    first_time = None
+    num_samples = 0
+    pending = []
+    pending_from = 0
+    next_epoch = 0
+
+    if "vm_hpf" in features:
+
+        from scipy.signal import butter, lfilter
+
+        if frequency is None:
+            raise Exception("The vm_hpf feature needs to know the sampling frequency, which this file's header doesn't give.")
+
+        b, a = butter(4, 0.2 / (0.5 * frequency), btype="high")
+        filter_state = np.zeros(max(len(a), len(b)) - 1)
+
+    for timestamps, indices, samples, pages in itertools.chain(batches, [(None, None, None, None)]):
+
+        if timestamps is None or len(timestamps) == 0:
+            if timestamps is not None or len(page_times) == 0:
+                continue
+            signals = None
+        else:
+            times = (np.array(timestamps, dtype="datetime64[us]") - np.datetime64(0, "us")).astype(np.int64)
+
+            # Epochs are counted from midnight before the first sample
+            if origin is None:
+                origin = datetimes_to_microseconds([start_of_day(microseconds_to_datetimes(times[:1])[0])])[0]
+
+            signals = OrderedDict()
+            if any(feature in features for feature in ["vm", "enmo", "enmo_a", "vm_hpf"]):
+                vm = np.sqrt(samples["X"]*samples["X"] + samples["Y"]*samples["Y"] + samples["Z"]*samples["Z"])
+
+            for feature in features:
+                if feature == "vm":
+                    signals[feature] = vm
+                elif feature == "enmo":
+                    signals[feature] = np.maximum((vm - 1.0)*1000.0, 0)
+                elif feature == "enmo_a":
+                    signals[feature] = np.absolute((vm - 1.0)*1000.0)
+                elif feature == "vm_hpf":
+                    filtered, filter_state = lfilter(b, a, vm, zi=filter_state)
+                    signals[feature] = np.multiply(1000.0, abs(filtered))
                 else:
-                    pass
-                    #print("Unrecognised header", header)
-
-                header = axivity_read(fh,2)
-
-                n=n+1
-        except IOError:
-            pass
-
-
-
-        axivity_x.resize(num_samples+1)
-        axivity_y.resize(num_samples+1)
-        axivity_z.resize(num_samples+1)
-        axivity_timestamps.resize(num_pages+1)
-        axivity_indices.resize(num_pages+1)
-        axivity_temperature.resize(num_pages)
-        axivity_light.resize(num_pages)
-
-        #approximate_frequency = timedelta(seconds=1)/ ((axivity_timestamps[-2]-axivity_timestamps[0])/num_samples)
-
-        # Timestamp the final observation
-        axivity_timestamps[-1] = axivity_timestamps[-2] + ((num_samples/num_pages)*(timedelta(seconds=1)/file_header["frequency"]))
-        axivity_indices[-1] = num_samples
-        axivity_indices = axivity_indices.astype(int)
-        
-        channel_x.set_contents(axivity_x, axivity_timestamps, timestamp_policy="sparse")
-        channel_y.set_contents(axivity_y, axivity_timestamps, timestamp_policy="sparse")
-        channel_z.set_contents(axivity_z, axivity_timestamps, timestamp_policy="sparse")
-
-        channel_light.set_contents(axivity_light, axivity_timestamps, timestamp_policy="sparse")
-        channel_temperature.set_contents(axivity_temperature, axivity_timestamps, timestamp_policy="sparse")
-
-        for c in [channel_x, channel_y, channel_z]:
-            c.indices = axivity_indices
-            #c.sparsely_timestamped = True
-            c.frequency = file_header["frequency"]
-
-        #file_header["frequency"] = approximate_frequency
-        file_header["num_pages"] = num_pages
-        file_header["num_samples"] = num_samples
-        channels = [channel_x, channel_y, channel_z, channel_light, channel_temperature]
-        header = file_header
-
-    elif (source_type == "GeneActiv"):
+                    signals[feature] = samples[feature[0].upper()]
 
-        # Open the file in read binary mode, read it into a data block
-        f = open(source, "rb")
-        data = io.BytesIO(f.read())
-        #print("File read in")
+        if signals is not None and indices is None:
 
-        # First 59 lines contain header information
-        first_lines = [data.readline().strip().decode() for i in range(59)]
-        #print(first_lines)
-        header_info = parse_header(first_lines, "GeneActiv", "")
-        #print(header_info)
+            keep = times >= origin
+            if time_period is not None:
+                keep &= (times >= period[0]) & (times < period[1])
 
-        n = header_info["number_pages"]
-        obs_num = 0
-        ts_num = 0
-        # Data format contains 300 XYZ values per page
-        num = 300
-        x_values = np.empty(int(num*n))
-        y_values = np.empty(int(num*n))
-        z_values = np.empty(int(num*n))
+            last_time = times[-1]
+            if not keep.any():
+                continue
 
-        # We will timestamp every 1 second of data to the nearest second
-        # 300 / frequency = number of timestamps per page
-        timestamps_per_page = int(num / header_info["frequency"])
-        num_timestamps = (timestamps_per_page * header_info["number_pages"]) + 1
+            epoch_numbers = (times[keep] - origin) // epoch_length
+            signals = OrderedDict([(feature, signal[keep]) for feature, signal in signals.items()])
 
-        ga_timestamps = np.empty(int(num_timestamps), dtype=type(header_info["start_datetime_python"]))
-        ga_indices = np.empty(int(num_timestamps))
-
-        # For each page
-        for i in range(n):
-
-            #xs,ys,zs,times = read_block(data, header_info)
-            lines = [data.readline().strip().decode() for l in range(9)]
-            page_time = datetime.strptime(lines[3][10:29], "%Y-%m-%d %H:%M:%S")# + timedelta(microseconds=int(lines[3][30:])*1000)
-
-            ga_timestamps[ts_num] = page_time
-            ga_indices[ts_num] = obs_num
-
-            for k in range(timestamps_per_page):
-                ga_timestamps[ts_num+1] = page_time + (timedelta(seconds=1) * (k+1))
-                ga_indices[ts_num+1] = obs_num + (int(header_info["frequency"]) * (k+1))
-                ts_num += 1
-
-            # For each 12 byte measurement in page (300 of them)
-            for j in range(num):
-
-                #time = page_time + (j * header_info["epoch"])
-
-                block = data.read(12)
-
-                x = int(block[0:3], 16)
-                y = int(block[3:6], 16)
-                z = int(block[6:9], 16)
-
-                x, y, z = twos_comp(x, 12), twos_comp(y, 12), twos_comp(z, 12)
-                #print(x,y,z)
-                x_values[obs_num] = x
-                y_values[obs_num] = y
-                z_values[obs_num] = z
-                #time_values[obs_num] = time
-                obs_num += 1
-
-
-            excess = data.read(2)
-
-        # Timestamp the final observation
-        ga_timestamps[-1] = page_time + (num*(timedelta(seconds=1)/header_info["frequency"]))
-        ga_indices[-1] = obs_num
-        ga_indices = ga_indices.astype(int)
-
-        x_values = np.array([(x * 100.0 - header_info["x_offset"]) / header_info["x_gain"] for x in x_values])
-        y_values = np.array([(y * 100.0 - header_info["y_offset"]) / header_info["y_gain"] for y in y_values])
-        z_values = np.array([(z * 100.0 - header_info["z_offset"]) / header_info["z_gain"] for z in z_values])
-
-        x_channel = Channel("X")
-        y_channel = Channel("Y")
-        z_channel = Channel("Z")
-
-        x_channel.set_contents(x_values, ga_timestamps, timestamp_policy="sparse")
-        y_channel.set_contents(y_values, ga_timestamps, timestamp_policy="sparse")
-        z_channel.set_contents(z_values, ga_timestamps, timestamp_policy="sparse")
-
-
-        for c in [x_channel, y_channel, z_channel]:
-            c.indices = ga_indices
-            c.frequency = header_info["frequency"]
-
-        channels = [x_channel, y_channel, z_channel]
-        header = header_info
-
-    elif (source_type == "XLO"):
-
-        # First 15 lines contain generic header info
-        first_lines = []
-        f = open(source, 'r')
-        for i in range(15):
-            s = f.readline().strip()
-            first_lines.append(s)
+        else:
 
-        header_info = parse_header(first_lines, "XLO", "%d/%m/%Y %H:%M:%S")
-        data = np.loadtxt(f, delimiter="\t", dtype="S").astype("U")
-        f.close()
+            if signals is not None:
+                if first_time is None:
+                    first_time = times[0]
+                page_times = np.concatenate((page_times, times))
+                page_starts = np.concatenate((page_starts, np.asarray(indices, dtype=np.int64) + num_samples))
+                num_samples += len(next(iter(samples.values())))
+                pending.append(signals)
+
+            # Until the file ends, only epochs starting before the last page seen so far are certain
+            final = signals is None
+            last_time = page_times[-1]
+            if final:
+                last_epoch = (last_time - origin) // epoch_length + 1
+            else:
+                last_epoch = -(-(last_time - origin) // epoch_length) - 1
+                if last_epoch <= next_epoch:
+                    continue
 
-        # Skip the "empty" artefacts
-        good_rows = data[:,0] == '   -    '
-        data = data[good_rows]
+            epoch_range = np.arange(next_epoch, last_epoch + 1, dtype=np.int64)
+            boundaries = sparse_epoch_boundaries(page_times, page_starts, origin + epoch_range*epoch_length, frequency, first_time, num_samples if final else None)
 
-        # Timestamps
-        start = header_info["start_datetime_python"]
-        mins = [int(t.strip().split(":")[0]) for t in data[:,2]]
-        secs = [int(t.strip().split(":")[1]) for t in data[:,2]]
-        time = [m*60+s for m,s in zip(mins,secs)]
-        timestamps = np.array([start+timedelta(seconds=m*60+s) for m,s in zip(mins,secs)])
+            signals = OrderedDict([(feature, np.concatenate([signal[feature] for signal in pending])) for feature in features])
+            sample_numbers = np.arange(pending_from, boundaries[-1])
+            epoch_numbers = epoch_range[np.searchsorted(boundaries, sample_numbers, side="right") - 1]
 
-        varlist = ['T-body', 'Pmean', 'Time', 't-ph', 'RPM', 'Load', 'Speed', 'Elev.', 'VTex', 'VTin', 't-ex', 't-in', 'BF', "V'E", "V'O2", "V'CO2", 'RER', 'FIO2', 'FICO2', 'FEO2', 'FECO2', 'FETO2', 'FETCO2', 'PEO2', 'PECO2', 'PETO2', 'PETCO2', 'EqO2', 'EqCO2', 'VDe', 'VDc/VT', 'VDe/VT']
-        ignore = ['T-body', 'Pmean', 'Time', 't-ph', 'RPM', 'Load', 'Speed', 'Elev.']
-        for i,var in enumerate(varlist):
+            keep = epoch_numbers*epoch_length + origin < last_time if final else np.ones(len(sample_numbers), dtype=bool)
+            if time_period is not None:
+                limits = sparse_epoch_boundaries(page_times, page_starts, period, frequency, first_time, num_samples if final else None)
+                limits = np.where((period < last_time) | final, limits, boundaries[-1])
+                keep &= (sample_numbers >= limits[0]) & (sample_numbers < limits[1])
 
-            if not var in ignore:
-                chan = Channel(var)
+            pending = [OrderedDict([(feature, signal[boundaries[-1] - pending_from:]) for feature, signal in signals.items()])]
+            pending_from = boundaries[-1]
+            next_epoch = last_epoch
 
-                missings = data[:, i] == '   -    '
-                data[missings,i] = 0
+            # The pages before the last certain epoch boundary aren't needed to place the ones after it
+            first_page = max(0, int(np.searchsorted(page_times, origin + next_epoch*epoch_length)) - 1)
+            page_times = page_times[first_page:]
+            page_starts = page_starts[first_page:]
 
-                chan.set_contents(data[:,i].astype("float"), timestamps)
-                channels.append(chan)
+            signals = OrderedDict([(feature, signal[:len(sample_numbers)][keep]) for feature, signal in signals.items()])
+            epoch_numbers = epoch_numbers[keep]
+            if len(epoch_numbers) == 0:
+                continue
 
-                if var in ["V'O2", "V'CO2"]:
-                    chan.data /= header_info["weight"]
+        # Sum each signal within each epoch this batch touches
+        first_epoch = epoch_numbers.min()
+        counts = np.bincount(epoch_numbers - first_epoch)
+        sums = [np.bincount(epoch_numbers - first_epoch, weights=signals[feature]) for feature in features]
 
-        header = header_info
+        totals.append((first_epoch, counts, sums))
 
-    elif (source_type == "HDF5"):
+    if origin is None:
+        raise Exception("No data found to summarise into epochs.")
 
-        f = h5py.File(source, hdf5_mode)
+    end = datetimes_to_microseconds([end_of_day(microseconds_to_datetimes([last_time])[0])])[0]
+    num_epochs = int(-(-(end - origin) // epoch_length))
 
-        header["hdf5_file"] = f
+    counts = np.zeros(num_epochs, dtype=np.int64)
+    sums = np.zeros((len(features), num_epochs))
+    for first_epoch, batch_counts, batch_sums in totals:
+        counts[first_epoch:first_epoch+len(batch_counts)] += batch_counts[:num_epochs-first_epoch]
+        for i, feature_sums in enumerate(batch_sums):
+            sums[i, first_epoch:first_epoch+len(feature_sums)] += feature_sums[:num_epochs-first_epoch]
 
-        raw_group = f[hdf5_group]
-        ts = load_time_series(raw_group)
+    timestamps = microseconds_to_datetimes(origin + np.arange(num_epochs, dtype=np.int64) * epoch_length)
 
-    # channels is a list of Channel objects, set above according to the file format
-    ts.add_channels(channels)
+    channel_list = []
+    for feature, feature_sums in zip(features, sums):
 
-    # Calculate how long it took to load this file
-    load_end = datetime.now()
-    load_duration = (load_end - load_start).total_seconds()
+        channel = Channel(epoch_features[feature][1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            channel.set_contents(np.where(counts > 0, feature_sums / counts, -1), timestamps)
+        channel.missing_value = -1
+        channel_list.append(channel)
 
-    header["generic_num_channels"] = ts.number_of_channels
-    header["generic_first_timestamp"] = ts.earliest.strftime("%d/%m/%Y %H:%M:%S:%f")
-    header["generic_last_timestamp"] = ts.latest.strftime("%d/%m/%Y %H:%M:%S:%f")
-    header["generic_num_samples"] = len(ts.channels[0].data)
-    header["generic_loading_time"] = load_duration
-    header["generic_processing_timestamp"] = load_start.strftime("%d/%m/%Y %H:%M:%S:%f")
+    ts = Time_Series("")
+    ts.add_channels(channel_list)
 
-    return ts, header
+    return ts
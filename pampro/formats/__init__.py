@@ -0,0 +1,95 @@
+from collections import OrderedDict
+import importlib
+
+# source_type -> how to recognise and read files of that type, in the order they are checked when inferring a source_type
+formats = OrderedDict()
+
+def register_format(source_type, handler, extensions=[], magic=None, time_period=False, native=False):
+    """
+    Register a file format that data_loading.load() can read, under the name source_type.
+    handler is a module, or the dotted name of one to import the first time a file of this type is read. It must have a function:
+        load(source, source_type, **options), returning the header and a list of Channel objects
+    and may also have:
+        probe(source, source_type, **options), returning the header, first timestamp, last timestamp and number of samples without decoding them
+        batches(source, source_type, **options), returning the header and a generator of decoded batches, for data_loading.stream()
+        scales(header), the scale_factor and scale_offset of each channel, when native is True
+    A handler shared by several source types returns None from probe() or batches() for a source_type it can't do that for.
+    options are the keyword arguments given to data_loading.load(), so each handler picks out the ones it understands.
+    extensions are the filename extensions of the format (case insensitive), and magic the bytes a file of the format starts with, if any.
+    time_period and native say whether the handler supports those arguments of data_loading.load().
+    Registering an existing source_type replaces it.
+    """
+
+    formats[source_type] = {
+        "handler": handler,
+        "extensions": [extension.lower().lstrip(".") for extension in extensions],
+        "magic": magic,
+        "time_period": time_period,
+        "native": native
+    }
+
+def get_format(source_type):
+    """
+    Return the registration of source_type, or throw an error if it is unknown.
+    """
+
+    if source_type not in formats:
+        raise Exception("Unknown source type {}, the supported types are: {}.".format(source_type, ", ".join(formats)))
+
+    return formats[source_type]
+
+def get_handler(source_type):
+    """
+    Return the handler module of source_type, importing it if this is the first time it has been needed.
+    """
+
+    file_format = get_format(source_type)
+
+    if isinstance(file_format["handler"], str):
+        file_format["handler"] = importlib.import_module(file_format["handler"])
+
+    return file_format["handler"]
+
+def detect_source_type(source):
+    """
+    Assume the type of a file from its extension and the bytes it starts with, and throw an error if unsure.
+    The extension is trusted unless its format has magic bytes that the file doesn't start with, but another format's do.
+    """
+
+    extension = source.split(".")[-1]
+    by_extension = [source_type for source_type, file_format in formats.items() if extension.lower() in file_format["extensions"]]
+
+    magic_length = max([len(f["magic"]) for f in formats.values() if f["magic"] is not None] + [0])
+
+    try:
+        with open(source, "rb") as f:
+            start = f.read(magic_length)
+    except OSError:
+        start = b""
+
+    by_magic = [source_type for source_type, file_format in formats.items() if file_format["magic"] is not None and start.startswith(file_format["magic"])]
+
+    if len(by_extension) > 0:
+        magic = formats[by_extension[0]]["magic"]
+        if magic is None or start.startswith(magic) or len(by_magic) == 0:
+            return by_extension[0]
+
+    if len(by_magic) > 0:
+        return by_magic[0]
+
+    raise Exception("Cannot assume file type from extension ({}), specify source_type when trying to load this file.".format(extension))
+
+register_format("Axivity", "pampro.formats.axivity", extensions=["cwa"], magic=b"MD", time_period=True, native=True)
+register_format("Axivity_ZIP", "pampro.formats.axivity")
+register_format("GeneActiv", "pampro.formats.geneactiv", extensions=["bin"], magic=b"Device Identity", time_period=True, native=True)
+register_format("GeneActiv_CSV", "pampro.formats.geneactiv")
+register_format("activPAL", "pampro.formats.activpal", extensions=["datx"], native=True)
+register_format("activPAL_CSV", "pampro.formats.activpal")
+register_format("Actigraph", "pampro.formats.actigraph", extensions=["dat"])
+register_format("GT3X", "pampro.formats.gt3x", extensions=["gt3x"], time_period=True, native=True)
+register_format("GT3X+_CSV", "pampro.formats.actigraph")
+register_format("GT3X+_CSV_ZIP", "pampro.formats.actigraph")
+register_format("Actiheart", "pampro.formats.actiheart")
+register_format("XLO", "pampro.formats.xlo")
+register_format("CSV", "pampro.formats.generic_csv", extensions=["csv"])
+register_format("HDF5", "pampro.formats.hdf5", extensions=["hdf5", "h5"], magic=b"\x89HDF\r\n\x1a\n")
@@ -0,0 +1,145 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+import io
+from collections import OrderedDict
+
+from ..data_loading import *
+
+def convert_actigraph_timestamp(t):
+    return datetime(*map(int, [t[6:10],t[3:5],t[0:2],t[11:13],t[14:16],t[17:19],int(t[20:])*1000]))
+
+# Where each part of an ISO 8601 timestamp is found in "dd/MM/yyyy HH:mm:ss.SSS", or -1 for a separator
+gt3x_csv_timestamp_layout = [6,7,8,9,-1,3,4,-1,0,1,-1,11,12,-1,14,15,-1,17,18,-1,20,21,22]
+gt3x_csv_timestamp_separators = np.frombuffer(b"    -  -  T  :  :  .   ", dtype=np.uint8)
+
+def convert_gt3x_csv_timestamps(column):
+    """
+    Convert a column of GT3X+ CSV timestamps ("dd/MM/yyyy HH:mm:ss.SSS") to datetime64 all at once.
+    The characters of each timestamp are rearranged into ISO 8601 order, which NumPy parses natively.
+    Timestamps that don't have exactly that layout are converted one at a time instead.
+    """
+
+    column = np.asarray(column, dtype="S")
+    if len(column) == 0 or (np.char.str_len(column) != 23).any():
+        return np.array([convert_actigraph_timestamp(t.decode()) for t in column], dtype="datetime64[us]")
+
+    characters = column.astype("S23").view(np.uint8).reshape(-1, 23)
+
+    layout = np.array(gt3x_csv_timestamp_layout)
+    iso = np.where(layout >= 0, characters[:,np.maximum(layout, 0)], gt3x_csv_timestamp_separators)
+
+    return np.ascontiguousarray(iso, dtype=np.uint8).view("S23").ravel().astype("datetime64[ms]").astype("datetime64[us]")
+
+def open_gt3x_csv(source, source_type):
+    """
+    Open a GT3X+ CSV export for reading as text, either directly or from inside the .zip it was archived in.
+    """
+
+    if source_type == "GT3X+_CSV_ZIP":
+        import zipfile
+        archive = zipfile.ZipFile(source)
+        return io.TextIOWrapper(archive.open(source.split("/")[-1].replace(".zip", ".csv")), encoding="utf-8")
+    else:
+        return open(source, 'r')
+
+def parse_gt3x_csv_rows(rows, skip_header=0):
+    """
+    Parse the rows of a GT3X+ CSV export, which are a timestamp followed by X, Y and Z.
+    rows can be a filename or a list of lines.
+    """
+
+    data = np.atleast_1d(np.loadtxt(rows, delimiter=',', skiprows=skip_header, usecols=(0,1,2,3), dtype=[("timestamp", "S32"), ("x", "f8"), ("y", "f8"), ("z", "f8")]))
+
+    timestamps = convert_gt3x_csv_timestamps(data["timestamp"])
+    samples = OrderedDict([("X", data["x"].copy()), ("Y", data["y"].copy()), ("Z", data["z"].copy())])
+
+    return timestamps, samples
+
+def load(source, source_type, datetime_format="%d/%m/%Y %H:%M:%S:%f", **options):
+    """
+    Load an Actigraph .dat file of epoch counts, or a GT3X+ CSV export (optionally inside a .zip archive).
+    """
+
+    if source_type == "GT3X+_CSV" or source_type == "GT3X+_CSV_ZIP":
+        return load_gt3x_csv(source, source_type)
+
+    first_lines = []
+    f = open(source, 'r')
+    for i in range(0,10):
+        s = f.readline().strip()
+        first_lines.append(s)
+
+
+    header_info = parse_header(first_lines, "Actigraph", datetime_format)
+
+    time = header_info["start_datetime"]
+    epoch_length = timedelta(seconds=header_info["epoch_length_seconds"])
+    mode = header_info["mode"]
+
+    # If the mode is not one of those currently supported, raise an error
+    if mode not in [0,1,3,4,5]:
+        raise Exception("Mode {} is not currently supported.".format(mode))
+
+    # The data runs until the first blank line
+    lines = []
+    line = f.readline().strip()
+    while (len(line) > 0):
+
+        lines.append(line)
+        line = f.readline().strip()
+    f.close()
+
+    # Cast the strings to integers all at once
+    counts = np.array(" ".join(lines).split(), dtype=np.int64)
+
+    # If the mode implies the data is count, steps
+    if mode == 1 or mode == 3 or mode == 4:
+
+        counts = counts[:len(counts)//2*2].reshape(-1, 2)[:,0]
+
+    # If the mode implies the data is count X, count Y, count Z
+    elif mode == 5:
+
+        counts = counts[:len(counts)//3*3].reshape(-1, 3)[:,0]
+
+    timestamps = np.datetime64(time, "us") + np.arange(len(counts)) * np.timedelta64(epoch_length // timedelta(microseconds=1), "us")
+    counts = np.abs(counts)
+
+    chan = Channel("AG_Counts")
+    chan.set_contents(counts, timestamps)
+
+    return header_info, [chan]
+
+def load_gt3x_csv(source, source_type):
+    """
+    Load a GT3X+ CSV export in a single pass: header, then the rows a chunk at a time.
+    """
+
+    f = open_gt3x_csv(source, source_type)
+
+    header_info = parse_header([f.readline().strip() for i in range(10)], "GT3X+_CSV", "")
+
+    # Skip the column names
+    f.readline()
+
+    timestamps, indices, samples, pages = concatenate_batches(list(csv_batches(f, parse_gt3x_csv_rows)))
+
+    return header_info, channels_from_pages(timestamps, None, samples, frequency=header_info["frequency"])
+
+def batches(source, source_type, **options):
+    """
+    Return the header of a GT3X+ CSV export, and a generator that parses it a chunk of rows at a time.
+    Returns None for Actigraph .DAT files, which can't be read in batches.
+    """
+
+    if source_type == "Actigraph":
+        return None
+
+    f = open_gt3x_csv(source, source_type)
+
+    header = parse_header([f.readline().strip() for i in range(10)], "GT3X+_CSV", "")
+
+    # Skip the column names
+    f.readline()
+
+    return header, csv_batches(f, parse_gt3x_csv_rows)
@@ -0,0 +1,51 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+
+from ..data_loading import *
+
+def load(source, source_type, **options):
+    """
+    Load an Actiheart export of chest acceleration and heart rate.
+    """
+
+    first_lines = []
+    f = open(source, 'r')
+    for i in range(0,30):
+        s = f.readline().strip()
+        first_lines.append(s)
+    f.close()
+
+    header_info = parse_header(first_lines, "Actiheart", "%d-%b-%Y  %H:%M")
+
+    start_date = header_info["start_date"]
+    epoch_length = header_info["epoch_length"]
+    data_start = header_info["data_start"]
+
+    mapping = {"comma":",", "tab":"\t"}
+
+    activity, ecg  = np.loadtxt(source, delimiter=mapping[header_info["delimiter"]], unpack=True, skiprows=data_start, usecols=[1,2])
+
+    timestamp_list = [start_date+i*epoch_length for i in range(len(activity))]
+    timestamps = np.array(timestamp_list)
+
+
+    if "Start trimmed to" in header_info:
+        indices1 = (timestamps > header_info["Start trimmed to"])
+        activity = activity[indices1]
+        ecg = ecg[indices1]
+        timestamps = timestamps[indices1]
+
+    ecg[(ecg <= 0)] = -1
+
+    actiheart_activity = Channel("Chest")
+    actiheart_activity.set_contents(activity, timestamps)
+
+    actiheart_ecg = Channel("HR")
+    actiheart_ecg.set_contents(ecg, timestamps)
+
+    actiheart_ecg.missing_value = -1
+
+    actiheart_ecg.draw_properties = {"c":[0.8,0.05,0.05]}
+    actiheart_activity.draw_properites = {"c":[0.05,0.8,0.8]}
+
+    return header_info, [actiheart_activity, actiheart_ecg]
@@ -0,0 +1,278 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+from struct import *
+from collections import OrderedDict
+
+from ..data_loading import *
+
+def activpal_parse_header(A):
+    """
+    Interpret the 1024 byte header of an activPAL .datx file.
+    """
+
+    header_info = OrderedDict()
+
+    start_time = str((A[256])).rjust(2, "0") + ":" + str((A[257])).rjust(2, "0") + ":" + str((A[258])).rjust(2, "0")
+    start_date = str((A[259])).rjust(2, "0") + "/" + str((A[260])).rjust(2, "0") + "/" + str(2000 + (A[261]))
+
+    end_time = str((A[262])).rjust(2, "0") + ":" + str((A[263])).rjust(2, "0") + ":" + str((A[264])).rjust(2, "0")
+    end_date = str((A[265])).rjust(2, "0") + "/" + str((A[266])).rjust(2, "0") + "/" + str(2000 + (A[267]))
+
+    start = start_date + " " + start_time
+    end = end_date + " " + end_time
+
+    # Given in Hz
+    header_info["frequency"] = A[35]
+
+    # 0 = 2g, 1 = 4g (therefore double the raw values), 2 = 8g (therefore quadruple the raw values)
+    header_info["dynamic_range"] = A[38]
+
+    header_info["start_datetime_python"] = datetime.strptime(start, "%d/%m/%Y %H:%M:%S")
+    header_info["end_datetime_python"] = datetime.strptime(end, "%d/%m/%Y %H:%M:%S")
+    duration = header_info["end_datetime_python"] - header_info["start_datetime_python"]
+
+    header_info["num_records"] = int(duration.total_seconds() / (timedelta(seconds=1)/header_info["frequency"]).total_seconds())
+
+    return header_info
+
+def activpal_decode_records(data, header_info, num_records, last_record=(0,0,0), channels=None, dtype="float64"):
+    """
+    Decode num_records samples from the current position of an activPAL file handle, stopping early at the footer.
+    The final record may be a repeat that takes it up to 256 samples past num_records.
+    last_record is the record preceding the current position, which a repeat record at the start would repeat.
+    Returns an array per axis in units of g stored as dtype (or the device's uint8 values if dtype is "native"), and the last record read.
+    Only the axes in channels are returned, or all of them if channels is None.
+    """
+
+    start = data.tell()
+    available = (len(data) - start) // 3
+
+    # Every record is at least 1 sample, so num_records (plus 1, to see past a "TAI" record) is as many as could be needed
+    count = min(num_records + 1, available) if num_records > 0 else 0
+    records = np.frombuffer(data, dtype=np.uint8, count=count*3, offset=start).reshape(-1, 3)
+
+    # activPAL writes TAIL as a footer, but "TAI" could legitimately turn up as a record
+    # A coincidental TAI is followed by a record that is taken literally, even if it looks like a repeat or another TAI
+    literal = np.zeros(count, dtype=bool)
+    end = count
+    reached_end = False
+
+    for i in np.flatnonzero((records[:,0] == 116) & (records[:,1] == 97) & (records[:,2] == 105)).tolist():
+
+        if literal[i]:
+            continue
+
+        if i + 1 == count:
+            # Can't tell whether this is the footer, but if the file ends here nothing more can be read anyway
+            end = i
+            reached_end = count == available
+            break
+
+        if records[i+1,0] == 108:
+            # TAIL, so the data is over
+            end = i
+            reached_end = True
+            break
+
+        literal[i+1] = True
+
+    records = records[:end]
+    literal = literal[:end]
+
+    # A repeat record 0,0,c means the previous record occurs c+1 more times
+    repeat = (records[:,0] == 0) & (records[:,1] == 0) & ~literal
+    lengths = np.where(repeat, records[:,2].astype(int) + 1, 1)
+
+    # Stop after the record that reaches num_records, keeping a coincidental TAI together with the record after it
+    consumed = len(records)
+    reached = np.flatnonzero(np.cumsum(lengths) >= num_records)
+    if len(reached) > 0:
+        consumed = reached[0] + 1
+        if consumed < len(records) and literal[consumed]:
+            consumed += 1
+    else:
+        reached_end = reached_end or count == available
+
+    # Only skip past the footer once everything before it has been used
+    reached_end = reached_end and consumed == len(records)
+
+    records = records[:consumed]
+    literal = literal[:consumed]
+    repeat = repeat[:consumed]
+
+    # Each record's "previous record" is the one before it, or the TAI before that if it was taken literally
+    previous = np.arange(consumed) - 1
+    previous[1:][literal[:-1]] -= 1
+    previous_records = np.vstack((np.array(last_record, dtype=np.uint8).reshape(1, 3), records))[previous + 1]
+
+    values = np.where(repeat[:,None], previous_records, records)
+    values = np.repeat(values, lengths[:consumed], axis=0)
+
+    if consumed > 0:
+        last = consumed - 2 if literal[-1] else consumed - 1
+        last_record = tuple(int(v) for v in records[last])
+
+    if reached_end:
+        data.seek(len(data))
+    else:
+        data.seek(start + consumed*3)
+
+    axes = wanted_channels(["X", "Y", "Z"], channels)
+    values = values[:,[["X", "Y", "Z"].index(axis) for axis in axes]]
+
+    if dtype == "native":
+        return OrderedDict(zip(axes, values.T.copy())), last_record
+
+    values = (values.T.astype(dtype) - 128.0) / 64.0
+
+    dynamic_multiplier = 2**header_info["dynamic_range"]
+    if dynamic_multiplier > 1:
+        values *= dynamic_multiplier
+
+    return OrderedDict(zip(axes, values)), last_record
+
+def activpal_scales(header_info):
+    """
+    The scale_factor and scale_offset that convert each axis of an activPAL file to g: (value - 128) / 64 * 2**dynamic_range.
+    """
+
+    multiplier = 2**header_info["dynamic_range"] / 64.0
+    return OrderedDict([(axis, (multiplier, -128.0 * multiplier)) for axis in ["X", "Y", "Z"]])
+
+def activpal_timestamps(header_info, first, last):
+    """
+    Timestamp activPAL samples first to last, which are regularly spaced from the start of the recording.
+    """
+
+    start = np.datetime64(header_info["start_datetime_python"], "us")
+    delta = np.timedelta64((timedelta(seconds=1)/header_info["frequency"]) // timedelta(microseconds=1), "us")
+
+    return start + np.arange(first, last) * delta
+
+def load(source, source_type, channels=None, dtype="float64", **options):
+    """
+    Load an activPAL .datx file, or an activPAL CSV export.
+    """
+
+    if source_type == "activPAL_CSV":
+        return OrderedDict(), load_csv(source)
+
+    # Memory map the file rather than reading a copy of it
+    data = map_file(source)
+
+    header = activpal_parse_header(unpack('1024s', data.read(1024))[0])
+
+    samples, last_record = activpal_decode_records(data, header, header["num_records"], channels=sample_channels(channels), dtype=dtype)
+    n = min(len(next(iter(samples.values()))), header["num_records"])
+    samples = OrderedDict([(axis, values[:n]) for axis, values in samples.items()])
+
+    # Samples are at a fixed frequency from the start of the recording, so their timestamps needn't be stored
+    # activPAL timestamps step by the sample period rounded down to the microsecond, which is only regular if the period is whole
+    if (1000000 / header["frequency"]).is_integer():
+        timestamps = Regular_Timestamps(header["start_datetime_python"], header["frequency"], n)
+    else:
+        timestamps = activpal_timestamps(header, 0, n)
+
+    channel_list = channels_from_pages(timestamps, None, samples, frequency=header["frequency"], channels=channels)
+
+    for c in channel_list:
+        c.sparsely_timestamped = False
+
+    if dtype == "native":
+        set_scales(channel_list, scales(header))
+
+    return header, channel_list
+
+def load_csv(source):
+    """
+    Load an activPAL CSV export, whose timestamps are fractional days since 30/12/1899.
+    """
+
+    ap_timestamp, ap_x, ap_y, ap_z = np.loadtxt(source, delimiter=',', unpack=True, skiprows=5, dtype={'names':('ap_timestamp','ap_x','ap_y','ap_z'), 'formats':('S16','f8','f8','f8')})
+    #print("A")
+    dt = datetime.strptime("30-Dec-1899", "%d-%b-%Y")
+
+    ap_timestamps = []
+    for val in ap_timestamp:
+
+        test = val.split(".")
+
+        while len(test[1]) < 10:
+            test[1] = test[1] + "0"
+
+        finaltest = dt + timedelta(days=int(test[0]), microseconds=int(test[1])*8.64)
+        ap_timestamps.append(finaltest)
+
+    ap_timestamps = np.array(ap_timestamps)
+    #print("B")
+    x = Channel("AP_X")
+    y = Channel("AP_Y")
+    z = Channel("AP_Z")
+
+    ap_x = (ap_x-128.0)/64.0
+    ap_y = (ap_y-128.0)/64.0
+    ap_z = (ap_z-128.0)/64.0
+
+    x.set_contents(np.array(ap_x, dtype=np.float64), ap_timestamps)
+    y.set_contents(np.array(ap_y, dtype=np.float64), ap_timestamps)
+    z.set_contents(np.array(ap_z, dtype=np.float64), ap_timestamps)
+    #print("C")
+
+    return [x,y,z]
+
+def probe(source, source_type, **options):
+    """
+    Describe an activPAL file from its 1024 byte header alone, or return None for an activPAL CSV export, which can't be.
+    """
+
+    if source_type == "activPAL_CSV":
+        return None
+
+    data = map_file(source)
+    header = activpal_parse_header(unpack('1024s', data.read(1024))[0])
+
+    num_samples = header["num_records"]
+    first_timestamp = header["start_datetime_python"]
+    last_timestamp = to_datetime(activpal_timestamps(header, num_samples-1, num_samples)[0])
+
+    return header, first_timestamp, last_timestamp, num_samples
+
+def batches(source, source_type, channels=None, dtype="float64", batch_size=300000, **options):
+    """
+    Return the header of an activPAL file, and a generator that decodes it roughly batch_size samples at a time.
+    Returns None for an activPAL CSV export, which can't be read in batches.
+    """
+
+    if source_type == "activPAL_CSV":
+        return None
+
+    data = map_file(source)
+    header = activpal_parse_header(unpack('1024s', data.read(1024))[0])
+    decode_channels = sample_channels(channels)
+
+    def decode_batches():
+
+        num_decoded = 0
+        last_record = (0,0,0)
+
+        while num_decoded < header["num_records"] and data.tell() < len(data):
+
+            samples, last_record = activpal_decode_records(data, header, min(batch_size, header["num_records"] - num_decoded), last_record, decode_channels, dtype)
+
+            n = min(len(next(iter(samples.values()))), header["num_records"] - num_decoded)
+            if n == 0:
+                break
+
+            timestamps = activpal_timestamps(header, num_decoded, num_decoded+n)
+            num_decoded += n
+
+            yield timestamps, None, OrderedDict([(axis, values[:n]) for axis, values in samples.items()]), OrderedDict()
+
+    return header, decode_batches()
+
+def scales(header):
+    """
+    The scale_factor and scale_offset that convert each axis to g.
+    """
+
+    return activpal_scales(header)
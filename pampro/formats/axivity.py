@@ -0,0 +1,874 @@
+# Axivity import code adapted from source provided by Open Movement: https://code.google.com/p/openmovement/. Their license terms are reproduced here in full, and apply only to the Axivity related code:
+# Copyright (c) 2009-2014, Newcastle University, UK. All rights reserved.
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+from datetime import datetime, date, time, timedelta
+from struct import *
+from math import *
+from fractions import Fraction
+import io
+from collections import OrderedDict
+
+from ..data_loading import *
+
+def axivity_read_timestamp(stamp):
+    stamp = unpack('I', stamp)[0]
+    year = ((stamp >> 26) & 0x3f) + 2000
+    month = (stamp >> 22) & 0x0f
+    day   = (stamp >> 17) & 0x1f
+    hours = (stamp >> 12) & 0x1f
+    mins  = (stamp >>  6) & 0x3f
+    secs  = (stamp >>  0) & 0x3f
+    try:
+        t = datetime(year, month, day, hours, mins, secs)
+    except ValueError:
+        t = None
+    return t
+
+def axivity_read_timestamp_raw(stamp):
+    year = ((stamp >> 26) & 0x3f) + 2000
+    month = (stamp >> 22) & 0x0f
+    day   = (stamp >> 17) & 0x1f
+    hours = (stamp >> 12) & 0x1f
+    mins  = (stamp >>  6) & 0x3f
+    secs  = (stamp >>  0) & 0x3f
+    try:
+        t = datetime(year, month, day, hours, mins, secs)
+    except ValueError:
+        t = None
+    return t
+
+def axivity_read(fh, bytes):
+    data = fh.read(bytes)
+    if len(data) == bytes:
+        return data
+    else:
+        raise IOError
+
+def axivity_parse_header(fh):
+
+    ax_header = OrderedDict()
+
+    blockSize = unpack('H', axivity_read(fh,2))[0]
+    performClear = unpack('B', axivity_read(fh,1))[0]
+    deviceId = unpack('H', axivity_read(fh,2))[0]
+    sessionId = unpack('I', axivity_read(fh,4))[0]
+    shippingMinLightLevel = unpack('H', axivity_read(fh,2))[0]
+    loggingStartTime = axivity_read(fh,4)
+    loggingEndTime = axivity_read(fh,4)
+    loggingCapacity = unpack('I', axivity_read(fh,4))[0]
+    allowStandby = unpack('B', axivity_read(fh,1))[0]
+    debuggingInfo = unpack('B', axivity_read(fh,1))[0]
+    batteryMinimumToLog = unpack('H', axivity_read(fh,2))[0]
+    batteryWarning = unpack('H', axivity_read(fh,2))[0]
+    enableSerial = unpack('B', axivity_read(fh,1))[0]
+    lastClearTime = axivity_read(fh,4)
+    samplingRate = unpack('B', axivity_read(fh,1))[0]
+    lastChangeTime = axivity_read(fh,4)
+    firmwareVersion = unpack('B', axivity_read(fh,1))[0]
+
+    reserved = axivity_read(fh,22)
+
+    annotationBlock = axivity_read(fh, 448 + 512)
+
+    if len(annotationBlock) < 448 + 512:
+        annotationBlock = ""
+
+    annotation = ""
+    for x in annotationBlock:
+        if x != 255 and x != ' ':
+            if x == '?':
+                x = '&'
+            annotation += str(x)
+    annotation = annotation.strip()
+
+    annotationElements = annotation.split('&')
+    annotationNames = {
+        '_c': 'studyCentre',
+        '_s': 'studyCode',
+        '_i': 'investigator',
+        '_x': 'exerciseCode',
+        '_v': 'volunteerNum', '_p':
+        'bodyLocation', '_so':
+        'setupOperator', '_n': 'notes',
+        '_b': 'startTime', '_e': 'endTime',
+        '_ro': 'recoveryOperator',
+        '_r': 'retrievalTime',
+        '_co': 'comments'
+    }
+
+    for element in annotationElements:
+        kv = element.split('=', 2)
+        if kv[0] in annotationNames:
+            ax_header[annotationNames[kv[0]]] = kv[1]
+
+    for x in ('startTime', 'endTime', 'retrievalTime'):
+        if x in ax_header:
+            if '/' in ax_header[x]:
+                ax_header[x] = time.strptime(ax_header[x], '%d/%m/%Y')
+            else:
+                ax_header[x] = time.strptime(ax_header[x], '%Y-%m-%d %H:%M:%S')
+
+
+    lastClearTime = axivity_read_timestamp(lastClearTime)
+    lastChangeTime = axivity_read_timestamp(lastChangeTime)
+    firmwareVersion = firmwareVersion if firmwareVersion != 255 else 0
+
+
+    #ax_header["sample_rate"] = samplingRate
+    ax_header["device"] = deviceId
+    ax_header["session"] = sessionId
+    ax_header["firmware"] = firmwareVersion
+    #ax_header["logging_start_time"] = axivity_read_timestamp_raw(loggingStartTime)
+    #ax_header["logging_end_time"] = axivity_read_timestamp_raw(loggingEndTime)
+
+
+    ax_header["frequency"] = 3200/(1<<(15-(int(samplingRate) & 0x0f)))
+
+
+    return ax_header
+
+# Layout of a single 512 byte Axivity data block ("AX"), as described in cwa.h from Open Movement
+# The file can be viewed as an array of these, which lets us pull every header field out in one go
+axivity_block_dtype = np.dtype([
+    ("header", "S2"),
+    ("packet_length", "<u2"),
+    ("device_fractional", "<u2"),
+    ("session_id", "<u4"),
+    ("sequence_id", "<u4"),
+    ("timestamp", "<u4"),
+    ("light", "<u2"),
+    ("temperature", "<u2"),
+    ("events", "u1"),
+    ("battery", "u1"),
+    ("sample_rate", "u1"),
+    ("num_axes_bps", "u1"),
+    ("timestamp_offset", "<i2"),
+    ("sample_count", "<u2"),
+    ("raw_data", "u1", (480,)),
+    ("checksum", "<u2")
+])
+
+# Number of blocks decoded at a time, which bounds the temporary memory used on top of the decoded arrays
+axivity_batch_size = 4096
+
+def axivity_read_blocks(raw_bytes):
+    """
+    View the contents of a .cwa file as an array of 512 byte blocks, and parse the metadata block if there is one.
+    raw_bytes can be anything supporting the buffer protocol (bytes, mmap), and the view does not copy it.
+    Returns the file header, and a view of the blocks following the metadata.
+    """
+
+    num_blocks = len(raw_bytes) // axivity_block_dtype.itemsize
+    blocks = np.frombuffer(raw_bytes, dtype=axivity_block_dtype, count=num_blocks)
+
+    file_header = OrderedDict()
+
+    # The "MD" metadata header spans the first 2 blocks, so neither of them is data
+    if num_blocks > 0 and blocks["header"][0] == b"MD":
+        file_header = axivity_parse_header(io.BytesIO(raw_bytes[2:1024]))
+        blocks = blocks[2:]
+
+    return file_header, blocks
+
+def axivity_well_formed_blocks(blocks):
+    """
+    Return a boolean mask of the blocks that are well formed "AX" data blocks, judging by their header fields alone.
+    """
+
+    well_formed = (blocks["header"] == b"AX") & (blocks["packet_length"] == 508) & (blocks["sample_rate"] != 0)
+
+    # Bytes per sample is 6 (3x 16 bit) or 4 (3x 10 bit packed with a shared 2 bit exponent)
+    well_formed &= np.isin(blocks["num_axes_bps"] & 15, [0,2])
+
+    if ((blocks["num_axes_bps"][well_formed] >> 4) & 15 != 3).any():
+        print('[ERROR: num-axes not expected]')
+
+    return well_formed
+
+def axivity_checksums_ok(blocks, batch_size=axivity_batch_size):
+    """
+    Return a boolean mask of the blocks whose checksum is correct: the 256 16 bit words of a block should sum to 0.
+    The blocks are checked batch_size at a time, which bounds the temporary memory used.
+    """
+
+    checksum_ok = np.empty(len(blocks), dtype=bool)
+
+    for batch_start in range(0, len(blocks), batch_size):
+        words = np.ascontiguousarray(blocks[batch_start:batch_start+batch_size]).view(np.uint8).view("<u2").reshape(-1, 256)
+        checksum_ok[batch_start:batch_start+len(words)] = words.sum(axis=1, dtype=np.uint16) == 0
+
+    return checksum_ok
+
+def axivity_usable_blocks(blocks):
+    """
+    Return a boolean mask of the blocks that are well formed "AX" data blocks with a correct checksum.
+    """
+
+    return axivity_well_formed_blocks(blocks) & axivity_checksums_ok(blocks)
+
+def axivity_block_report(blocks, incomplete=False):
+    """
+    Count the blocks that can't be used and why: not well formed ("unusable"), a wrong checksum ("checksum"), or an invalid timestamp ("invalid_timestamp").
+    incomplete says whether the file ends part way through a block, which is counted as 1 more unusable block.
+    """
+
+    well_formed = axivity_well_formed_blocks(blocks)
+    checksum_ok = axivity_checksums_ok(blocks)
+    invalid_timestamp = np.isnat(axivity_read_timestamps(blocks["timestamp"][well_formed & checksum_ok]))
+
+    report = OrderedDict()
+    report["unusable"] = int((~well_formed).sum()) + int(incomplete)
+    report["checksum"] = int((well_formed & ~checksum_ok).sum())
+    report["invalid_timestamp"] = int(invalid_timestamp.sum())
+
+    return report
+
+def axivity_find_gaps(timestamps, indices, num_samples, frequency, tolerance=1.5):
+    """
+    Find where consecutive pages are further apart than their samples account for (by more than tolerance times), such as where blocks were dropped.
+    Returns a list of (end of the page before, start of the page after) datetimes.
+    """
+
+    if len(timestamps) < 2:
+        return []
+
+    microseconds = datetimes_to_microseconds(timestamps)
+    durations = np.diff(np.append(indices, num_samples)) * 1000000 / frequency
+
+    gaps = np.flatnonzero(np.diff(microseconds) > durations[:-1] * tolerance)
+    ends = microseconds_to_datetimes(microseconds[gaps] + durations[gaps].astype(np.int64))
+    starts = microseconds_to_datetimes(microseconds[gaps+1])
+
+    return list(zip(ends, starts))
+
+def axivity_block_headers(blocks, block_numbers):
+    """
+    Copy the header fields of the given blocks into a compact array, leaving the sample data where it is.
+    """
+
+    fields = [name for name in axivity_block_dtype.names if name != "raw_data"]
+    headers = np.empty(len(block_numbers), dtype=[(name, axivity_block_dtype[name]) for name in fields])
+
+    for name in fields:
+        headers[name] = blocks[name][block_numbers]
+
+    return headers
+
+def axivity_sample_counts(headers):
+    """
+    The number of samples in each block. A block holds 480 bytes of sample data, so at most 80 unpacked or 120 packed samples.
+    """
+
+    capacity = np.where((headers["num_axes_bps"] & 15) == 0, 120, 80)
+
+    return np.minimum(headers["sample_count"], capacity)
+
+def axivity_unpack_samples(blocks):
+    """
+    Decode the acceleration samples of every given Axivity data block in bulk, without looping over samples.
+    Returns x, y and z arrays of the device's int16 values (in units of 1/256 g), in the order the samples appear in the file, and the index of each block's first sample.
+    """
+
+    packed = (blocks["num_axes_bps"] & 15) == 0
+    counts = axivity_sample_counts(blocks)
+
+    # Where the samples of each block will start in the output arrays
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    num_samples = int(counts.sum())
+
+    x = np.empty(num_samples, dtype=np.int16)
+    y = np.empty(num_samples, dtype=np.int16)
+    z = np.empty(num_samples, dtype=np.int16)
+
+    for is_packed, per_block in [(False, 80), (True, 120)]:
+
+        selection = packed == is_packed
+        if not selection.any():
+            continue
+
+        # Some blocks may not be full, so only take the first sample_count samples of each
+        in_block = np.arange(per_block)
+        wanted = in_block < counts[selection][:,None]
+        positions = (starts[selection][:,None] + in_block)[wanted]
+
+        raw_data = blocks["raw_data"][selection]
+
+        if is_packed:
+
+            # Each 32 bit word is 3x 10 bit signed values, and a 2 bit exponent in the top bits
+            # Move each value to the top of a 16 bit int, then shift it back down arithmetically
+            words = raw_data.view("<u4")[wanted]
+            shift = 6 - (words >> 30).astype(np.int16)
+
+            x[positions] = ((words << 6) & 65472).astype(np.uint16).view(np.int16) >> shift
+            y[positions] = ((words >> 4) & 65472).astype(np.uint16).view(np.int16) >> shift
+            z[positions] = ((words >> 14) & 65472).astype(np.uint16).view(np.int16) >> shift
+
+        else:
+
+            samples = raw_data.view("<i2").reshape(-1, per_block, 3)[wanted]
+
+            x[positions] = samples[:,0]
+            y[positions] = samples[:,1]
+            z[positions] = samples[:,2]
+
+    return x, y, z, starts
+
+def axivity_decode_blocks(blocks, block_numbers, batch_size=axivity_batch_size, out=None, axes=["X", "Y", "Z"], dtype="float64"):
+    """
+    Decode the samples of the numbered blocks into preallocated arrays, a batch of blocks at a time.
+    Only one batch of blocks is ever copied out of the view, so memory use is the decoded arrays plus a constant.
+    Only the given axes are kept, in units of g stored as dtype, or as the device's int16 values if dtype is "native".
+    out optionally gives the arrays to decode into, one per axis, otherwise new ones are allocated.
+    Returns an OrderedDict of the arrays of each axis, and the index of each block's first sample.
+    """
+
+    counts = axivity_sample_counts(axivity_block_headers(blocks, block_numbers))
+    indices = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    num_samples = int(counts.sum())
+
+    if out is None:
+        out = [np.empty(num_samples, dtype=sample_dtype(dtype, np.int16)) for axis in axes]
+    samples = OrderedDict(zip(axes, out))
+
+    for batch_start in range(0, len(block_numbers), batch_size):
+
+        batch = blocks[block_numbers[batch_start:batch_start+batch_size]]
+        batch_x, batch_y, batch_z, batch_starts = axivity_unpack_samples(batch)
+
+        a = indices[batch_start]
+        b = a + len(batch_x)
+
+        for axis, values in zip(["X", "Y", "Z"], [batch_x, batch_y, batch_z]):
+            if axis in samples:
+                samples[axis][a:b] = values if dtype == "native" else values / 256.0
+
+    return samples, indices
+
+def axivity_read_timestamps(stamps):
+    """
+    Convert an array of packed Axivity timestamps to datetime64[us] all at once, like axivity_read_timestamp_raw does one at a time.
+    Any that aren't a valid date and time are NaT.
+    """
+
+    stamps = np.asarray(stamps, dtype=np.int64)
+
+    year = ((stamps >> 26) & 0x3f) + 2000
+    month = (stamps >> 22) & 0x0f
+    day = (stamps >> 17) & 0x1f
+    hours = (stamps >> 12) & 0x1f
+    mins = (stamps >> 6) & 0x3f
+    secs = stamps & 0x3f
+
+    month_start = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype("datetime64[M]").astype("datetime64[D]")
+    days_in_month = ((month_start.astype("datetime64[M]") + 1).astype("datetime64[D]") - month_start).astype(np.int64)
+
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month) & (hours < 24) & (mins < 60) & (secs < 60)
+
+    seconds = (month_start.astype(np.int64) + day - 1) * 86400 + hours * 3600 + mins * 60 + secs
+
+    return np.where(valid, seconds * 1000000, np.iinfo(np.int64).min).astype("datetime64[us]")
+
+def axivity_block_timestamps(headers, state=None):
+    """
+    Calculate the timestamp of the first sample in each Axivity data block, interpolating between consecutive blocks.
+    Every block is worked out at once in integer microseconds, and the timestamps are returned as datetime64[us], with NaT for blocks with an invalid timestamp.
+    The interpolation state is returned, and can be passed back in to carry on from where these headers left off.
+    """
+
+    if state is None:
+        state = (None, None, None)
+    lastSequenceId, lastTimestampOffset, lastTimestamp = state
+
+    timestamps = axivity_read_timestamps(headers["timestamp"])
+
+    # Blocks with an invalid timestamp are skipped, so each valid block follows on from the valid block before it
+    valid = ~np.isnat(timestamps)
+    if not valid.any():
+        return timestamps, state
+
+    deviceId = headers["device_fractional"][valid].astype(np.int64)
+    sequenceId = headers["sequence_id"][valid].astype(np.int64)
+    timestampOffset = headers["timestamp_offset"][valid].astype(np.int64)
+    sampleCount = headers["sample_count"][valid].astype(np.int64)
+    timestamp = timestamps[valid].astype(np.int64)
+
+    freq = 3200 / (1 << ((15 - headers["sample_rate"][valid].astype(np.int64)) & 15))
+
+    # if top-bit set, we have a fractional date
+    # Need to undo backwards-compatible shim by calculating how many whole samples the fractional part of timestamp accounts for.
+    fractional = (deviceId & 0x8000) != 0
+    timeFractional = (deviceId & 0x7fff) * 2     # use original deviceId field bottom 15-bits as 16-bit fractional time
+    timestampOffset = np.where(fractional, timestampOffset + (timeFractional * freq.astype(np.int64)) // 65536, timestampOffset)
+    timestamp = np.where(fractional, timestamp + np.rint(timeFractional * 1000000 / 65536).astype(np.int64), timestamp)
+
+    # --- Time interpolation ---
+    # Each block carries on from the one before it, and the first from the state passed in
+    previousSequenceId = np.concatenate(([0], sequenceId[:-1]))
+    previousTimestampOffset = np.concatenate(([0], timestampOffset[:-1] - sampleCount[:-1])).astype(np.float64)
+    previousTimestamp = np.concatenate(([0], timestamp[:-1]))
+
+    reset = np.zeros(len(timestamp), dtype=bool)
+    if lastSequenceId is None or lastTimestampOffset is None or lastTimestamp is None:
+        reset[0] = True
+    else:
+        previousSequenceId[0], previousTimestampOffset[0], previousTimestamp[0] = lastSequenceId, lastTimestampOffset, lastTimestamp
+
+    # Reset interpolator if there's a sequence break or there was no previous timestamp
+    # Bootstrapping condition is a sample one second ago (assuming the ideal frequency)
+    reset |= (previousSequenceId + 1) & 0xffff != sequenceId
+    previousTimestampOffset = np.where(reset, timestampOffset - freq, previousTimestampOffset)
+    previousTimestamp = np.where(reset, timestamp - 1000000, previousTimestamp)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        localFreq = np.rint((timestampOffset - previousTimestampOffset) * 1000000) / (timestamp - previousTimestamp)
+        correction = -timestampOffset * 1000000 / localFreq
+
+        # timedelta division rounds on the exact value of localFreq, which can fall either side of a tie that the float division lands on
+        ties = np.flatnonzero(np.abs(np.abs(correction - np.trunc(correction)) - 0.5) < 1e-6)
+        correction = np.rint(correction)
+        for i in ties:
+            correction[i] = round(Fraction(int(-timestampOffset[i] * 1000000)) / Fraction(float(localFreq[i])))
+
+        # Blocks that can't be interpolated (no time or no samples since the last) fall back on the ideal frequency
+        correction = np.where(np.isfinite(correction), correction, np.rint(-timestampOffset * 1000000 / freq))
+
+    timestamps[valid] = (timestamp + correction.astype(np.int64)).astype("datetime64[us]")
+
+    # Update for next call
+    state = (int(sequenceId[-1]), int(timestampOffset[-1] - sampleCount[-1]), int(timestamp[-1]))
+
+    return timestamps, state
+
+def axivity_decode(blocks, state=None, channels=None, dtype="float64"):
+    """
+    Decode a run of consecutive Axivity blocks: timestamp each usable block, and unpack the samples of those with a valid timestamp.
+    state carries the timestamp interpolation over from a previous run of blocks, so a file can be decoded piece by piece.
+    Only the named channels are decoded (all of them if channels is None), with samples stored as dtype.
+    Returns the block timestamps, the index of each block's first sample, the sample level channel data, the block level channel data, and the new state.
+    """
+
+    block_numbers = np.flatnonzero(axivity_usable_blocks(blocks))
+    headers = axivity_block_headers(blocks, block_numbers)
+
+    # Timestamp each block, and discard any block that doesn't have a valid timestamp
+    timestamps, state = axivity_block_timestamps(headers, state)
+    valid = ~np.isnat(timestamps)
+    block_numbers = block_numbers[valid]
+    headers = headers[valid]
+    timestamps = timestamps[valid]
+
+    samples, indices = axivity_decode_blocks(blocks, block_numbers, axes=wanted_channels(["X", "Y", "Z"], channels), dtype=dtype)
+    pages = axivity_block_channels(headers, channels, dtype)
+
+    return timestamps, indices, samples, pages, state
+
+def axivity_block_channels(headers, channels=None, dtype="float64"):
+    """
+    The block level channels of the given blocks, Light and Temperature, as floats (float64 if dtype is "native").
+    """
+
+    page_dtype = np.float64 if dtype == "native" else dtype
+    return OrderedDict([(name, headers[field].astype(page_dtype)) for name, field in [("Light", "light"), ("Temperature", "temperature")] if name in wanted_channels([name], channels)])
+
+# Converts the device's int16 values to g
+axivity_scales = OrderedDict([("X", (1/256.0, 0.0)), ("Y", (1/256.0, 0.0)), ("Z", (1/256.0, 0.0))])
+
+def axivity_block_time(blocks, position):
+    """
+    The timestamp of the first usable block at or after position, or None if there isn't one.
+    It is interpolated from the usable block before it, exactly as when the whole file is loaded.
+    """
+
+    following = axivity_edge_headers(blocks[position:], count=1)
+    if len(following) == 0:
+        return None
+
+    preceding = axivity_edge_headers(blocks[:position], from_end=True, count=1)
+
+    return axivity_block_timestamps(np.concatenate((preceding, following)))[0][-1].astype(datetime)
+
+def axivity_find_blocks(blocks, time_period):
+    """
+    Binary search the block timestamps for the blocks covering time_period, a (start, end) pair of datetimes.
+    Like slicing, the period includes start but not end, so a block starting at end isn't decoded.
+    Returns the first and last (exclusive) block to decode, and the timestamp interpolation state from the blocks before them.
+    """
+
+    start, end = time_period
+    page_time = lambda position: axivity_block_time(blocks, position)
+
+    # Start from the block containing start, and stop after the last block starting before end
+    first_block = max(bisect_pages(0, len(blocks), page_time, start) - 1, 0)
+    last_block = bisect_pages(first_block, len(blocks), page_time, end, side="left")
+
+    previous = axivity_edge_headers(blocks[:first_block], from_end=True, count=1)
+    state = axivity_block_timestamps(previous)[1] if len(previous) > 0 else None
+
+    return first_block, last_block, state
+
+def axivity_build_index(raw_bytes, blocks):
+    """
+    Index every block of an Axivity file: its byte offset, interpolated timestamp, sequence id, whether it is usable and whether its checksum is correct.
+    """
+
+    first_offset = len(raw_bytes) // axivity_block_dtype.itemsize * axivity_block_dtype.itemsize - len(blocks) * axivity_block_dtype.itemsize
+
+    page_index = np.zeros(len(blocks), dtype=page_index_dtype)
+    page_index["offset"] = first_offset + np.arange(len(blocks), dtype=np.int64) * axivity_block_dtype.itemsize
+    page_index["sequence_id"] = blocks["sequence_id"]
+    page_index["first_sample"] = -1
+    page_index["timestamp"] = np.iinfo(np.int64).min
+    page_index["status"] = page_unusable
+
+    page_index["checksum_ok"] = axivity_checksums_ok(blocks)
+
+    block_numbers = np.flatnonzero(axivity_well_formed_blocks(blocks) & page_index["checksum_ok"])
+    headers = axivity_block_headers(blocks, block_numbers)
+    timestamps, state = axivity_block_timestamps(headers)
+
+    valid = ~np.isnat(timestamps)
+    page_index["status"][block_numbers] = np.where(valid, page_ok, page_invalid_timestamp)
+
+    block_numbers = block_numbers[valid]
+    counts = axivity_sample_counts(headers[valid])
+    page_index["first_sample"][block_numbers] = np.concatenate(([0], np.cumsum(counts)[:-1]))[:len(block_numbers)]
+    page_index["timestamp"][block_numbers] = timestamps[valid].astype(np.int64)
+
+    return page_index
+
+def axivity_find_blocks_indexed(page_index, time_period=None):
+    """
+    Find the good blocks of an Axivity index (usable, with a correct checksum and a valid timestamp), only those covering time_period if it is given.
+    As for axivity_find_blocks(), the period includes start but not end.
+    Returns their block numbers and their rows of the index.
+    """
+
+    good = page_index[(page_index["status"] == page_ok) & page_index["checksum_ok"]]
+
+    if time_period is not None:
+        first = max(np.searchsorted(good["timestamp"], datetimes_to_microseconds([time_period[0]])[0], side="right") - 1, 0)
+        last = np.searchsorted(good["timestamp"], datetimes_to_microseconds([time_period[1]])[0], side="left")
+        good = good[first:last]
+
+    first_offset = page_index["offset"][0] if len(page_index) > 0 else 0
+    block_numbers = (good["offset"] - first_offset) // axivity_block_dtype.itemsize
+
+    return block_numbers, good
+
+def axivity_decode_indexed(blocks, page_index, time_period=None, channels=None, dtype="float64"):
+    """
+    Decode an Axivity file using its index: block timestamps come from the index, so only the samples need decoding.
+    If time_period is given, only the blocks covering it are decoded, found by binary searching the index.
+    Returns the block timestamps, the index of each block's first sample, the sample level channel data and the block level channel data.
+    """
+
+    block_numbers, good = axivity_find_blocks_indexed(page_index, time_period)
+
+    headers = axivity_block_headers(blocks, block_numbers)
+    samples, indices = axivity_decode_blocks(blocks, block_numbers, axes=wanted_channels(["X", "Y", "Z"], channels), dtype=dtype)
+
+    timestamps = good["timestamp"].astype("datetime64[us]")
+    pages = axivity_block_channels(headers, channels, dtype)
+
+    return timestamps, indices, samples, pages
+
+def axivity_decode_range(shared, source, block_numbers, headers, state, first_sample, axes, dtype):
+    """
+    Worker task: timestamp the given Axivity blocks, and decode their samples into the shared arrays starting at first_sample.
+    """
+
+    file_header, blocks = axivity_read_blocks(map_file(source))
+    timestamps, state = axivity_block_timestamps(headers, state)
+
+    memories, arrays = attach_shared_arrays(shared)
+    axivity_decode_blocks(blocks, block_numbers, out=[a[first_sample:] for a in arrays], axes=axes, dtype=dtype)
+
+    del arrays
+    for memory in memories:
+        memory.close()
+
+    return timestamps
+
+def axivity_decode_parallel(source, blocks, workers, first_block=0, last_block=None, state=None, channels=None, dtype="float64"):
+    """
+    Decode an Axivity file like axivity_decode, but split the blocks into one contiguous range per worker and decode the ranges in parallel.
+    Only blocks first_block up to last_block are decoded, with state carrying the timestamp interpolation over from the blocks before them.
+    Only the named channels are decoded (all of them if channels is None), with samples stored as dtype.
+    Returns the block timestamps, the index of each block's first sample, the sample level channel data and the block level channel data.
+    """
+
+    if last_block is None:
+        last_block = len(blocks)
+
+    block_numbers = np.flatnonzero(axivity_usable_blocks(blocks[first_block:last_block])) + first_block
+    headers = axivity_block_headers(blocks, block_numbers)
+
+    # Blocks without a valid timestamp are dropped, which has to be known up front to place each range's samples
+    valid = ~np.isnat(axivity_read_timestamps(headers["timestamp"]))
+    block_numbers = block_numbers[valid]
+    headers = headers[valid]
+
+    counts = axivity_sample_counts(headers)
+    indices = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    num_samples = int(counts.sum())
+
+    axes = wanted_channels(["X", "Y", "Z"], channels)
+
+    arguments = []
+    for positions in np.array_split(np.arange(len(block_numbers)), workers):
+
+        if len(positions) == 0:
+            continue
+
+        first, last = positions[0], positions[-1]+1
+
+        # The interpolation state after a block depends only on that block, so each range can start from its predecessor
+        range_state = state
+        if first > 0:
+            range_state = axivity_block_timestamps(headers[first-1:first])[1]
+
+        arguments.append((source, block_numbers[first:last], headers[first:last], range_state, indices[first], axes, dtype))
+
+    results, samples = decode_in_parallel(axivity_decode_range, arguments, num_samples, axes, workers, sample_dtype(dtype, np.int16))
+
+    timestamps = np.empty(len(block_numbers), dtype="datetime64[us]")
+    if len(results) > 0:
+        timestamps[:] = np.concatenate(results)
+
+    pages = axivity_block_channels(headers, channels, dtype)
+
+    return timestamps, indices, samples, pages
+
+def axivity_edge_headers(blocks, from_end=False, count=2, window=64):
+    """
+    Find the headers of up to count usable blocks with a valid timestamp, nearest the start (or end) of the file.
+    Blocks are examined a window at a time, so the rest of the file is never touched.
+    """
+
+    starts = range(0, len(blocks), window)
+    if from_end:
+        starts = reversed(starts)
+
+    found = []
+    for start in starts:
+
+        block_numbers = np.flatnonzero(axivity_usable_blocks(blocks[start:start+window])) + start
+        headers = axivity_block_headers(blocks, block_numbers)
+        headers = headers[~np.isnat(axivity_read_timestamps(headers["timestamp"]))]
+
+        found.append(headers)
+        if sum(len(h) for h in found) >= count:
+            break
+
+    if len(found) == 0:
+        return axivity_block_headers(blocks, np.array([], dtype=int))
+
+    if from_end:
+        found.reverse()
+        headers = np.concatenate(found)
+        return headers[max(len(headers)-count, 0):]
+    else:
+        headers = np.concatenate(found)
+        return headers[:count]
+
+def load(source, source_type, workers=1, time_period=None, index=False, channels=None, dtype="float64", **options):
+    """
+    Load an Axivity .cwa file, or a .cwa file inside a .zip archive of the same name.
+    """
+
+    if source_type == "Axivity_ZIP":
+        return load_zip(source)
+
+    # Memory map the file and view it as an array of 512 byte blocks, without copying it
+    raw_bytes = map_file(source)
+    file_header, blocks = axivity_read_blocks(raw_bytes)
+
+    # Find the blocks covering the time period, or decode every block
+    first_block, last_block, state = 0, len(blocks), None
+    if time_period is not None and index is False:
+        first_block, last_block, state = axivity_find_blocks(blocks, time_period)
+
+    # The number of samples is counted from X, so decode it even when only Light or Temperature are requested
+    decode_channels = sample_channels(channels)
+
+    # axivity_indices points at the first sample of each block
+    if index is not False:
+        page_index = get_page_index(source, source_type, index, lambda: axivity_build_index(raw_bytes, blocks))
+        axivity_timestamps, axivity_indices, samples, pages = axivity_decode_indexed(blocks, page_index, time_period, decode_channels, dtype)
+
+        if time_period is not None:
+            block_numbers, good = axivity_find_blocks_indexed(page_index, time_period)
+            first_block, last_block = (block_numbers[0], block_numbers[-1] + 1) if len(block_numbers) > 0 else (0, 0)
+    elif workers > 1:
+        axivity_timestamps, axivity_indices, samples, pages = axivity_decode_parallel(source, blocks, workers, first_block, last_block, state, decode_channels, dtype)
+    else:
+        axivity_timestamps, axivity_indices, samples, pages, state = axivity_decode(blocks[first_block:last_block], state, decode_channels, dtype)
+
+    if len(axivity_timestamps) == 0:
+        raise Exception("No data found in {} for the time period {}.".format(source, time_period))
+
+    num_pages = len(axivity_timestamps)
+    num_samples = len(next(iter(samples.values())))
+
+    # Map the page-level timestamps to the acceleration data "sparsely"
+    channel_list = channels_from_pages(axivity_timestamps, axivity_indices, samples, pages, file_header["frequency"], channels)
+
+    if dtype == "native":
+        set_scales(channel_list, scales(file_header))
+
+    # Approximate the frequency in hertz, based on the difference between the first and last timestamp
+    approximate_frequency = timedelta(seconds=1)/ ((to_datetime(axivity_timestamps[-1])-to_datetime(axivity_timestamps[0]))/num_samples)
+
+    file_header["approximate_frequency"] = approximate_frequency
+    file_header["num_pages"] = num_pages
+    file_header["num_samples"] = num_samples
+
+    # Report the blocks that were skipped over in the part of the file that was read, and where that leaves gaps in the data
+    incomplete = last_block == len(blocks) and len(raw_bytes) % axivity_block_dtype.itemsize != 0
+    file_header["dropped_blocks"] = axivity_block_report(blocks[first_block:last_block], incomplete)
+    file_header["gaps"] = axivity_find_gaps(axivity_timestamps, axivity_indices, num_samples, file_header["frequency"])
+
+    return file_header, channel_list
+
+def load_zip(source):
+    """
+    Load the .cwa file inside a .zip archive, timestamping each block without interpolation.
+    """
+
+    import zipfile
+
+    channel_x = Channel("X")
+    channel_y = Channel("Y")
+    channel_z = Channel("Z")
+    channel_light = Channel("Light")
+    channel_temperature = Channel("Temperature")
+
+    #print("Opening file")
+    archive = zipfile.ZipFile(source, "r")
+
+    without_filepath = source.split("/")[-1]
+
+    cwa_not_zip = without_filepath.replace(".zip", ".cwa")
+
+    handle = archive.open(cwa_not_zip)
+
+    raw_bytes = handle.read()
+
+    file_header, blocks = axivity_read_blocks(raw_bytes)
+    block_numbers = np.flatnonzero(axivity_usable_blocks(blocks))
+    headers = axivity_block_headers(blocks, block_numbers)
+
+    # Blocks are timestamped without interpolation here
+    axivity_timestamps = axivity_read_timestamps(headers["timestamp"])
+    valid = ~np.isnat(axivity_timestamps)
+    block_numbers = block_numbers[valid]
+    headers = headers[valid]
+    axivity_timestamps = axivity_timestamps[valid]
+
+    samples, axivity_indices = axivity_decode_blocks(blocks, block_numbers)
+    axivity_x, axivity_y, axivity_z = samples.values()
+    axivity_light = headers["light"].astype(np.float64)
+    axivity_temperature = headers["temperature"].astype(np.float64)
+
+    num_pages = len(headers)
+    num_samples = len(axivity_x)
+
+    file_header["dropped_blocks"] = axivity_block_report(blocks, len(raw_bytes) % axivity_block_dtype.itemsize != 0)
+
+    # Leave room for the final observation
+    axivity_x = np.concatenate((axivity_x, [0]))
+    axivity_y = np.concatenate((axivity_y, [0]))
+    axivity_z = np.concatenate((axivity_z, [0]))
+
+    # Timestamp the final observation
+    final_timestamp = axivity_timestamps[-1] + ((num_samples/num_pages)*(timedelta(seconds=1)/file_header["frequency"]))
+    axivity_timestamps = np.concatenate((axivity_timestamps, [final_timestamp]))
+    axivity_indices = np.concatenate((axivity_indices, [num_samples])).astype(int)
+
+    channel_x.set_contents(axivity_x, axivity_timestamps, timestamp_policy="sparse")
+    channel_y.set_contents(axivity_y, axivity_timestamps, timestamp_policy="sparse")
+    channel_z.set_contents(axivity_z, axivity_timestamps, timestamp_policy="sparse")
+
+    channel_light.set_contents(axivity_light, axivity_timestamps, timestamp_policy="sparse")
+    channel_temperature.set_contents(axivity_temperature, axivity_timestamps, timestamp_policy="sparse")
+
+    for c in [channel_x, channel_y, channel_z]:
+        c.indices = axivity_indices
+        #c.sparsely_timestamped = True
+        c.frequency = file_header["frequency"]
+
+    #file_header["frequency"] = approximate_frequency
+    file_header["num_pages"] = num_pages
+    file_header["num_samples"] = num_samples
+
+    return file_header, [channel_x, channel_y, channel_z, channel_light, channel_temperature]
+
+def probe(source, source_type, **options):
+    """
+    Describe an Axivity file from its metadata and first and last blocks, estimating the number of samples (and pages) from the file size.
+    Returns None for a .cwa file inside a .zip archive, which can't be described without decompressing it.
+    """
+
+    if source_type == "Axivity_ZIP":
+        return None
+
+    file_header, blocks = axivity_read_blocks(map_file(source))
+
+    first = axivity_edge_headers(blocks)
+    last = axivity_edge_headers(blocks, from_end=True)
+
+    if len(first) == 0:
+        raise Exception("No usable data blocks in {}.".format(source))
+
+    # Timestamp the last block from the one before it, as a full load would
+    first_timestamp = axivity_block_timestamps(first[:1])[0][0].astype(datetime)
+    last_timestamp = axivity_block_timestamps(last)[0][-1].astype(datetime)
+
+    num_pages = len(blocks)
+    num_samples = num_pages * int(axivity_sample_counts(first[:1])[0])
+
+    header = file_header
+    header["approximate_frequency"] = timedelta(seconds=1)/ ((last_timestamp-first_timestamp)/num_samples)
+    header["num_pages"] = num_pages
+    header["num_samples"] = num_samples
+
+    return header, first_timestamp, last_timestamp, num_samples
+
+def batches(source, source_type, channels=None, dtype="float64", batch_size=axivity_batch_size, **options):
+    """
+    Return the header of an Axivity file, and a generator that decodes it batch_size blocks at a time.
+    Returns None for a .cwa file inside a .zip archive, which can't be read in batches.
+    """
+
+    if source_type == "Axivity_ZIP":
+        return None
+
+    raw_bytes = map_file(source)
+    file_header, blocks = axivity_read_blocks(raw_bytes)
+    decode_channels = sample_channels(channels)
+
+    def decode_batches():
+
+        state = None
+        for batch_start in range(0, len(blocks), batch_size):
+
+            timestamps, indices, samples, pages, state = axivity_decode(blocks[batch_start:batch_start+batch_size], state, decode_channels, dtype)
+
+            if len(timestamps) > 0:
+                yield timestamps, indices, samples, pages
+
+    return file_header, decode_batches()
+
+def scales(header):
+    """
+    The scale_factor and scale_offset that convert the device's int16 values to g.
+    """
+
+    return axivity_scales
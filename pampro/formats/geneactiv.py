@@ -0,0 +1,385 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+import re
+from collections import OrderedDict
+
+from ..data_loading import *
+from .generic_csv import parse_datetimes
+
+# Maps the ASCII code of each hexadecimal digit to its value
+geneactiv_hex_lookup = np.zeros(256, dtype=np.uint16)
+geneactiv_hex_lookup[np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)] = np.arange(16)
+geneactiv_hex_lookup[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16)
+
+def geneactiv_decode_hex(raw):
+    """
+    Decode GeneActiv sample data in bulk. raw is an array of ASCII bytes, 12 hexadecimal digits per sample.
+    The first 9 digits of each sample are X, Y and Z as 12 bit two's complement values, and the last 3 are ignored here.
+    Returns a (3, number of samples) array of X, Y and Z values.
+    """
+
+    nibbles = geneactiv_hex_lookup[raw.reshape(-1, 12)[:,:9]].reshape(-1, 3, 3)
+
+    # Assemble each 12 bit value from its 3 digits, then sign extend it by moving it to the top of a 16 bit int and shifting back
+    values = (nibbles[:,:,0] << 8) | (nibbles[:,:,1] << 4) | nibbles[:,:,2]
+    values = (values << 4).view(np.int16) >> 4
+
+    return values.T
+
+def geneactiv_scales(header_info):
+    """
+    The scale_factor and scale_offset that calibrate each axis of a GeneActiv file: (value * 100 - offset) / gain.
+    """
+
+    return OrderedDict([(axis, (100.0 / header_info[axis.lower() + "_gain"], -header_info[axis.lower() + "_offset"] / header_info[axis.lower() + "_gain"])) for axis in ["X", "Y", "Z"]])
+
+def geneactiv_calibrate(raw, header_info, axes=["X", "Y", "Z"], dtype="float64", batch_size=300000):
+    """
+    Decode and calibrate GeneActiv hex sample data into an array per axis, batch_size samples at a time.
+    Samples are stored as dtype, or kept as the device's 12 bit values in int16 if dtype is "native" (see geneactiv_scales).
+    """
+
+    num_samples = len(raw) // 12
+    samples = OrderedDict([(axis, np.empty(num_samples, dtype=sample_dtype(dtype, np.int16))) for axis in axes])
+
+    rows = [["X", "Y", "Z"].index(axis) for axis in axes]
+    offsets = np.array([[header_info["x_offset"]], [header_info["y_offset"]], [header_info["z_offset"]]], dtype=np.float64)[rows]
+    gains = np.array([[header_info["x_gain"]], [header_info["y_gain"]], [header_info["z_gain"]]], dtype=np.float64)[rows]
+
+    for batch_start in range(0, num_samples, batch_size):
+
+        values = geneactiv_decode_hex(raw[batch_start*12:(batch_start+batch_size)*12])[rows]
+
+        # Apply the calibration to every axis at once
+        if dtype != "native":
+            values = (values * 100.0 - offsets) / gains
+
+        for axis, axis_values in zip(axes, values):
+            samples[axis][batch_start:batch_start+len(axis_values)] = axis_values
+
+    return samples
+
+def geneactiv_decode_pages(data, header_info, num_pages, channels=None, dtype="float64"):
+    """
+    Decode the given number of GeneActiv pages, starting from the current position of the file handle.
+    Each page is timestamped every second to the nearest second.
+    Only the named channels are decoded (all of them if channels is None), with samples stored as dtype.
+    Returns the timestamps, the index of the sample each timestamp points at, the calibrated sample data, and the time of the last page.
+    """
+
+    obs_num = 0
+    ts_num = 0
+    # Data format contains 300 XYZ values per page, each 12 hexadecimal digits
+    num = 300
+    raw = np.empty(num*12*num_pages, dtype=np.uint8)
+
+    # We will timestamp every 1 second of data to the nearest second
+    # 300 / frequency = number of timestamps per page
+    timestamps_per_page = int(num / header_info["frequency"])
+    num_timestamps = timestamps_per_page * num_pages
+
+    ga_timestamps = np.empty(int(num_timestamps)+1, dtype="datetime64[us]")
+    ga_indices = np.empty(int(num_timestamps)+1)
+    page_time = None
+
+    # For each page
+    for i in range(num_pages):
+
+        lines = [data.readline().strip().decode() for l in range(9)]
+        page_time = datetime.strptime(lines[3][10:29], "%Y-%m-%d %H:%M:%S")# + timedelta(microseconds=int(lines[3][30:])*1000)
+
+        ga_timestamps[ts_num] = page_time
+        ga_indices[ts_num] = obs_num
+
+        for k in range(timestamps_per_page):
+            ga_timestamps[ts_num+1] = page_time + (timedelta(seconds=1) * (k+1))
+            ga_indices[ts_num+1] = obs_num + (int(header_info["frequency"]) * (k+1))
+            ts_num += 1
+
+        # Collect the page's hex data to decode all at once later
+        raw[obs_num*12:(obs_num+num)*12] = np.frombuffer(data.read(num*12), dtype=np.uint8)
+        obs_num += num
+
+        excess = data.read(2)
+
+    samples = geneactiv_calibrate(raw, header_info, wanted_channels(["X", "Y", "Z"], channels), dtype)
+
+    # The timestamp after the last page belongs to the next page, so leave it off
+    return ga_timestamps[:-1], ga_indices[:-1].astype(int), samples, page_time
+
+def geneactiv_page_time(data, offset):
+    """
+    The time of the first GeneActiv page starting at or after offset, or None if there isn't one.
+    """
+
+    page = data.find(b"Recorded Data", offset)
+    if page == -1:
+        return None
+
+    # Page time is the 4th line of a page
+    lines = data[page:page+256].split(b"\n")
+    return datetime.strptime(lines[3].strip().decode()[10:29], "%Y-%m-%d %H:%M:%S")
+
+def geneactiv_find_pages(data, time_period):
+    """
+    Binary search the page times of a GeneActiv file for the pages covering time_period, a (start, end) pair of datetimes.
+    Like slicing, the period includes start but not end, so a page starting at end isn't decoded.
+    data is the mapped file, positioned at the first page.
+    Returns the byte offset of the first page to decode, and how many pages to decode.
+    """
+
+    start, end = time_period
+    page_time = lambda offset: geneactiv_page_time(data, offset)
+
+    begin = data.tell()
+
+    # Start from the page containing start, which is the one before the first page after start
+    after_start = data.find(b"Recorded Data", bisect_pages(begin, len(data), page_time, start))
+    if after_start == -1:
+        after_start = len(data)
+
+    first_page = data.rfind(b"Recorded Data", begin, after_start)
+    if first_page == -1:
+        first_page = after_start
+
+    # Stop after the last page starting before end
+    after_end = data.find(b"Recorded Data", bisect_pages(first_page, len(data), page_time, end, side="left"))
+    if after_end == -1:
+        after_end = len(data)
+
+    num_pages = sum(1 for match in re.compile(b"Recorded Data").finditer(data, first_page, after_end))
+
+    return first_page, num_pages
+
+def geneactiv_build_index(data, header_info):
+    """
+    Index every page of a GeneActiv file: its byte offset, first sample, time and sequence number.
+    data is the mapped file, positioned at the first page. GeneActiv pages have no checksum, so checksum_ok is always True.
+    """
+
+    offsets = [match.start() for match in re.compile(b"Recorded Data").finditer(data, data.tell())][:header_info["number_pages"]]
+
+    page_index = np.zeros(len(offsets), dtype=page_index_dtype)
+    page_index["offset"] = offsets
+    page_index["first_sample"] = np.arange(len(offsets), dtype=np.int64) * 300
+    page_index["status"] = page_ok
+    page_index["checksum_ok"] = True
+
+    # Sequence number and page time are the 3rd and 4th lines of a page
+    sequence_ids = []
+    page_times = []
+    for offset in offsets:
+        lines = data[offset:offset+256].split(b"\n")
+        sequence_ids.append(int(lines[2].strip().decode().split(":")[1]))
+        page_times.append(datetime.strptime(lines[3].strip().decode()[10:29], "%Y-%m-%d %H:%M:%S"))
+
+    page_index["sequence_id"] = sequence_ids
+    page_index["timestamp"] = datetimes_to_microseconds(page_times)
+
+    return page_index
+
+def geneactiv_find_pages_indexed(page_index, time_period):
+    """
+    Binary search a GeneActiv index for the pages covering time_period, a (start, end) pair of datetimes.
+    As for geneactiv_find_pages(), the period includes start but not end.
+    Returns the byte offset of the first page to decode, and how many pages to decode.
+    """
+
+    first = max(np.searchsorted(page_index["timestamp"], datetimes_to_microseconds([time_period[0]])[0], side="right") - 1, 0)
+    last = np.searchsorted(page_index["timestamp"], datetimes_to_microseconds([time_period[1]])[0], side="left")
+
+    if last <= first:
+        return 0, 0
+
+    return int(page_index["offset"][first]), int(last - first)
+
+def geneactiv_decode_range(shared, source, header_info, offset, num_pages, first_sample, channels, dtype):
+    """
+    Worker task: decode num_pages GeneActiv pages starting at the given byte offset, into the shared arrays starting at first_sample.
+    """
+
+    data = map_file(source)
+    data.seek(offset)
+    timestamps, indices, samples, page_time = geneactiv_decode_pages(data, header_info, num_pages, channels, dtype)
+
+    memories, arrays = attach_shared_arrays(shared)
+    for array, values in zip(arrays, samples.values()):
+        array[first_sample:first_sample+len(values)] = values
+
+    del arrays
+    for memory in memories:
+        memory.close()
+
+    return timestamps, indices + first_sample, page_time
+
+def geneactiv_decode_parallel(source, data, header_info, workers, num_pages=None, channels=None, dtype="float64", page_offsets=None):
+    """
+    Decode the pages of a GeneActiv file like geneactiv_decode_pages, but split the pages into one contiguous range per worker and decode the ranges in parallel.
+    data is the mapped file, positioned at the first page to decode. By default every page is decoded.
+    page_offsets are the byte offsets of the pages from that one on, if they are already known from a page index.
+    """
+
+    if num_pages is None:
+        num_pages = header_info["number_pages"]
+
+    # Pages vary slightly in length, so find where each one starts
+    if page_offsets is None:
+        page_offsets = [match.start() for match in re.compile(b"Recorded Data").finditer(data, data.tell())]
+    page_offsets = page_offsets[:num_pages]
+
+    if len(page_offsets) < num_pages:
+        raise Exception("Expected {} pages, but only found {}.".format(num_pages, len(page_offsets)))
+
+    arguments = []
+    for pages in np.array_split(np.arange(num_pages), workers):
+
+        if len(pages) > 0:
+            arguments.append((source, header_info, int(page_offsets[pages[0]]), len(pages), int(pages[0])*300, channels, dtype))
+
+    results, samples = decode_in_parallel(geneactiv_decode_range, arguments, num_pages*300, wanted_channels(["X", "Y", "Z"], channels), workers, sample_dtype(dtype, np.int16))
+
+    timestamps = np.concatenate([r[0] for r in results])
+    indices = np.concatenate([r[1] for r in results])
+
+    return timestamps, indices, samples, results[-1][2]
+
+# The columns of a GeneActiv CSV export after the timestamp, and the type each is stored in
+geneactiv_csv_columns = OrderedDict([("GA_X", np.float64), ("GA_Y", np.float64), ("GA_Z", np.float64), ("GA_Lux", np.int32), ("GA_Event", np.bool_), ("GA_Temperature", np.float32)])
+
+def parse_geneactiv_csv_rows(rows, skip_header=0, channels=None, dtype="float64"):
+    """
+    Parse the rows of a GeneActiv CSV export.
+    rows can be a filename or a list of lines.
+    Only the named channels are read (all of them if channels is None), with GA_X, GA_Y and GA_Z stored as dtype.
+    """
+
+    names = wanted_channels(list(geneactiv_csv_columns), channels)
+    columns = [0] + [list(geneactiv_csv_columns).index(name) + 1 for name in names]
+
+    data = np.loadtxt(rows, delimiter=',', skiprows=skip_header, dtype='S', usecols=columns, ndmin=2)
+
+    samples = OrderedDict()
+    for column, name in enumerate(names, 1):
+        column_dtype = sample_dtype(dtype, geneactiv_csv_columns[name]) if name in ["GA_X", "GA_Y", "GA_Z"] else geneactiv_csv_columns[name]
+        samples[name] = np.array(data[:,column], dtype=column_dtype)
+
+    ga_timestamps = parse_datetimes(data[:,0], "%Y-%m-%d %H:%M:%S:%f")
+
+    return ga_timestamps, samples
+
+def load(source, source_type, workers=1, time_period=None, index=False, channels=None, dtype="float64", **options):
+    """
+    Load a GeneActiv .bin file, or a GeneActiv CSV export.
+    """
+
+    if source_type == "GeneActiv_CSV":
+
+        ga_timestamps, samples = parse_geneactiv_csv_rows(source, skip_header=80, channels=channels, dtype=dtype)
+        return OrderedDict(), channels_from_pages(ga_timestamps, None, samples, channels=channels)
+
+    # Memory map the file rather than reading a copy of it
+    data = map_file(source)
+    #print("File read in")
+
+    # First 59 lines contain header information
+    first_lines = [data.readline().strip().decode() for i in range(59)]
+    #print(first_lines)
+    header_info = parse_header(first_lines, "GeneActiv", "")
+    #print(header_info)
+
+    # The index is only read (or built) when it is used, to find the time period or to split the pages between workers
+    page_index = None
+    if index is not False and (time_period is not None or workers > 1):
+        page_index = get_page_index(source, source_type, index, lambda: geneactiv_build_index(data, header_info))
+
+    # Find the pages covering the time period, or decode every page
+    num_pages = header_info["number_pages"]
+    if time_period is not None:
+
+        if page_index is not None:
+            first_page, num_pages = geneactiv_find_pages_indexed(page_index, time_period)
+        else:
+            first_page, num_pages = geneactiv_find_pages(data, time_period)
+
+        data.seek(first_page)
+
+        if num_pages == 0:
+            raise Exception("No data found in {} for the time period {}.".format(source, time_period))
+
+    if workers > 1:
+        page_offsets = None if page_index is None else page_index["offset"][np.searchsorted(page_index["offset"], data.tell()):]
+        ga_timestamps, ga_indices, samples, page_time = geneactiv_decode_parallel(source, data, header_info, workers, num_pages, sample_channels(channels), dtype, page_offsets)
+    else:
+        ga_timestamps, ga_indices, samples, page_time = geneactiv_decode_pages(data, header_info, num_pages, sample_channels(channels), dtype)
+    obs_num = len(next(iter(samples.values())))
+
+    # Timestamp the final observation
+    ga_timestamps = np.concatenate((ga_timestamps, [page_time + (300*(timedelta(seconds=1)/header_info["frequency"]))]))
+    ga_indices = np.concatenate((ga_indices, [obs_num])).astype(int)
+
+    channel_list = channels_from_pages(ga_timestamps, ga_indices, samples, frequency=header_info["frequency"], channels=channels)
+
+    if dtype == "native":
+        set_scales(channel_list, scales(header_info))
+
+    return header_info, channel_list
+
+def probe(source, source_type, **options):
+    """
+    Describe a GeneActiv file from its header and first and last pages, or return None for a GeneActiv CSV export, which can't be.
+    """
+
+    if source_type == "GeneActiv_CSV":
+        return None
+
+    data = map_file(source)
+    header = parse_header([data.readline().strip().decode() for i in range(59)], "GeneActiv", "")
+
+    # Page time is the 4th line of a page
+    first_page = [data.readline().strip().decode() for l in range(4)]
+    data.seek(data.rfind(b"Recorded Data"))
+    last_page = [data.readline().strip().decode() for l in range(4)]
+
+    first_timestamp = datetime.strptime(first_page[3][10:29], "%Y-%m-%d %H:%M:%S")
+    last_timestamp = datetime.strptime(last_page[3][10:29], "%Y-%m-%d %H:%M:%S") + (300*(timedelta(seconds=1)/header["frequency"]))
+    num_samples = header["number_pages"] * 300
+
+    return header, first_timestamp, last_timestamp, num_samples
+
+def batches(source, source_type, channels=None, dtype="float64", batch_size=1000, **options):
+    """
+    Return the header of a GeneActiv file, and a generator that decodes it batch_size pages at a time.
+    A GeneActiv CSV export is parsed a chunk of rows at a time instead.
+    """
+
+    if source_type == "GeneActiv_CSV":
+
+        f = open(source, 'r')
+        for i in range(80):
+            f.readline()
+
+        return OrderedDict(), csv_batches(f, lambda rows: parse_geneactiv_csv_rows(rows, channels=channels, dtype=dtype))
+
+    data = map_file(source)
+    header_info = parse_header([data.readline().strip().decode() for i in range(59)], "GeneActiv", "")
+    decode_channels = sample_channels(channels)
+
+    def decode_batches():
+
+        remaining = header_info["number_pages"]
+        while remaining > 0:
+
+            num_pages = min(batch_size, remaining)
+            timestamps, indices, samples, page_time = geneactiv_decode_pages(data, header_info, num_pages, decode_channels, dtype)
+            remaining -= num_pages
+
+            yield timestamps, indices, samples, OrderedDict()
+
+    return header_info, decode_batches()
+
+def scales(header):
+    """
+    The scale_factor and scale_offset that calibrate each axis: (value * 100 - offset) / gain.
+    """
+
+    return geneactiv_scales(header)
@@ -0,0 +1,194 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+import re
+from collections import OrderedDict
+
+from ..data_loading import *
+
+def csv_data_columns(column_names, datetime_column, ignore_columns=False):
+    """
+    Decide which columns of a CSV file become Channels: everything except the timestamp column and any ignored columns.
+    """
+
+    data_columns = list(range(0,len(column_names)))
+    del data_columns[datetime_column]
+
+    if ignore_columns != False:
+        for ic in ignore_columns:
+            del data_columns[ic]
+
+    return data_columns
+
+def csv_channel_names(source, column_names, data_columns, unique_names=False):
+    """
+    Name a Channel after each of the data columns, optionally prefixed with the filename to make them unique.
+    """
+
+    names = []
+    for col in data_columns:
+        if unique_names:
+            names.append(source.split("/")[-1] + " - " + column_names[col])
+        else:
+            names.append(column_names[col])
+
+    return names
+
+# The width of each fixed width datetime_format directive, and where its digits go in an ISO 8601 timestamp "YYYY-MM-DDTHH:MM:SS.ffffff"
+datetime_directives = {"Y":(4, 0), "m":(2, 5), "d":(2, 8), "H":(2, 11), "M":(2, 14), "S":(2, 17), "f":(6, 20)}
+
+# datetime_format -> its layout, so each format is only interpreted once
+datetime_layouts = {}
+
+def datetime_layout(datetime_format):
+    """
+    Interpret datetime_format as a fixed width layout, if it only uses fixed width directives (%Y %m %d %H %M %S, and %f at the end).
+    Returns a list of (directive or None for literal text, text, position in the formatted string), or None if the format isn't fixed width.
+    """
+
+    if datetime_format in datetime_layouts:
+        return datetime_layouts[datetime_format]
+
+    layout = []
+    position = 0
+    parts = [part for part in re.split("(%.)", datetime_format) if len(part) > 0]
+
+    for i, part in enumerate(parts):
+
+        if part.startswith("%"):
+
+            # %f has a variable number of digits, so it can only come last
+            directive = part[1:]
+            if directive not in datetime_directives or (directive == "f" and i != len(parts)-1):
+                layout = None
+                break
+
+            layout.append((directive, part, position))
+            position += datetime_directives[directive][0]
+
+        else:
+
+            layout.append((None, part, position))
+            position += len(part)
+
+    # Each directive can only be used once
+    if layout is not None:
+        directives = [directive for directive, text, position in layout if directive is not None]
+        if len(set(directives)) != len(directives):
+            layout = None
+
+    datetime_layouts[datetime_format] = layout
+    return layout
+
+def parse_datetimes(column, datetime_format):
+    """
+    Parse a column of timestamp strings to datetime64[us], equivalent to datetime.strptime on each of them.
+    Fixed width formats (e.g. "%d/%m/%Y %H:%M:%S:%f") are parsed all at once, by rearranging the digits into ISO 8601 order for NumPy to parse natively.
+    Anything else is parsed one string at a time.
+    """
+
+    column = np.atleast_1d(np.asarray(column, dtype="S"))
+    layout = datetime_layout(datetime_format)
+
+    if layout is not None and len(column) > 0:
+
+        lengths = np.char.str_len(column)
+        length = lengths[0]
+
+        # Every string must be the same length, which must fit the layout
+        end = layout[-1][2] + (len(layout[-1][1]) if layout[-1][0] is None else datetime_directives[layout[-1][0]][0])
+        has_fraction = layout[-1][0] == "f"
+        fits = (lengths == length).all() and (length == end or (has_fraction and end-6 < length < end))
+
+        if fits:
+
+            characters = column.astype("S{}".format(length)).view(np.uint8).reshape(-1, length)
+
+            # Unspecified parts default to the same as strptime: 1900-01-01 00:00:00.000000
+            iso = np.empty((len(column), 26), dtype=np.uint8)
+            iso[:] = np.frombuffer(b"1900-01-01T00:00:00.000000", dtype=np.uint8)
+
+            for directive, text, position in layout:
+
+                if directive is None:
+
+                    # Literal text must match exactly
+                    if not (characters[:,position:position+len(text)] == np.frombuffer(text.encode(), dtype=np.uint8)).all():
+                        fits = False
+                        break
+
+                else:
+
+                    width, iso_position = datetime_directives[directive]
+                    digits = characters[:,position:min(position+width, length)]
+
+                    if not ((digits >= ord("0")) & (digits <= ord("9"))).all():
+                        fits = False
+                        break
+
+                    iso[:,iso_position:iso_position+digits.shape[1]] = digits
+
+            if fits:
+                try:
+                    return iso.view("S26").ravel().astype("datetime64[us]")
+                except ValueError:
+                    # Out of range values, which strptime will report
+                    pass
+
+    return np.array([datetime.strptime(t.decode(), datetime_format) for t in column], dtype="datetime64[us]")
+
+def parse_csv_rows(rows, datetime_format, datetime_column, data_columns, skiprows=0):
+    """
+    Parse the rows of a generic timestamped CSV file, reading only the timestamp column and data_columns.
+    rows can be a filename or a list of lines.
+    Returns the timestamps, and a list with a float array for each of data_columns.
+    """
+
+    timestamps = np.loadtxt(rows, delimiter=',', skiprows=skiprows, dtype='S', usecols=(datetime_column,), ndmin=1)
+    timestamps = parse_datetimes(timestamps, datetime_format)
+
+    data = np.loadtxt(rows, delimiter=',', skiprows=skiprows, dtype=np.float64, usecols=data_columns, ndmin=2)
+    columns = [data[:,i].copy() for i in range(len(data_columns))]
+
+    return timestamps, columns
+
+def open_csv(source, datetime_format, datetime_column, ignore_columns, unique_names, channels):
+    """
+    Open a CSV file and read its column names, returning the file and a function that parses a chunk of its rows.
+    Only the columns of the requested channels are parsed, or all of them if channels is None.
+    """
+
+    f = open(source, 'r')
+    column_names = f.readline().strip().split(",")
+
+    data_columns = csv_data_columns(column_names, datetime_column, ignore_columns)
+    names = csv_channel_names(source, column_names, data_columns, unique_names)
+
+    if channels is not None:
+        data_columns, names = [c for c, n in zip(data_columns, names) if n in channels], [n for n in names if n in channels]
+
+    def parse_rows(lines):
+        timestamps, columns = parse_csv_rows(lines, datetime_format, datetime_column, data_columns)
+        return timestamps, OrderedDict(zip(names, columns))
+
+    return f, parse_rows
+
+def load(source, source_type, datetime_format="%d/%m/%Y %H:%M:%S:%f", datetime_column=0, ignore_columns=False, unique_names=False, channels=None, **options):
+    """
+    Load a CSV file with a column of timestamps and a column per channel.
+    """
+
+    f, parse_rows = open_csv(source, datetime_format, datetime_column, ignore_columns, unique_names, channels)
+
+    # Parse the rows a chunk at a time, so the text of the whole file is never held at once
+    timestamps, indices, samples, pages = concatenate_batches(list(csv_batches(f, parse_rows)))
+
+    return OrderedDict(), channels_from_pages(timestamps, None, samples)
+
+def batches(source, source_type, datetime_format="%d/%m/%Y %H:%M:%S:%f", datetime_column=0, ignore_columns=False, unique_names=False, channels=None, **options):
+    """
+    Return an empty header, and a generator that parses a CSV file a chunk of rows at a time.
+    """
+
+    f, parse_rows = open_csv(source, datetime_format, datetime_column, ignore_columns, unique_names, channels)
+
+    return OrderedDict(), csv_batches(f, parse_rows)
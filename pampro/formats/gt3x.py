@@ -0,0 +1,269 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+import struct
+from collections import OrderedDict
+
+from ..data_loading import *
+
+# A .gt3x file is a zip archive of "info.txt", describing the device and recording, and "log.bin", a stream of records
+# Each record is a separator byte, type byte, uint32 timestamp (seconds since 1970 in local time), uint16 payload size, the payload and a checksum byte
+gt3x_separator = 0x1E
+gt3x_record_header = struct.Struct("<BBIH")
+
+# Record types holding 1 second of acceleration: 12 bit values packed in Y, X, Z order, or int16 values in X, Y, Z order
+gt3x_activity = 0x00
+gt3x_activity2 = 0x1A
+
+gt3x_record_dtype = np.dtype([("type", np.uint8), ("timestamp", np.int64), ("offset", np.int64), ("size", np.int64)])
+
+# The number of values per g, if info.txt doesn't say (the +-6 g GT3X+)
+gt3x_default_scale = 341.0
+
+# How many records to unpack at once, which bounds the size of the intermediate arrays
+gt3x_batch_size = 10000
+
+def gt3x_ticks_to_datetime(ticks):
+    """
+    Convert the .NET ticks (100 ns since 0001-01-01) used for dates in info.txt to a datetime, or None if it is 0.
+    """
+
+    ticks = int(ticks)
+    if ticks == 0:
+        return None
+    return datetime(1, 1, 1) + timedelta(microseconds=ticks // 10)
+
+def gt3x_parse_info(text):
+    """
+    Parse the "Key: Value" lines of info.txt into a header, with keys in lower case and underscores (e.g. "serial_number").
+    Dates are converted to datetimes, and the sample rate and acceleration scale to numbers.
+    """
+
+    header_info = OrderedDict()
+
+    for line in text.splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            header_info[key.strip().lower().replace(" ", "_")] = value.strip()
+
+    for key in ["start_date", "stop_date", "last_sample_time", "download_date"]:
+        if key in header_info:
+            header_info[key] = gt3x_ticks_to_datetime(header_info[key])
+
+    header_info["frequency"] = int(float(header_info["sample_rate"]))
+    header_info["epoch_length"] = timedelta(seconds=1) / header_info["frequency"]
+    header_info["acceleration_scale"] = float(header_info.get("acceleration_scale", gt3x_default_scale))
+    header_info["start_datetime"] = header_info.get("start_date")
+
+    return header_info
+
+def gt3x_open(source):
+    """
+    Read the header from info.txt of a .gt3x file, and return it with the contents of log.bin as an array of bytes.
+    """
+
+    import zipfile
+
+    with zipfile.ZipFile(source) as archive:
+
+        names = archive.namelist()
+        if "log.bin" not in names:
+            raise Exception("{} has no log.bin, only .gt3x files from firmware that writes one are supported.".format(source))
+
+        header_info = gt3x_parse_info(archive.read("info.txt").decode("utf-8-sig"))
+        log = np.frombuffer(archive.read("log.bin"), dtype=np.uint8)
+
+    return header_info, log
+
+def gt3x_find_records(log):
+    """
+    Walk the records of log.bin, returning the type, timestamp, payload offset and payload size of each (see gt3x_record_dtype).
+    A record cut short at the end of the file is ignored.
+    """
+
+    records = []
+    position = 0
+    buffer = log.data
+
+    while position + gt3x_record_header.size <= len(log):
+
+        separator, record_type, timestamp, size = gt3x_record_header.unpack_from(buffer, position)
+
+        if separator != gt3x_separator:
+            raise Exception("Invalid record separator at byte {} of log.bin.".format(position))
+
+        if position + gt3x_record_header.size + size + 1 > len(log):
+            break
+
+        records.append((record_type, timestamp, position + gt3x_record_header.size, size))
+        position += gt3x_record_header.size + size + 1
+
+    return np.array(records, dtype=gt3x_record_dtype)
+
+def gt3x_sample_counts(records):
+    """
+    The number of samples in each activity record: 36 bits per sample in Activity records, 6 bytes in Activity2 records.
+    Activity records too short to hold a sample (such as those marking a USB connection) have 0.
+    """
+
+    return np.where(records["type"] == gt3x_activity, records["size"] * 8 // 36, records["size"] // 6)
+
+def gt3x_unpack_activity(log, offsets, num_samples):
+    """
+    Unpack the payloads of Activity records which each hold num_samples samples, starting at the given offsets of log.bin.
+    Values are 12 bit two's complement, packed most significant bit first, so every 3 bytes hold 2 values.
+    Returns a (len(offsets), num_samples, 3) array of X, Y and Z int16 values.
+    """
+
+    num_values = num_samples * 3
+    num_bytes = (num_values * 12 + 7) // 8
+
+    # Gather the payloads into rows, padded with zeros to a whole number of 3 byte groups
+    raw = np.zeros((len(offsets), (num_values + 1) // 2 * 3), dtype=np.uint8)
+    raw[:,:num_bytes] = log[offsets[:,None] + np.arange(num_bytes)]
+    groups = raw.reshape(len(offsets), -1, 3).astype(np.uint16)
+
+    values = np.empty(groups.shape[:2] + (2,), dtype=np.uint16)
+    values[:,:,0] = (groups[:,:,0] << 4) | (groups[:,:,1] >> 4)
+    values[:,:,1] = ((groups[:,:,1] & 0x0F) << 8) | groups[:,:,2]
+
+    # Sign extend each value by moving it to the top of a 16 bit int and shifting back
+    values = (values << 4).view(np.int16) >> 4
+    values = values.reshape(len(offsets), -1)[:,:num_values].reshape(len(offsets), num_samples, 3)
+
+    return values[:,:,[1, 0, 2]]
+
+def gt3x_unpack_activity2(log, offsets, num_samples):
+    """
+    Unpack the payloads of Activity2 records which each hold num_samples samples of little endian int16 X, Y and Z values.
+    Returns a (len(offsets), num_samples, 3) array of X, Y and Z int16 values.
+    """
+
+    raw = log[offsets[:,None] + np.arange(num_samples * 6)]
+    return np.ascontiguousarray(raw).view("<i2").reshape(len(offsets), num_samples, 3)
+
+def gt3x_decode_records(log, records, scale, channels=None, dtype="float64"):
+    """
+    Decode the activity records of log.bin into a timestamp per sample and an array per axis.
+    Each record is 1 second of samples, so sample k of a record with n samples is timestamped k/n seconds after the record.
+    Seconds without a record (e.g. while the device was in idle sleep mode) are left as gaps.
+    Samples are divided by scale to convert them to g, or kept as the device's int16 values if dtype is "native".
+    Only the axes in channels are decoded, or all of them if channels is None.
+    """
+
+    axes = wanted_channels(["X", "Y", "Z"], channels)
+
+    records = records[np.isin(records["type"], [gt3x_activity, gt3x_activity2])]
+    counts = gt3x_sample_counts(records)
+    records, counts = records[counts > 0], counts[counts > 0]
+
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    num_samples = int(counts.sum())
+
+    samples = OrderedDict([(axis, np.empty(num_samples, dtype=sample_dtype(dtype, np.int16))) for axis in axes])
+    columns = [["X", "Y", "Z"].index(axis) for axis in axes]
+
+    # Records of the same type and size are unpacked together, a batch at a time
+    for record_type, size in set(zip(records["type"].tolist(), records["size"].tolist())):
+
+        which = np.flatnonzero((records["type"] == record_type) & (records["size"] == size))
+        count = int(counts[which[0]])
+        unpack = gt3x_unpack_activity if record_type == gt3x_activity else gt3x_unpack_activity2
+
+        for batch_start in range(0, len(which), gt3x_batch_size):
+
+            rows = which[batch_start:batch_start+gt3x_batch_size]
+            values = unpack(log, records["offset"][rows], count)
+            positions = (starts[rows][:,None] + np.arange(count)).ravel()
+
+            for axis, column in zip(axes, columns):
+                axis_values = values[:,:,column].ravel()
+                samples[axis][positions] = axis_values if dtype == "native" else axis_values / scale
+
+    record_numbers = np.repeat(np.arange(len(records)), counts)
+    within_record = np.arange(num_samples) - starts[record_numbers]
+    microseconds = records["timestamp"][record_numbers] * 1000000 + within_record * 1000000 // counts[record_numbers]
+
+    return microseconds.astype("datetime64[us]"), samples
+
+def gt3x_find_time_period(records, time_period):
+    """
+    The records of the seconds that overlap time_period, a (start, end) pair of datetimes.
+    """
+
+    start, end = datetimes_to_microseconds(time_period)
+    microseconds = records["timestamp"] * 1000000
+
+    return records[(microseconds + 1000000 > start) & (microseconds < end)]
+
+def load(source, source_type, time_period=None, channels=None, dtype="float64", **options):
+    """
+    Load an ActiGraph .gt3x file, as the X, Y and Z channels of a GT3X+ CSV export would be.
+    """
+
+    header_info, log = gt3x_open(source)
+    records = gt3x_find_records(log)
+
+    if time_period is not None:
+        records = gt3x_find_time_period(records, time_period)
+
+    timestamps, samples = gt3x_decode_records(log, records, header_info["acceleration_scale"], sample_channels(channels), dtype)
+
+    if len(timestamps) == 0:
+        raise Exception("No data found in {} for the time period {}.".format(source, time_period))
+
+    # Full records are regular samples between the gaps, so the timestamps needn't be stored unless some record was cut short
+    regular = regular_timestamps(timestamps, header_info["frequency"])
+    if regular is not None:
+        timestamps = regular
+
+    channel_list = channels_from_pages(timestamps, None, samples, frequency=header_info["frequency"], channels=channels)
+
+    if dtype == "native":
+        set_scales(channel_list, scales(header_info))
+
+    return header_info, channel_list
+
+def probe(source, source_type, **options):
+    """
+    Describe a .gt3x file from its info.txt, estimating the number of samples from the start and last sample times.
+    """
+
+    import zipfile
+
+    with zipfile.ZipFile(source) as archive:
+        header_info = gt3x_parse_info(archive.read("info.txt").decode("utf-8-sig"))
+
+    first_timestamp = header_info["start_date"]
+    last_timestamp = header_info["last_sample_time"]
+    num_samples = int((last_timestamp - first_timestamp).total_seconds() * header_info["frequency"])
+
+    return header_info, first_timestamp, last_timestamp, num_samples
+
+def batches(source, source_type, channels=None, dtype="float64", batch_size=3600, **options):
+    """
+    Return the header of a .gt3x file, and a generator that decodes it batch_size records (seconds) at a time.
+    """
+
+    header_info, log = gt3x_open(source)
+    records = gt3x_find_records(log)
+    decode_channels = sample_channels(channels)
+
+    def decode_batches():
+
+        activity = records[np.isin(records["type"], [gt3x_activity, gt3x_activity2])]
+
+        for batch_start in range(0, len(activity), batch_size):
+
+            timestamps, samples = gt3x_decode_records(log, activity[batch_start:batch_start+batch_size], header_info["acceleration_scale"], decode_channels, dtype)
+
+            if len(timestamps) > 0:
+                yield timestamps, None, samples, OrderedDict()
+
+    return header_info, decode_batches()
+
+def scales(header):
+    """
+    The scale_factor and scale_offset that convert the device's int16 values to g.
+    """
+
+    return OrderedDict([(axis, (1.0 / header["acceleration_scale"], 0.0)) for axis in ["X", "Y", "Z"]])
@@ -0,0 +1,18 @@
+from collections import OrderedDict
+
+from ..hdf5 import load_time_series
+
+def load(source, source_type, hdf5_mode="r", hdf5_group="Raw", **options):
+    """
+    Load a Time_Series saved in a HDF5 container by hdf5.save(). The open file is returned in the header as "hdf5_file".
+    """
+
+    import h5py
+
+    f = h5py.File(source, hdf5_mode)
+
+    header = OrderedDict()
+    header["hdf5_file"] = f
+
+    raw_group = f[hdf5_group]
+    return header, load_time_series(raw_group).channels
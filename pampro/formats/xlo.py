@@ -0,0 +1,51 @@
+import numpy as np
+from datetime import datetime, date, time, timedelta
+
+from ..data_loading import *
+
+def load(source, source_type, **options):
+    """
+    Load an XLO export of breath by breath gas analysis.
+    """
+
+    channels = []
+
+    # First 15 lines contain generic header info
+    first_lines = []
+    f = open(source, 'r')
+    for i in range(15):
+        s = f.readline().strip()
+        first_lines.append(s)
+
+    header_info = parse_header(first_lines, "XLO", "%d/%m/%Y %H:%M:%S")
+    data = np.loadtxt(f, delimiter="\t", dtype="S").astype("U")
+    f.close()
+
+    # Skip the "empty" artefacts
+    good_rows = data[:,0] == '   -    '
+    data = data[good_rows]
+
+    # Timestamps
+    start = header_info["start_datetime_python"]
+    mins = [int(t.strip().split(":")[0]) for t in data[:,2]]
+    secs = [int(t.strip().split(":")[1]) for t in data[:,2]]
+    time = [m*60+s for m,s in zip(mins,secs)]
+    timestamps = np.array([start+timedelta(seconds=m*60+s) for m,s in zip(mins,secs)])
+
+    varlist = ['T-body', 'Pmean', 'Time', 't-ph', 'RPM', 'Load', 'Speed', 'Elev.', 'VTex', 'VTin', 't-ex', 't-in', 'BF', "V'E", "V'O2", "V'CO2", 'RER', 'FIO2', 'FICO2', 'FEO2', 'FECO2', 'FETO2', 'FETCO2', 'PEO2', 'PECO2', 'PETO2', 'PETCO2', 'EqO2', 'EqCO2', 'VDe', 'VDc/VT', 'VDe/VT']
+    ignore = ['T-body', 'Pmean', 'Time', 't-ph', 'RPM', 'Load', 'Speed', 'Elev.']
+    for i,var in enumerate(varlist):
+
+        if not var in ignore:
+            chan = Channel(var)
+
+            missings = data[:, i] == '   -    '
+            data[missings,i] = 0
+
+            chan.set_contents(data[:,i].astype("float"), timestamps)
+            channels.append(chan)
+
+            if var in ["V'O2", "V'CO2"]:
+                chan.data /= header_info["weight"]
+
+    return header_info, channels
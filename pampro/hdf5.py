@@ -1,6 +1,5 @@
 from datetime import datetime, timedelta
 from collections import OrderedDict
-import h5py
 import numpy as np
 import math
 
@@ -199,6 +198,8 @@ def save_bouts_to_hdf5_group(bouts, hdf5_group):
 
 def save_bouts(bouts, output, group_name):
 
+    import h5py
+
     if type(output) is h5py._hl.files.File:
 
         f = output
@@ -218,21 +219,31 @@ def load_time_series(hdf5_group):
     """
     Given a reference to a hdf5_group, assume it is layed out according to pampro conventions and load a Time Series object from it.
     """
-    from .Channel import Channel
+    from .Channel import Channel, Regular_Timestamps
     from .Time_Series import Time_Series
 
     ts = Time_Series("")
 
-    # "timestamps" will be a single HDF5 dataset shared by the rest of the channels
-    timestamps = hdf5_group["timestamps"][:]
+    regular = hdf5_group.attrs.get("timestamp_policy") == "regular"
+
+    if regular:
+        # Regularly sampled data is timestamped by its frequency and the index and microseconds since 1970 at which each run of samples starts
+        segments = hdf5_group["segments"][:]
+        frequency = hdf5_group.attrs["frequency"]
+        start = np.datetime64(int(segments[0,1]), "us")
+        gaps = [(int(index), np.datetime64(int(microseconds), "us")) for index, microseconds in segments[1:]]
 
-    # The timestamps will be expressed in milliseconds relative to the start value
-    start = datetime.strptime(hdf5_group.attrs["start"], "%d/%m/%Y %H:%M:%S")
+    else:
+        # "timestamps" will be a single HDF5 dataset shared by the rest of the channels
+        timestamps = hdf5_group["timestamps"][:]
+
+        # The timestamps will be expressed in milliseconds relative to the start value
+        start = datetime.strptime(hdf5_group.attrs["start"], "%d/%m/%Y %H:%M:%S")
 
     # Each channel of data will be a HDF5 dataset, same length as timestamps
     for dataset_name in hdf5_group:
 
-        if dataset_name != "timestamps":
+        if dataset_name not in ["timestamps", "segments"]:
             d = hdf5_group[dataset_name]
 
             chan = Channel(dataset_name)
@@ -242,7 +253,10 @@ def load_time_series(hdf5_group):
             for attr_name, attr_value in d.attrs.items():
                 setattr(chan, attr_name, attr_value)
 
-            chan.set_contents(d[:], timestamps[:], timestamp_policy="offset")
+            if regular:
+                chan.set_contents(d[:], Regular_Timestamps(start, frequency, len(d), gaps))
+            else:
+                chan.set_contents(d[:], timestamps[:], timestamp_policy="offset")
 
             ts.add_channel(chan)
 
@@ -254,12 +268,13 @@ def timestamps_to_offsets(timestamps):
     """
 
     # Start is the first time stamp, and thus the reference point for the rest
+    timestamps = np.asarray(timestamps, dtype="datetime64[us]")
     start = timestamps[0]
 
     # Express each timestamp as number of milliseconds since "start"
-    offsets = ((timestamps - start)/timedelta(microseconds=1000)).astype("uint32")
+    offsets = ((timestamps - start)//np.timedelta64(1000, "us")).astype("uint32")
 
-    return (start,offsets)
+    return (start.astype(datetime),offsets)
 
 def interpolate_offsets(offsets, data_length):
     """
@@ -299,6 +314,8 @@ def save(ts, output_filename, groups=[("Raw", ["X", "Y", "Z"])], meta_candidates
         output_filename += ".hdf5"
         print("Adding .hdf5 extension to filename - file will be saved in " + output_filename)
 
+    import h5py
+
     f = h5py.File(output_filename, "w")
 
     # Each tuple in the variable "groups" becomes a HDF5 group inside the container
@@ -315,19 +332,30 @@ def save(ts, output_filename, groups=[("Raw", ["X", "Y", "Z"])], meta_candidates
 
         group.attrs["start"] = first_channel.time_period[0].strftime("%d/%m/%Y %H:%M:%S")
 
-        # Convert timestamps to offsets from the first timestamp - makes storing them easier as ints
-        start, offsets = timestamps_to_offsets(timestamps)
+        # Regularly sampled data only needs its frequency and the start of each run of samples, rather than an offset per sample
+        regular = first_channel.timestamp_policy == "regular"
+
+        if regular:
+
+            group.attrs["timestamp_policy"] = "regular"
+            group.attrs["frequency"] = timestamps.frequency
+            group.create_dataset("segments", data=np.column_stack((timestamps.segment_indices, timestamps.segment_starts)))
+
+        else:
 
-        # If the timestamps are sparse, expand them to 1 per observation
-        if timestamp_length < data_length:
-            offsets = interpolate_offsets(offsets, data_length)
+            # Convert timestamps to offsets from the first timestamp - makes storing them easier as ints
+            start, offsets = timestamps_to_offsets(timestamps)
 
-        # When we have page-level timestamps from a file, a timestamp points at the first observation in the page
-        # This leaves some data at the end of a file without timestamps
-        # So the data_loading function infers a final timestamp that points at the last observation
-        # This means there is 1 extra timestamp than the page level data, which we want to ignore here
-        if timestamp_length == data_length+1:
-            offsets = offsets[:-1]
+            # If the timestamps are sparse, expand them to 1 per observation
+            if timestamp_length < data_length:
+                offsets = interpolate_offsets(offsets, data_length)
+
+            # When we have page-level timestamps from a file, a timestamp points at the first observation in the page
+            # This leaves some data at the end of a file without timestamps
+            # So the data_loading function infers a final timestamp that points at the last observation
+            # This means there is 1 extra timestamp than the page level data, which we want to ignore here
+            if timestamp_length == data_length+1:
+                offsets = offsets[:-1]
 
         # Each channel's data array becomes a HDF5 dataset inside the group
         for channel_name in channels:
@@ -342,7 +370,177 @@ def save(ts, output_filename, groups=[("Raw", ["X", "Y", "Z"])], meta_candidates
                 if hasattr(channel, mc):
                     dset.attrs[mc] = getattr(channel, mc)
 
-        offsets_dset = group.create_dataset("timestamps", (data_length,), chunks=True, compression="gzip", shuffle=True, compression_opts=9, dtype="uint32")
-        offsets_dset[...] = offsets
+        if not regular:
+            offsets_dset = group.create_dataset("timestamps", (data_length,), chunks=True, compression="gzip", shuffle=True, compression_opts=9, dtype="uint32")
+            offsets_dset[...] = offsets
 
     f.close()
+
+# Number of values in each chunk of a dataset written by convert(), which is what gets compressed and read back at a time
+hdf5_chunk_size = 65536
+
+def expand_page_timestamps(batches, frequency=None):
+    """
+    Give every sample of consecutive batches of decoded data its own timestamp, in microseconds since 1970.
+    Samples timestamped at page level are spaced evenly between the start of their page and the start of the next one.
+    The last page of each batch is held back until the next batch says where it ends, and the last page of the file continues at the rate of the page before it (or frequency, if there is only 1 page).
+    Yields ("samples", timestamps, samples) for each run of complete pages, and ("pages", timestamps, pages) for the page level data of each batch.
+    """
+
+    pending_time = None
+    pending_samples = None
+    step = None
+
+    for timestamps, indices, samples, pages in batches:
+
+        times = (np.array(timestamps, dtype="datetime64[us]") - np.datetime64(0, "us")).astype(np.int64)
+
+        if len(pages) > 0:
+            yield "pages", times, pages
+
+        if indices is None:
+
+            # Every sample has its own timestamp already
+            yield "samples", times, samples
+            continue
+
+        starts = np.asarray(indices, dtype=np.int64)
+        if pending_time is not None:
+            pending_length = len(list(pending_samples.values())[0])
+            times = np.concatenate(([pending_time], times))
+            starts = np.concatenate(([0], starts + pending_length))
+            samples = OrderedDict([(name, np.concatenate((pending_samples[name], data))) for name, data in samples.items()])
+
+        # Every page but the last is complete: its samples run up to the start of the next page
+        counts = np.diff(starts)
+        if len(counts) > 0:
+
+            page = np.repeat(np.arange(len(counts)), counts)
+            steps = np.diff(times) / counts
+            sample_times = times[page] + (np.arange(starts[-1]) - starts[page]) * steps[page]
+
+            yield "samples", sample_times.astype(np.int64), OrderedDict([(name, data[:starts[-1]]) for name, data in samples.items()])
+            step = steps[-1]
+
+        pending_time = times[-1]
+        pending_samples = OrderedDict([(name, data[starts[-1]:]) for name, data in samples.items()])
+
+    if pending_time is not None:
+
+        if step is None:
+            step = 1000000.0 / frequency if frequency else 0.0
+
+        pending_length = len(list(pending_samples.values())[0])
+        yield "samples", (pending_time + np.arange(pending_length) * step).astype(np.int64), pending_samples
+
+def convert(source, output_filename, source_type="infer", groups=None, compression=4, data_type="float32", **load_kwargs):
+    """
+    Convert a raw file straight to a HDF5 container laid out like save() would write it, without ever loading the whole recording.
+    The file is decoded a batch of pages (or rows) at a time, and each batch is appended to resizable chunked datasets, so memory use does not grow with the length of the recording.
+    groups is a list of (group name, channel names) as for save(), but defaults to "Raw" holding every sample level channel, and "Pages" holding any page level channels (e.g. Light and Temperature).
+    Formats whose handler has batches() can be converted, e.g. Axivity, GeneActiv, activPAL and CSV files. load_kwargs are passed on to it, as they are by data_loading.load().
+    Returns the header of the file.
+    """
+
+    import h5py
+    from .formats import detect_source_type, get_handler
+
+    if source_type == "infer":
+        source_type = detect_source_type(source)
+
+    handler = get_handler(source_type)
+    read_batches = getattr(handler, "batches", None)
+
+    decoded = None
+    if read_batches is not None:
+        decoded = read_batches(source, source_type, **load_kwargs)
+
+    if decoded is None:
+        raise Exception("Converting is not supported for source type {}.".format(source_type))
+
+    header, batches = decoded
+
+    if not output_filename.endswith(".hdf5"):
+        output_filename += ".hdf5"
+        print("Adding .hdf5 extension to filename - file will be saved in " + output_filename)
+
+    default_groups = {"samples":"Raw", "pages":"Pages"}
+
+    # The start of each group, to the second, which its timestamps are offsets from
+    starts = {}
+
+    f = h5py.File(output_filename, "w")
+
+    try:
+
+        for level, times, data in expand_page_timestamps(batches, header.get("frequency", None)):
+
+            if groups is None:
+                level_groups = [(default_groups[level], list(data.keys()))]
+            else:
+                level_groups = [(group_name, channels) for group_name, channels in groups if all(name in data for name in channels)]
+
+            for group_name, channels in level_groups:
+
+                if len(times) == 0:
+                    continue
+
+                if group_name not in f:
+
+                    group = f.create_group(group_name)
+
+                    starts[group_name] = datetime(1970, 1, 1) + timedelta(seconds=int(times[0] // 1000000))
+                    group.attrs["start"] = starts[group_name].strftime("%d/%m/%Y %H:%M:%S")
+
+                    # Each channel's data becomes a resizable dataset, which grows as data is appended to it
+                    for channel_name in channels:
+                        dset = group.create_dataset(channel_name, (0,), maxshape=(None,), chunks=(hdf5_chunk_size,), compression="gzip", shuffle=True, compression_opts=compression, dtype=data_type)
+                        if level == "samples" and "frequency" in header:
+                            dset.attrs["frequency"] = header["frequency"]
+
+                    group.create_dataset("timestamps", (0,), maxshape=(None,), chunks=(hdf5_chunk_size,), compression="gzip", shuffle=True, compression_opts=9, dtype="uint32")
+
+                group = f[group_name]
+                written = group["timestamps"].shape[0]
+
+                for channel_name in channels:
+                    group[channel_name].resize((written + len(times),))
+                    group[channel_name][written:] = data[channel_name]
+
+                start_microseconds = (starts[group_name] - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+                group["timestamps"].resize((written + len(times),))
+                group["timestamps"][written:] = (times - start_microseconds) // 1000
+
+    finally:
+
+        f.close()
+
+    return header
+
+def convert_command(argv=None):
+    """
+    Console entry point: convert each raw file given on the command line to HDF5.
+    """
+
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Convert raw files (e.g. Axivity, GeneActiv, activPAL, CSV) to HDF5 containers, a batch of data at a time.")
+    parser.add_argument("sources", nargs="+", help="the raw files to convert")
+    parser.add_argument("--output-directory", default=None, help="where to write the HDF5 files (default: next to each source)")
+    parser.add_argument("--source-type", default="infer", help="the type of the raw files (default: inferred from each file)")
+    parser.add_argument("--data-type", default="float32", help="the type to store samples as (default: float32)")
+    parser.add_argument("--compression", default=4, type=int, help="gzip compression level 0-9 (default: 4)")
+    arguments = parser.parse_args(argv)
+
+    for source in arguments.sources:
+
+        directory = arguments.output_directory if arguments.output_directory is not None else os.path.dirname(source)
+        output_filename = os.path.join(directory, os.path.splitext(os.path.basename(source))[0] + ".hdf5")
+
+        convert(source, output_filename, arguments.source_type, compression=arguments.compression, data_type=arguments.data_type)
+        print("{} -> {}".format(source, output_filename))
+
+if __name__ == "__main__":
+    convert_command()
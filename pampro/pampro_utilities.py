@@ -1,6 +1,5 @@
 import re
 import collections
-import pandas as pd
 
 
 def design_variable_names(signal_name, stat):
@@ -153,6 +152,8 @@ def dict_write(file_location, id, dictionary):
     Append a dictionary as a row to a CSV, or create one if necessary. Indexed by the given ID.
     """
 
+    import pandas as pd
+
     dictionary = dictionary.copy()
 
     # Wrap each value in a list
@@ -1,4 +1,5 @@
 from datetime import datetime, date, time, timedelta
+import numpy as np
 
 def start_of_day(datetimestamp):
 	''' Trim the excess hours, minutes, seconds and microseconds off a datetime stamp '''
@@ -32,3 +33,31 @@ def end_of_minute(datetimestamp):
 
 def is_midnight(datetimestamp):
 	return datetimestamp.hour == 0 & datetimestamp.minute == 0 & datetimestamp.second == 0 & datetimestamp.microsecond==0
+
+def to_datetime64(timestamps):
+	''' Convert a sequence of datetimes (or datetime64 values) to a datetime64[us] array, without copying one that already is '''
+
+	timestamps = np.asarray(timestamps)
+
+	if timestamps.dtype.kind == "O" and len(timestamps) > 0 and isinstance(timestamps[0], datetime) and timestamps[0].tzinfo is None:
+		# numpy converts datetime objects one by one and slowly, so subtract them from 1970 instead
+		try:
+			return ((timestamps - datetime(1970, 1, 1)) // timedelta(microseconds=1)).astype(np.int64).astype("datetime64[us]")
+		except TypeError:
+			pass
+
+	return timestamps.astype("datetime64[us]", copy=False)
+
+def to_datetime(timestamp):
+	''' Convert a datetime64 value to a datetime, leaving datetimes as they are '''
+	if isinstance(timestamp, np.datetime64):
+		return timestamp.astype("datetime64[us]").astype(datetime)
+	return timestamp
+
+def to_microseconds(timestamp):
+	''' Integer microseconds since 1970 of a datetime or datetime64 value '''
+	return int(np.datetime64(timestamp, "us").astype(np.int64))
+
+def timedelta_to_microseconds(delta):
+	''' Integer microseconds of a timedelta, which is exact because timedeltas have microsecond resolution '''
+	return delta // timedelta(microseconds=1)
@@ -3,11 +3,12 @@ from setuptools import setup
 
 setup(
     name = "pampro",
-    packages = ["pampro"],
+    packages = ["pampro", "pampro.formats"],
     version = "0.4",
     author = "Tom White",
     author_email = "thomite@gmail.com",
     description = ("physical activity monitor processing"),
     url = "https://github.com/Thomite/pampro",
-    install_requires = ['numpy', 'scipy', 'matplotlib', 'h5py']
+    install_requires = ['numpy', 'scipy', 'matplotlib', 'h5py'],
+    entry_points = {"console_scripts": ["pampro-hdf5 = pampro.hdf5:convert_command"]}
 )
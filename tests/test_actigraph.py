@@ -0,0 +1,62 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2014, 6, 2, 9, 30, 0)
+directory = tempfile.mkdtemp()
+filename = os.path.join(directory, "counts.dat")
+
+def write_dat(mode, values):
+    """ An Actigraph .dat file of 15 second epochs in the given mode, with the values written 10 to a line. """
+
+    lines = ["-" * 34, "SN:10356 Ver 1.1", "Start Time " + start.strftime("%H:%M:%S"), "Start Date " + start.strftime("%d-%m-%Y"),
+             "Epoch Period (hh:mm:ss) 00:00:15", "Download Time 16:11:23", "Download Date " + start.strftime("%d-%m-%Y"),
+             "Current Memory Address:  9131", "Current Battery Voltage: 4.22     Mode = {}".format(mode), "-" * 34]
+    lines += [" ".join(str(v) for v in values[i:i+10]) for i in range(0, len(values), 10)]
+
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n\n")
+
+def load_counts(mode, values):
+
+    write_dat(mode, values)
+    ts, header = data_loading.load(filename, "Actigraph", datetime_format="%d/%m/%Y")
+    os.remove(filename)
+
+    assert(header["mode"] == mode)
+    assert(header["start_datetime"] == start)
+    return ts["AG_Counts"]
+
+def test_mode_0():
+
+    # Every value is a count, and negative counts are made positive
+    values = list(range(-12, 13))
+    counts = load_counts(0, values)
+
+    assert(np.array_equal(counts.data, np.abs(values)))
+    assert(np.array_equal(counts.timestamps, np.datetime64(start, "us") + np.arange(len(values)) * np.timedelta64(15, "s")))
+
+def test_mode_1():
+
+    # Values alternate count, steps, so the counts are the first column of each pair
+    pairs = np.array([[100 + i, i % 3] for i in range(12)])
+    counts = load_counts(1, list(pairs.ravel()))
+    assert(np.array_equal(counts.data, pairs[:,0]))
+
+    # A count without its steps is an incomplete epoch, so it's left off
+    counts = load_counts(1, list(pairs.ravel()) + [999])
+    assert(np.array_equal(counts.data, pairs[:,0]))
+    assert(counts.timestamps[-1] == np.datetime64(start + timedelta(seconds=15*11), "us"))
+
+def test_mode_5():
+
+    # Values are count X, count Y, count Z, and only X is kept
+    triples = np.array([[200 + i, -i, 2*i] for i in range(11)])
+    counts = load_counts(5, list(triples.ravel()))
+    assert(np.array_equal(counts.data, triples[:,0]))
+
+    for trailing in [[999], [999, 998]]:
+        counts = load_counts(5, list(triples.ravel()) + trailing)
+        assert(np.array_equal(counts.data, triples[:,0]))
@@ -0,0 +1,54 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2016, 5, 1, 10, 0, 0)
+directory = tempfile.mkdtemp()
+filename = os.path.join(directory, "test.datx")
+
+def setup_func():
+
+    # 20 Hz, recording for 1 minute
+    header = bytearray(1024)
+    header[35] = 20
+    header[256:262] = bytes([10, 0, 0, 1, 5, 16])
+    header[262:268] = bytes([10, 1, 0, 1, 5, 16])
+
+    records = [
+        bytes([128, 192, 64]),
+        bytes([0, 0, 2]),   # Repeat the previous record 3 times
+        b"tai",             # Coincidentally spells TAI, so the next record is taken literally
+        bytes([0, 0, 7]),
+        bytes([0, 0, 1]),   # Repeats TAI, the last record read
+        b"tai", b"l\x00\x00", bytes([1, 2, 3])
+    ]
+
+    with open(filename, "wb") as f:
+        f.write(bytes(header) + b"".join(records))
+
+def teardown_func():
+
+    os.remove(filename)
+
+def test_records():
+
+    ts, header = data_loading.load(filename, "activPAL")
+
+    assert(header["num_records"] == 1200)
+
+    # Decoding stops at the TAIL footer
+    expected = [[128, 192, 64]]*4 + [[116, 97, 105], [0, 0, 7]] + [[116, 97, 105]]*2
+    expected = (np.array(expected, dtype=np.float64) - 128.0) / 64.0
+
+    assert(np.array_equal(ts["X"].data, expected[:,0]))
+    assert(np.array_equal(ts["Y"].data, expected[:,1]))
+    assert(np.array_equal(ts["Z"].data, expected[:,2]))
+
+    # Samples are regularly spaced from the start of the recording
+    assert(list(ts["X"].timestamps) == [start + timedelta(seconds=0.05)*i for i in range(8)])
+
+
+test_records.setup = setup_func
+test_records.teardown = teardown_func
@@ -0,0 +1,332 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+from struct import pack
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2015, 3, 1, 12, 0, 0)
+directory = tempfile.mkdtemp()
+filename_unpacked = os.path.join(directory, "unpacked.cwa")
+filename_packed = os.path.join(directory, "packed.cwa")
+
+# Sample rate code 0x4A = 100 Hz
+rate_code = 0x4A
+
+def cwa_timestamp(t):
+    return ((t.year-2000) << 26) | (t.month << 22) | (t.day << 17) | (t.hour << 12) | (t.minute << 6) | t.second
+
+def metadata_block():
+    """ A 1024 byte "MD" block with an empty annotation. """
+
+    block = b"MD" + pack("<HBHIH", 1020, 0, 1234, 42, 0) + pack("<IIIBBHHB", 0, 0, 0, 0, 0, 0, 0, 0)
+    block += pack("<IBIB", 0, rate_code, 0, 1) + b"\x00"*22 + b"\xff"*960
+    return block
+
+def data_block(sequence_id, timestamp, payload, sample_count, packed):
+    """ A 512 byte "AX" block, with the first sample at timestamp. """
+
+    # Express the fractional part of the timestamp in the top-bit-set deviceId field
+    fraction = int(timestamp.microsecond / 1000000.0 * 65536) & 0xfffe
+    device_fractional = 0x8000 | (fraction >> 1)
+    timestamp_offset = -((fraction * 100) // 65536)
+
+    num_axes_bps = 0x30 if packed else 0x32
+    block = b"AX" + pack("<HHIIIHHcBBBhH", 508, device_fractional, 42, sequence_id, cwa_timestamp(timestamp), 10, 300, b"\x00", 200, rate_code, num_axes_bps, timestamp_offset, sample_count)
+    block += payload.ljust(480, b"\x00")
+    checksum = (-int(np.frombuffer(block, dtype="<u2").sum())) & 0xffff
+    return block + pack("<H", checksum)
+
+unpacked_samples = np.arange(-1200, 1200).reshape(-1, 3)
+packed_words = np.random.RandomState(1).randint(0, 2**32, size=120*10, dtype=np.uint64).astype(np.uint32)
+
+def setup_func():
+
+    with open(filename_unpacked, "wb") as f:
+        f.write(metadata_block())
+        for i in range(10):
+            payload = unpacked_samples[i*80:(i+1)*80].astype("<i2").tobytes()
+            f.write(data_block(i, start + timedelta(seconds=0.8*i), payload, 80, False))
+
+    with open(filename_packed, "wb") as f:
+        f.write(metadata_block())
+        for i in range(10):
+            payload = packed_words[i*120:(i+1)*120].astype("<u4").tobytes()
+            f.write(data_block(i, start + timedelta(seconds=1.2*i), payload, 120, True))
+
+def teardown_func():
+
+    os.remove(filename_unpacked)
+    os.remove(filename_packed)
+
+def test_unpacked():
+
+    ts, header = data_loading.load(filename_unpacked, "Axivity")
+
+    # 10 blocks of 80 samples each
+    assert(header["num_pages"] == 10)
+    assert(header["num_samples"] == 800)
+    assert(header["frequency"] == 100)
+
+    # Samples are signed 16 bit values in units of 1/256 g
+    assert(np.array_equal(ts["X"].data, unpacked_samples[:,0]/256.0))
+    assert(np.array_equal(ts["Y"].data, unpacked_samples[:,1]/256.0))
+    assert(np.array_equal(ts["Z"].data, unpacked_samples[:,2]/256.0))
+
+    # Each block is timestamped at its first sample
+    assert(np.array_equal(ts["X"].indices, np.arange(0, 800, 80)))
+    for i,t in enumerate(ts["X"].timestamps):
+        assert(abs(t - (start + timedelta(seconds=0.8*i))) < timedelta(milliseconds=1))
+
+    assert(np.array_equal(ts["Light"].data, np.ones(10)*10))
+    assert(np.array_equal(ts["Temperature"].data, np.ones(10)*300))
+
+def test_packed():
+
+    ts, header = data_loading.load(filename_packed, "Axivity")
+
+    assert(header["num_pages"] == 10)
+    assert(header["num_samples"] == 1200)
+
+    # The bulk decoder should agree exactly with decoding each sample individually
+    for i,word in enumerate(packed_words.tolist()):
+
+        exponent = (6 - data_loading.byte(word >> 30))
+        x = data_loading.short(data_loading.short((data_loading.ushort(65472) & data_loading.ushort(word << 6))) >> exponent) / 256.0
+        y = data_loading.short(data_loading.short((data_loading.ushort(65472) & data_loading.ushort(word >> 4))) >> exponent) / 256.0
+        z = data_loading.short(data_loading.short((data_loading.ushort(65472) & data_loading.ushort(word >> 14))) >> exponent) / 256.0
+
+        assert(ts["X"].data[i] == x)
+        assert(ts["Y"].data[i] == y)
+        assert(ts["Z"].data[i] == z)
+
+def test_stream():
+
+    ts, header = data_loading.load(filename_unpacked, "Axivity")
+    chunks = list(data_loading.stream(filename_unpacked, "Axivity", chunk=timedelta(seconds=2)))
+
+    # Blocks are 0.8 seconds apart, so 8 seconds of data falls into 4 chunks
+    assert(len(chunks) == 4)
+
+    for chunk_ts, chunk_header in chunks:
+        assert(chunk_header["chunk_end"] - chunk_header["chunk_start"] == timedelta(seconds=2))
+        for t in chunk_ts["X"].timestamps:
+            assert(chunk_header["chunk_start"] <= t < chunk_header["chunk_end"])
+
+    # Without overlap, the chunks put back together are identical to loading the whole file
+    for name in ["X", "Y", "Z", "Light", "Temperature"]:
+        assert(np.array_equal(np.concatenate([c[name].data for c,h in chunks]), ts[name].data))
+
+    assert(np.array_equal(np.concatenate([c["X"].timestamps for c,h in chunks]), ts["X"].timestamps))
+
+    # With overlap, each chunk also includes data either side of it
+    overlapped = list(data_loading.stream(filename_unpacked, "Axivity", chunk=timedelta(seconds=2), overlap=timedelta(seconds=1)))
+    assert(len(overlapped[1][0]["X"].data) > len(chunks[1][0]["X"].data))
+
+def test_parallel():
+
+    for filename in [filename_unpacked, filename_packed]:
+
+        ts, header = data_loading.load(filename, "Axivity")
+        ts_parallel, header_parallel = data_loading.load(filename, "Axivity", workers=3)
+
+        # Splitting the blocks across workers should make no difference to the result
+        for name in ["X", "Y", "Z", "Light", "Temperature"]:
+            assert(np.array_equal(ts[name].data, ts_parallel[name].data))
+            assert(np.array_equal(ts[name].timestamps, ts_parallel[name].timestamps))
+
+        assert(np.array_equal(ts["X"].indices, ts_parallel["X"].indices))
+        assert(header["num_samples"] == header_parallel["num_samples"])
+
+def test_probe():
+
+    for filename in [filename_unpacked, filename_packed]:
+
+        ts, header = data_loading.load(filename, "Axivity")
+        empty, probed = data_loading.load(filename, "Axivity", header_only=True)
+
+        # Reading only the first and last blocks should describe the file the same way
+        assert(empty.number_of_channels == 0)
+        for key in ["frequency", "device", "num_pages", "num_samples", "approximate_frequency", "generic_first_timestamp", "generic_last_timestamp", "generic_num_samples"]:
+            assert(probed[key] == header[key])
+
+def test_time_period():
+
+    ts, header = data_loading.load(filename_unpacked, "Axivity")
+    ts_period, header_period = data_loading.load(filename_unpacked, "Axivity", time_period=(start + timedelta(seconds=2.5), start + timedelta(seconds=4.5)))
+
+    # Blocks start every 0.8 seconds, so the blocks starting at 2.4, 3.2 and 4.0 seconds cover the period
+    assert(header_period["num_pages"] == 3)
+    assert(np.array_equal(ts_period["X"].timestamps, ts["X"].timestamps[3:6]))
+    assert(np.array_equal(ts_period["X"].data, ts["X"].data[240:480]))
+    assert(np.array_equal(ts_period["X"].indices, np.arange(0, 240, 80)))
+
+    # The period doesn't include its end, so a block starting exactly then isn't decoded, with or without an index
+    for index in [False, os.path.join(directory, "unpacked.index.hdf5")]:
+        ts_period, header_period = data_loading.load(filename_unpacked, "Axivity", time_period=(start + timedelta(seconds=2.5), ts["X"].timestamps[6]), index=index)
+        assert(header_period["num_pages"] == 3)
+
+    os.remove(os.path.join(directory, "unpacked.index.hdf5"))
+
+def test_index():
+
+    filename_index = os.path.join(directory, "unpacked.index.hdf5")
+
+    ts, header = data_loading.load(filename_unpacked, "Axivity")
+
+    # The first load writes the index, the second reuses it, and both match a load without it
+    for i in range(2):
+
+        ts_indexed, header_indexed = data_loading.load(filename_unpacked, "Axivity", index=filename_index)
+        assert(os.path.isfile(filename_index))
+
+        for name in ["X", "Y", "Z", "Light", "Temperature"]:
+            assert(np.array_equal(ts[name].data, ts_indexed[name].data))
+            assert(np.array_equal(ts[name].timestamps, ts_indexed[name].timestamps))
+
+    page_index = data_loading.read_page_index(filename_index, filename_unpacked, "Axivity")
+    assert(np.array_equal(page_index["offset"], 1024 + np.arange(10)*512))
+    assert(np.array_equal(page_index["first_sample"], np.arange(0, 800, 80)))
+    assert(np.array_equal(page_index["sequence_id"], np.arange(10)))
+    assert((page_index["status"] == data_loading.page_ok).all())
+    assert(page_index["checksum_ok"].all())
+
+    # Corrupting a block is noticed by its checksum, and the stale index is rebuilt
+    with open(filename_unpacked, "r+b") as f:
+        f.seek(1024 + 3*512 + 100)
+        f.write(b"\x01")
+
+    data_loading.load(filename_unpacked, "Axivity", index=filename_index)
+    page_index = data_loading.read_page_index(filename_index, filename_unpacked, "Axivity")
+    assert(list(np.flatnonzero(~page_index["checksum_ok"])) == [3])
+
+    os.remove(filename_index)
+
+def test_channels():
+
+    ts, header = data_loading.load(filename_packed, "Axivity")
+
+    # Only the requested channels are loaded, in the requested precision
+    ts_subset, header_subset = data_loading.load(filename_packed, "Axivity", channels=["X", "Z"], dtype="float32")
+    assert([c.name for c in ts_subset.channels] == ["X", "Z"])
+    assert(header_subset["num_samples"] == header["num_samples"])
+
+    for name in ["X", "Z"]:
+        assert(ts_subset[name].data.dtype == np.float32)
+        assert(np.array_equal(ts_subset[name].data, ts[name].data.astype(np.float32)))
+
+    # Native values are the device's int16, with the scale to convert them to g
+    ts_native, header_native = data_loading.load(filename_packed, "Axivity", dtype="native")
+    for name in ["X", "Y", "Z"]:
+        assert(ts_native[name].data.dtype == np.int16)
+        assert(np.array_equal(ts_native[name].data * ts_native[name].scale_factor + ts_native[name].scale_offset, ts[name].data))
+
+
+def test_block_timestamps():
+
+    from pampro.formats import axivity
+
+    # Packed timestamps are converted in bulk exactly as one at a time, including those that aren't real dates
+    stamps = np.random.RandomState(3).randint(0, 2**32, size=5000, dtype=np.uint64).astype(np.uint32)
+    stamps[:3] = [cwa_timestamp(datetime(2016, 2, 29, 23, 59, 59)), cwa_timestamp(datetime(2015, 2, 28)), cwa_timestamp(datetime(2015, 2, 28)) + (1 << 17)]
+
+    converted = axivity.axivity_read_timestamps(stamps)
+    expected = [axivity.axivity_read_timestamp_raw(int(t)) for t in stamps]
+    assert(all((np.isnat(c) and e is None) or c.astype(datetime) == e for c, e in zip(converted, expected)))
+
+    # Interpolating the blocks of a file in pieces, carrying the state over, gives the same timestamps as all at once
+    file_header, blocks = axivity.axivity_read_blocks(open(filename_packed, "rb").read())
+    headers = axivity.axivity_block_headers(blocks, np.arange(len(blocks)))
+
+    whole, state = axivity.axivity_block_timestamps(headers)
+    first, state = axivity.axivity_block_timestamps(headers[:4])
+    second, state = axivity.axivity_block_timestamps(headers[4:], state)
+
+    assert(whole.dtype == np.dtype("datetime64[us]"))
+    assert(np.array_equal(whole, np.concatenate((first, second))))
+
+
+def test_corrupt():
+
+    with open(filename_unpacked, "rb") as f:
+        contents = bytearray(f.read())
+
+    # Flip a bit in the samples of block 3, and cut the file off part way through the last block
+    contents[1024 + 512*3 + 100] ^= 1
+    filename_corrupt = os.path.join(directory, "corrupt.cwa")
+    with open(filename_corrupt, "wb") as f:
+        f.write(contents[:-10])
+
+    ts, header = data_loading.load(filename_corrupt, "Axivity")
+    os.remove(filename_corrupt)
+
+    # Both blocks are skipped, and reported
+    assert(header["dropped_blocks"]["checksum"] == 1)
+    assert(header["dropped_blocks"]["unusable"] == 1)
+    assert(header["num_pages"] == 8)
+    assert(np.array_equal(ts["X"].data, np.concatenate((unpacked_samples[:240,0], unpacked_samples[320:720,0]))/256.0))
+
+    # Which leaves a gap between the end of block 2 and the start of block 4
+    assert(len(header["gaps"]) == 1)
+    gap_start, gap_end = header["gaps"][0]
+    assert(abs(gap_start - (start + timedelta(seconds=2.4))) < timedelta(milliseconds=1))
+    assert(abs(gap_end - (start + timedelta(seconds=3.2))) < timedelta(milliseconds=1))
+
+
+def test_epochs():
+
+    from pampro import channel_inference
+
+    # Summarising while decoding should give what summarising the loaded channels does
+    ts, header = data_loading.load(filename_unpacked, "Axivity")
+    vm = channel_inference.infer_vector_magnitude(ts["X"], ts["Y"], ts["Z"])
+
+    # Blocks of 80 samples start every 0.8 seconds, so the samples between them are placed by counting back from the next block at 100 Hz
+    for epoch in [timedelta(seconds=0.3), timedelta(seconds=1)]:
+
+        expected = {}
+        for channel in [channel_inference.infer_enmo(vm), vm, ts["X"]]:
+            summary = channel.piecewise_statistics(epoch, [("generic", ["mean"])])
+            expected[summary.channels[0].name] = summary.channels[0]
+
+        header, batches = data_loading.get_handler("Axivity").batches(filename_unpacked, "Axivity", batch_size=3)
+        epochs = data_loading.summarise_epochs(batches, epoch, ["enmo", "vm", "x_mean"], header["frequency"])
+
+        for channel in epochs.channels:
+            assert(list(channel.timestamps) == list(expected[channel.name].timestamps))
+            assert(np.allclose(channel.data, expected[channel.name].data, rtol=0, atol=1e-9))
+
+    epochs, epochs_header = data_loading.load(filename_unpacked, "Axivity", epoch=timedelta(seconds=1), features=["enmo", "vm", "x_mean"])
+    for channel in epochs.channels:
+        assert(np.allclose(channel.data, expected[channel.name].data, rtol=0, atol=1e-9))
+
+    # The last block starts 7.2 seconds in, so the samples after it all fall in the 8th second, and there's no data after that
+    last = (start - datetime(2015, 3, 1)).seconds + 7
+    first_sample, end_sample = ts["X"].get_window(start + timedelta(seconds=7), start + timedelta(seconds=8))
+    assert(end_sample == 800)
+    assert(np.isclose(epochs["X_mean"].data[last], np.mean(ts["X"].data[first_sample:]), rtol=0, atol=1e-9))
+    assert(epochs["X_mean"].data[last+1] == -1)
+
+
+test_unpacked.setup = setup_func
+test_unpacked.teardown = teardown_func
+test_packed.setup = setup_func
+test_packed.teardown = teardown_func
+test_stream.setup = setup_func
+test_stream.teardown = teardown_func
+test_parallel.setup = setup_func
+test_parallel.teardown = teardown_func
+test_probe.setup = setup_func
+test_probe.teardown = teardown_func
+test_time_period.setup = setup_func
+test_time_period.teardown = teardown_func
+test_index.setup = setup_func
+test_index.teardown = teardown_func
+test_channels.setup = setup_func
+test_channels.teardown = teardown_func
+test_block_timestamps.setup = setup_func
+test_block_timestamps.teardown = teardown_func
+test_corrupt.setup = setup_func
+test_corrupt.teardown = teardown_func
+test_epochs.setup = setup_func
+test_epochs.teardown = teardown_func
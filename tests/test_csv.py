@@ -0,0 +1,23 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+
+def test_parse_datetimes():
+
+    start = datetime(2016, 2, 28, 23, 59, 58, 250000)
+    timestamps = [start + timedelta(seconds=0.75*i) for i in range(100)]
+
+    for datetime_format in ["%d/%m/%Y %H:%M:%S:%f", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%d-%b-%Y %H:%M"]:
+
+        column = [t.strftime(datetime_format) for t in timestamps]
+
+        # Fixed width formats are parsed in bulk, the rest individually, but both should agree with strptime
+        parsed = data_loading.parse_datetimes(column, datetime_format).astype(datetime)
+        assert(list(parsed) == [datetime.strptime(t, datetime_format) for t in column])
+
+    # Invalid timestamps are reported like strptime would
+    try:
+        data_loading.parse_datetimes(["30/02/2016"], "%d/%m/%Y")
+        assert(False)
+    except ValueError:
+        pass
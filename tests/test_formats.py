@@ -0,0 +1,120 @@
+from pampro import data_loading, formats, Channel
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import numpy as np
+import tempfile
+import types
+import os
+
+directory = tempfile.mkdtemp()
+
+def write_file(name, content):
+
+    filename = os.path.join(directory, name)
+    with open(filename, "wb") as f:
+        f.write(content)
+    return filename
+
+def teardown_func():
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+    formats.formats.pop("Example", None)
+
+def test_detect():
+
+    # Known extensions are enough on their own, in any case
+    assert(data_loading.infer_source_type("missing.CWA") == "Axivity")
+    assert(data_loading.infer_source_type("missing.csv") == "CSV")
+
+    # A file that starts like a different format than its extension suggests is taken to be that format
+    cwa_as_bin = write_file("renamed.bin", b"MD" + bytes(1022))
+    assert(data_loading.infer_source_type(cwa_as_bin) == "Axivity")
+
+    # But a format without magic bytes is never second guessed
+    csv = write_file("columns.csv", b"MD,X\n")
+    assert(data_loading.infer_source_type(csv) == "CSV")
+
+    # And magic bytes identify files with an unknown extension
+    hdf5 = write_file("container.unknown", b"\x89HDF\r\n\x1a\n" + bytes(8))
+    assert(data_loading.infer_source_type(hdf5) == "HDF5")
+
+    try:
+        data_loading.infer_source_type(write_file("mystery.xyz", b"?"))
+        assert(False)
+    except Exception as e:
+        assert("xyz" in str(e))
+
+def test_register():
+
+    start = datetime(2016, 1, 1)
+
+    def load(source, source_type, **options):
+
+        with open(source) as f:
+            values = np.array(f.read().split(), dtype=np.float64)
+
+        channel = Channel.Channel("Steps")
+        channel.set_contents(values, np.array([start + timedelta(minutes=i) for i in range(len(values))]))
+        return OrderedDict([("device", "pedometer")]), [channel]
+
+    formats.register_format("Example", types.SimpleNamespace(load=load), extensions=["steps"], magic=b"STEPS")
+
+    # A registered format is inferred and loaded like the built in ones
+    filename = write_file("walk.steps", b"3 5 8")
+    ts, header = data_loading.load(filename)
+
+    assert(header["device"] == "pedometer")
+    assert(header["generic_num_samples"] == 3)
+    assert(np.array_equal(ts["Steps"].data, [3, 5, 8]))
+
+    # It has no batches(), so can't be streamed
+    try:
+        list(data_loading.stream(filename))
+        assert(False)
+    except Exception as e:
+        assert("Streaming is not supported" in str(e))
+
+    # A probe() that returns None can't describe the file without loading it, so it is loaded instead
+    formats.register_format("Example", types.SimpleNamespace(load=load, probe=lambda source, source_type, **options: None), extensions=["steps"])
+    assert(data_loading.probe(filename)["generic_num_samples"] == 3)
+
+def test_lazy():
+
+    # Built in handlers are registered by name, and only imported when first needed
+    assert(isinstance(formats.formats["XLO"]["handler"], str) or isinstance(formats.formats["XLO"]["handler"], types.ModuleType))
+    assert(formats.get_handler("XLO").__name__ == "pampro.formats.xlo")
+    assert(isinstance(formats.formats["XLO"]["handler"], types.ModuleType))
+
+    # Functions that moved into the format modules can still be found in data_loading
+    assert(data_loading.geneactiv_decode_hex is formats.get_handler("GeneActiv").geneactiv_decode_hex)
+
+def test_load_many():
+
+    start = datetime(2016, 1, 1)
+    rows = "".join("{},{}\n".format((start + timedelta(seconds=i)).strftime("%d/%m/%Y %H:%M:%S:%f"), i) for i in range(100))
+
+    filenames = [write_file("participant{}.csv".format(i), ("time,X\n" + rows).encode()) for i in range(5)]
+    broken = write_file("broken.csv", b"time,X\nyesterday,1\n")
+
+    for workers in [1, 2]:
+
+        results = list(data_loading.load_many(filenames[:2] + [broken] + filenames[2:], workers=workers, max_pending=3))
+
+        # Every file is accounted for, in whatever order they finished
+        assert(sorted(source for source, ts, header in results) == sorted(filenames + [broken]))
+
+        for source, ts, header in results:
+
+            # The broken file is reported rather than stopping the others
+            if source == broken:
+                assert(ts is None and isinstance(header, ValueError))
+            else:
+                assert(np.array_equal(ts["X"].data, np.arange(100)))
+                assert(header["generic_num_samples"] == 100)
+
+
+test_detect.teardown = teardown_func
+test_register.teardown = teardown_func
+test_load_many.teardown = teardown_func
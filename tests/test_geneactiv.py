@@ -0,0 +1,230 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2015, 3, 4, 10, 0, 0)
+directory = tempfile.mkdtemp()
+filename_bin = os.path.join(directory, "recording.bin")
+
+# 10 pages of 300 samples at 100 Hz, so a page starts every 3 seconds
+num_pages = 10
+calibration = [("x", 25548, -1520), ("y", 25629, 2520), ("z", 25302, -1080)]
+raw_samples = np.random.RandomState(1).randint(-2048, 2048, size=(num_pages*300, 3))
+
+def bin_header():
+    """ The 59 line header of a GeneActiv .bin file, with the lines parse_header() reads filled in. """
+
+    lines = ["Device Identity", "Device Unique Serial Code:012345", "Device Type:GENEActiv", "Device Model:1.1", "Device Firmware:Ver06.17 15June2015", "Calibration Date:2015-01-01 00:00:00:000"]
+    lines += [""] * (19 - len(lines)) + ["Measurement Frequency:100 Hz", "Measurement Period:168 Hours", "Start Time:" + start.strftime("%Y-%m-%d %H:%M:%S") + ":000"]
+    lines += [""] * (47 - len(lines))
+    for axis, gain, offset in calibration:
+        lines += ["{} gain:{}".format(axis, gain), "{} offset:{}".format(axis, offset)]
+    lines += [""] * (57 - len(lines)) + ["Number of Pages:{}".format(num_pages), ""]
+    return lines
+
+def bin_page(sequence_number, page_time, samples):
+    """ A page of a GeneActiv .bin file: 9 lines describing it, then 12 hexadecimal digits per sample. """
+
+    lines = ["Recorded Data", "Device Unique Serial Code:012345", "Sequence Number:{}".format(sequence_number), "Page Time:" + page_time.strftime("%Y-%m-%d %H:%M:%S") + ":000",
+             "Unassigned:", "Temperature:21.5", "Battery voltage:4.05", "Device Status:Recording", "Measurement Frequency:100.0"]
+    hexadecimal = "".join("{:03X}{:03X}{:03X}000".format(*(samples[i] & 0xfff)) for i in range(len(samples)))
+    return "\r\n".join(lines + [hexadecimal]) + "\r\n"
+
+def setup_func():
+
+    with open(filename_bin, "wb") as f:
+        f.write(("\r\n".join(bin_header()) + "\r\n").encode())
+        for i in range(num_pages):
+            f.write(bin_page(i, start + timedelta(seconds=3*i), raw_samples[i*300:(i+1)*300]).encode())
+
+def teardown_func():
+
+    os.remove(filename_bin)
+    if os.path.isfile(filename_bin + ".index.hdf5"):
+        os.remove(filename_bin + ".index.hdf5")
+
+def test_decode_hex():
+
+    # Every possible 12 bit value, as X, Y and Z of each sample, followed by 3 ignored digits
+    values = np.arange(4096)
+    text = "".join("{0:03X}{0:03X}{0:03x}FFF".format(v) for v in values)
+
+    decoded = data_loading.geneactiv_decode_hex(np.frombuffer(text.encode(), dtype=np.uint8))
+
+    # The bulk decoder should agree with decoding each value individually, in upper or lower case
+    expected = [data_loading.twos_comp(v, 12) for v in values]
+    for axis in range(3):
+        assert(np.array_equal(decoded[axis], expected))
+
+def test_csv_channels():
+
+    start = datetime(2015, 3, 4, 10, 0, 0)
+    filename = os.path.join(tempfile.mkdtemp(), "export.csv")
+
+    with open(filename, "w") as f:
+        f.write("Header\n" * 80)
+        for i in range(100):
+            t = start + timedelta(milliseconds=10*i)
+            f.write("{}:{:03d},{},{},{},{},0,{}\n".format(t.strftime("%Y-%m-%d %H:%M:%S"), t.microsecond // 1000, i/100, -i/100, 1.0, i, 25.5))
+
+    ts, header = data_loading.load(filename, "GeneActiv_CSV", channels=["GA_Y", "GA_Lux"], dtype="float32")
+    os.remove(filename)
+
+    # Only the requested columns are read, with the axes stored as dtype and the rest as their own types
+    assert([c.name for c in ts.channels] == ["GA_Y", "GA_Lux"])
+    assert(ts["GA_Y"].data.dtype == np.float32 and ts["GA_Lux"].data.dtype == np.int32)
+    assert(np.allclose(ts["GA_Y"].data, -np.arange(100) / 100))
+    assert(np.array_equal(ts["GA_Lux"].timestamps, np.datetime64(start, "us") + np.arange(100) * np.timedelta64(10000, "us")))
+
+def test_time_period():
+
+    ts, header = data_loading.load(filename_bin, "GeneActiv")
+
+    # Pages start every 3 seconds and are timestamped every second, so each page has 3 timestamps and 300 samples
+    # A period runs from the page containing its start up to the last page starting before its end, even beyond the ends of the file
+    periods = [((4.5, 10), 1, 4), ((4.5, 12), 1, 4), ((3, 12.001), 1, 5), ((-3600, 5), 0, 2), ((25, 3600), 8, 10)]
+
+    for index in [False, True]:
+        for (period_start, period_end), first, last in periods:
+
+            time_period = (start + timedelta(seconds=period_start), start + timedelta(seconds=period_end))
+            ts_period, header_period = data_loading.load(filename_bin, "GeneActiv", time_period=time_period, index=index)
+
+            assert(np.array_equal(ts_period["X"].data, ts["X"].data[first*300:last*300]))
+            assert(np.array_equal(ts_period["X"].timestamps, ts["X"].timestamps[first*3:last*3+1]))
+            assert(np.array_equal(ts_period["X"].indices, ts["X"].indices[first*3:last*3+1] - first*300))
+
+def test_parallel():
+
+    ts, header = data_loading.load(filename_bin, "GeneActiv")
+
+    # Splitting the pages across workers should make no difference to the result, whether or not an index says where they start
+    for index in [False, True]:
+
+        ts_parallel, header_parallel = data_loading.load(filename_bin, "GeneActiv", workers=3, index=index)
+
+        for name in ["X", "Y", "Z"]:
+            assert(np.array_equal(ts[name].data, ts_parallel[name].data))
+            assert(np.array_equal(ts[name].timestamps, ts_parallel[name].timestamps))
+
+        assert(np.array_equal(ts["X"].indices, ts_parallel["X"].indices))
+
+def test_index():
+
+    filename_index = filename_bin + ".index.hdf5"
+    time_period = (start + timedelta(seconds=10), start + timedelta(seconds=20))
+
+    # The index is only needed to find a time period or split the pages between workers, so a plain load doesn't build it
+    ts, header = data_loading.load(filename_bin, "GeneActiv", index=True)
+    assert(not os.path.isfile(filename_index))
+
+    ts_period, header_period = data_loading.load(filename_bin, "GeneActiv", time_period=time_period)
+
+    # The first load writes the index, the second reuses it without writing it again, and both match a load without it
+    for i in range(2):
+
+        ts_indexed, header_indexed = data_loading.load(filename_bin, "GeneActiv", time_period=time_period, index=True)
+        assert(os.path.isfile(filename_index))
+
+        if i == 0:
+            written = os.stat(filename_index).st_mtime_ns
+        assert(os.stat(filename_index).st_mtime_ns == written)
+
+        for name in ["X", "Y", "Z"]:
+            assert(np.array_equal(ts_period[name].data, ts_indexed[name].data))
+            assert(np.array_equal(ts_period[name].timestamps, ts_indexed[name].timestamps))
+
+    with open(filename_bin, "rb") as f:
+        contents = f.read()
+
+    page_index = data_loading.read_page_index(filename_index, filename_bin, "GeneActiv")
+    assert(list(page_index["offset"]) == [i for i in range(len(contents)) if contents.startswith(b"Recorded Data", i)])
+    assert(np.array_equal(page_index["first_sample"], np.arange(0, num_pages*300, 300)))
+    assert(np.array_equal(page_index["sequence_id"], np.arange(num_pages)))
+    assert(np.array_equal(page_index["timestamp"], data_loading.datetimes_to_microseconds([start + timedelta(seconds=3*i) for i in range(num_pages)])))
+    assert((page_index["status"] == data_loading.page_ok).all())
+
+    # Changing the file makes the index stale, so it is rebuilt
+    with open(filename_bin, "r+b") as f:
+        f.seek(contents.index(b"Sequence Number:5"))
+        f.write(b"Sequence Number:7")
+    stat = os.stat(filename_bin)
+    os.utime(filename_bin, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    data_loading.load(filename_bin, "GeneActiv", time_period=time_period, index=True)
+    page_index = data_loading.read_page_index(filename_index, filename_bin, "GeneActiv")
+    assert(list(page_index["sequence_id"]) == [0, 1, 2, 3, 4, 7, 6, 7, 8, 9])
+
+def test_probe():
+
+    ts, header = data_loading.load(filename_bin, "GeneActiv")
+    empty, probed = data_loading.load(filename_bin, "GeneActiv", header_only=True)
+
+    # Reading only the header and the first and last pages should describe the file the same way
+    assert(empty.number_of_channels == 0)
+    for key in ["frequency", "number_pages", "generic_first_timestamp", "generic_last_timestamp", "generic_num_samples"]:
+        assert(probed[key] == header[key])
+
+    # The data runs from the first page time to the end of the last page
+    assert(ts["X"].timeframe == (start, start + timedelta(seconds=3*num_pages)))
+    assert(probed["generic_num_samples"] == len(ts["X"].data) == num_pages*300)
+
+def test_stream():
+
+    ts, header = data_loading.load(filename_bin, "GeneActiv")
+    chunks = list(data_loading.stream(filename_bin, "GeneActiv", chunk=timedelta(seconds=4)))
+
+    # 30 seconds of data falls into 8 chunks of 4 seconds
+    assert(len(chunks) == 8)
+
+    for chunk_ts, chunk_header in chunks:
+        assert(chunk_header["chunk_end"] - chunk_header["chunk_start"] == timedelta(seconds=4))
+        for t in chunk_ts["X"].timestamps:
+            assert(chunk_header["chunk_start"] <= t < chunk_header["chunk_end"])
+
+    # Put back together, the chunks are identical to loading the whole file, except that load() also timestamps the end of the last page
+    for name in ["X", "Y", "Z"]:
+        assert(np.array_equal(np.concatenate([c[name].data for c,h in chunks]), ts[name].data))
+
+    assert(np.array_equal(np.concatenate([c["X"].timestamps for c,h in chunks]), ts["X"].timestamps[:-1]))
+
+    offsets = np.cumsum([0] + [len(c["X"].data) for c,h in chunks])
+    assert(np.array_equal(np.concatenate([c["X"].indices + offset for (c,h), offset in zip(chunks, offsets)]), ts["X"].indices[:-1]))
+
+def test_calibrate():
+
+    header_info = dict(("{}_{}".format(axis, key), value) for axis, gain, offset in calibration for key, value in [("gain", gain), ("offset", offset)])
+    page = bin_page(0, start, raw_samples[:300])
+    raw = np.frombuffer(page.split("\r\n")[9].encode(), dtype=np.uint8)
+
+    # Each axis is calibrated with its own gain and offset, however many samples are decoded at a time, and whichever axes are asked for
+    for batch_size in [300000, 7]:
+        samples = data_loading.geneactiv_calibrate(raw, header_info, ["Z", "X", "Y"], batch_size=batch_size)
+        assert(list(samples) == ["Z", "X", "Y"])
+
+        for column, (axis, gain, offset) in enumerate(calibration):
+            assert(np.allclose(samples[axis.upper()], (raw_samples[:300, column]*100.0 - offset) / gain, rtol=0, atol=1e-12))
+
+    samples = data_loading.geneactiv_calibrate(raw, header_info, ["Y"], dtype="native")
+    assert(samples["Y"].dtype == np.int16 and np.array_equal(samples["Y"], raw_samples[:300, 1]))
+
+    # Loading the file applies the calibration in its header
+    ts, header = data_loading.load(filename_bin, "GeneActiv")
+    for column, (axis, gain, offset) in enumerate(calibration):
+        assert(np.allclose(ts[axis.upper()].data, (raw_samples[:, column]*100.0 - offset) / gain, rtol=0, atol=1e-12))
+
+
+test_time_period.setup = setup_func
+test_time_period.teardown = teardown_func
+test_parallel.setup = setup_func
+test_parallel.teardown = teardown_func
+test_index.setup = setup_func
+test_index.teardown = teardown_func
+test_probe.setup = setup_func
+test_probe.teardown = teardown_func
+test_stream.setup = setup_func
+test_stream.teardown = teardown_func
+test_calibrate.setup = setup_func
+test_calibrate.teardown = teardown_func
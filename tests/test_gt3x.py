@@ -0,0 +1,148 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+import tempfile
+import zipfile
+import struct
+import os
+
+start = datetime(2016, 1, 1, 10, 0, 0)
+frequency = 30
+scale = 341.0
+
+directory = tempfile.mkdtemp()
+filename = os.path.join(directory, "participant.gt3x")
+
+def ticks(t):
+    return (t - datetime(1, 1, 1)) // timedelta(microseconds=1) * 10
+
+def record(record_type, t, payload):
+
+    content = struct.pack("<BBIH", 0x1E, record_type, int((t - datetime(1970, 1, 1)).total_seconds()), len(payload)) + payload
+
+    checksum = 0
+    for b in content:
+        checksum ^= b
+
+    return content + bytes([~checksum & 0xFF])
+
+def pack_activity(values):
+    """
+    Pack (X, Y, Z) samples the slow way: 12 bits per value in Y, X, Z order, most significant bit first.
+    """
+
+    bits = "".join(format(v & 0xFFF, "012b") for x, y, z in values for v in [y, x, z])
+    bits += "0" * (-len(bits) % 8)
+
+    return bytes(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
+
+def setup_func():
+
+    rng = np.random.RandomState(7)
+    values = rng.randint(-2048, 2048, size=(10, frequency, 3))
+    values[0,0] = [2047, -2048, -1]
+
+    log = b""
+    for second in range(10):
+
+        t = start + timedelta(seconds=second)
+
+        # A battery record, a USB connection and a gap of 2 seconds of idle sleep
+        if second == 1:
+            log += record(0x02, t, b"\x10\x0e")
+        if second == 2:
+            log += record(0x00, t, b"\x00")
+        if second in [5, 6]:
+            continue
+
+        # The newer record type for the last second
+        if second == 9:
+            log += record(0x1A, t, values[second].astype("<i2").tobytes())
+        else:
+            log += record(0x00, t, pack_activity(values[second]))
+
+    info = "\r\n".join([
+        "Serial Number: MOS2A12345678",
+        "Device Type: wGT3XBT",
+        "Firmware: 1.9.2",
+        "Sample Rate: {}".format(frequency),
+        "Start Date: {}".format(ticks(start)),
+        "Last Sample Time: {}".format(ticks(start + timedelta(seconds=10))),
+        "Acceleration Scale: {}".format(scale)
+    ])
+
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("info.txt", info)
+        archive.writestr("log.bin", log)
+
+    np.save(os.path.join(directory, "values.npy"), values)
+
+def teardown_func():
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+def test_gt3x():
+
+    values = np.load(os.path.join(directory, "values.npy"))
+    seconds = [0, 1, 2, 3, 4, 7, 8, 9]
+
+    ts, header = data_loading.load(filename)
+
+    assert(header["serial_number"] == "MOS2A12345678")
+    assert(header["frequency"] == frequency)
+    assert(header["start_datetime"] == start)
+
+    # Every sample is unpacked, and the seconds without a record are left out
+    for column, axis in enumerate(["X", "Y", "Z"]):
+        assert(np.array_equal(ts[axis].data, values[seconds,:,column].ravel() / scale))
+
+    expected_timestamps = [start + timedelta(seconds=s) + timedelta(microseconds=i*1000000//frequency) for s in seconds for i in range(frequency)]
+    assert(list(ts["X"].timestamps) == expected_timestamps)
+
+    # Native values are the device's own
+    ts_native, header_native = data_loading.load(filename, channels=["Y"], dtype="native")
+    assert(np.array_equal(ts_native["Y"].data, values[seconds,:,1].ravel()))
+    assert(ts_native["Y"].scale_factor == 1/scale)
+
+    # Loading a time period only decodes the seconds that overlap it
+    ts_period, header_period = data_loading.load(filename, time_period=(start + timedelta(seconds=3.5), start + timedelta(seconds=8)))
+    assert(ts_period["X"].timestamps[0] == start + timedelta(seconds=3))
+    assert(ts_period["X"].timestamps[-1] < start + timedelta(seconds=8))
+    assert(np.array_equal(ts_period["Z"].data, values[[3, 4, 7],:,2].ravel() / scale))
+
+    # Streaming decodes the same samples
+    batches = list(data_loading.get_handler("GT3X").batches(filename, "GT3X", batch_size=3)[1])
+    assert(np.array_equal(np.concatenate([b[2]["X"] for b in batches]), ts["X"].data))
+
+
+def test_epochs():
+
+    from pampro import channel_inference
+
+    # Summarising while decoding should give what summarising the loaded channels does
+    ts, header = data_loading.load(filename)
+    vm = channel_inference.infer_vector_magnitude(ts["X"], ts["Y"], ts["Z"])
+    vm.frequency = header["frequency"]
+
+    expected = {}
+    for channel in [channel_inference.infer_enmo(vm), channel_inference.infer_vm_hpf(vm), ts["X"]]:
+        summary = channel.piecewise_statistics(timedelta(seconds=1), [("generic", ["mean"])])
+        expected[summary.channels[0].name] = summary.channels[0]
+
+    epochs, epochs_header = data_loading.load(filename, epoch=timedelta(seconds=1), features=["enmo", "vm_hpf", "x_mean"])
+
+    assert([c.name for c in epochs.channels] == ["ENMO_mean", "VM_HPF_mean", "X_mean"])
+    for channel in epochs.channels:
+        assert(list(channel.timestamps) == list(expected[channel.name].timestamps))
+        assert(np.allclose(channel.data, expected[channel.name].data, rtol=0, atol=1e-9))
+
+    # The seconds without a record leave an epoch without data
+    first = (start - datetime(2016, 1, 1)).seconds
+    assert(list(epochs["X_mean"].data[first+5:first+7]) == [-1, -1])
+
+
+test_gt3x.setup = setup_func
+test_gt3x.teardown = teardown_func
+test_epochs.setup = setup_func
+test_epochs.teardown = teardown_func
@@ -0,0 +1,18 @@
+from pampro import data_loading
+from datetime import datetime, timedelta
+import numpy as np
+
+def test_timestamps():
+
+    start = datetime(2015, 12, 31, 23, 59, 58)
+    timestamps = [start + timedelta(milliseconds=i*33) for i in range(100)]
+    column = np.array([t.strftime("%d/%m/%Y %H:%M:%S.%f")[:-3] for t in timestamps], dtype="S")
+
+    # The bulk parser should agree with converting each timestamp individually
+    converted = data_loading.convert_gt3x_csv_timestamps(column).astype(datetime)
+    assert(list(converted) == [data_loading.convert_actigraph_timestamp(t.decode()) for t in column])
+    assert(list(converted) == timestamps)
+
+    # Timestamps with a different layout fall back to the individual conversion
+    irregular = np.array([b"01/01/2016 00:00:00.5", b"01/01/2016 00:00:01.000"])
+    assert(list(data_loading.convert_gt3x_csv_timestamps(irregular).astype(datetime)) == [datetime(2016,1,1,0,0,0,5000), datetime(2016,1,1,0,0,1)])
@@ -0,0 +1,65 @@
+from pampro import data_loading, hdf5
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2016, 3, 1, 9, 30, 15, 250000)
+directory = tempfile.mkdtemp()
+filename_csv = os.path.join(directory, "walk.csv")
+filename_hdf5 = os.path.join(directory, "walk.hdf5")
+
+def setup_func():
+
+    with open(filename_csv, "w") as f:
+        f.write("time,X,Y\n")
+        for i in range(250):
+            t = start + timedelta(milliseconds=40*i)
+            f.write("{},{},{}\n".format(t.strftime("%d/%m/%Y %H:%M:%S:%f"), i*0.5, -i))
+
+def teardown_func():
+
+    os.remove(filename_csv)
+    os.remove(filename_hdf5)
+
+def test_expand_page_timestamps():
+
+    microseconds = lambda t: (t - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+    # 2 batches of 2 pages of 4 samples, where each page lasts 1 second
+    batches = []
+    for b in range(2):
+        timestamps = np.array([start + timedelta(seconds=2*b + p) for p in range(2)])
+        samples = OrderedDict([("X", np.arange(8) + 8*b)])
+        batches.append((timestamps, np.array([0, 4]), samples, OrderedDict([("Light", np.array([b, b]))])))
+
+    expanded = list(hdf5.expand_page_timestamps(batches))
+
+    # The last page of each batch waits for the next batch, and the final page continues at the same rate
+    sample_times = np.concatenate([t for level, t, d in expanded if level == "samples"])
+    sample_data = np.concatenate([d["X"] for level, t, d in expanded if level == "samples"])
+    page_times = np.concatenate([t for level, t, d in expanded if level == "pages"])
+
+    assert(np.array_equal(sample_data, np.arange(16)))
+    assert(np.array_equal(sample_times, microseconds(start) + np.arange(16) * 250000))
+    assert(np.array_equal(page_times, microseconds(start) + np.arange(4) * 1000000))
+
+def test_convert():
+
+    ts, header = data_loading.load(filename_csv, "CSV")
+    hdf5.convert(filename_csv, filename_hdf5, "CSV")
+
+    # The container loads like one written by save(), with every timestamp kept to the millisecond
+    ts_converted, header_converted = data_loading.load(filename_hdf5, "HDF5", hdf5_group="Raw")
+    header_converted["hdf5_file"].close()
+
+    for name in ["X", "Y"]:
+        assert(np.array_equal(ts_converted[name].data, ts[name].data.astype(np.float32)))
+
+    converted_timestamps = np.array([ts_converted["X"].start + timedelta(milliseconds=int(offset)) for offset in ts_converted["X"].timestamps])
+    assert(np.array_equal(converted_timestamps, ts["X"].timestamps))
+
+
+test_convert.setup = setup_func
+test_convert.teardown = teardown_func
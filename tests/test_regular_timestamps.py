@@ -0,0 +1,79 @@
+from pampro import Channel, Time_Series, data_loading, hdf5
+from datetime import datetime, timedelta
+import numpy as np
+import tempfile
+import os
+
+start = datetime(2016, 5, 1, 9, 59, 58, 500000)
+frequency = 30
+
+directory = tempfile.mkdtemp()
+filename = os.path.join(directory, "regular.hdf5")
+
+# 2 minutes of samples, with a pause of 10.25 seconds after the first minute
+gap_index = 60 * frequency
+gap_start = start + timedelta(seconds=70.25)
+timestamps = Channel.Regular_Timestamps(start, frequency, 2 * 60 * frequency, [(gap_index, gap_start)])
+data = np.arange(len(timestamps), dtype=np.float64) % 7
+
+def teardown_func():
+
+    os.remove(filename)
+
+def test_regular_timestamps():
+
+    full = np.asarray(timestamps)
+
+    # Timestamps are generated to the microsecond, restarting after the gap
+    assert(full[1] == np.datetime64(start + timedelta(microseconds=33333)))
+    assert(full[gap_index] == np.datetime64(gap_start))
+    assert(timestamps[-1] == full[-1])
+    assert(np.array_equal(timestamps[10:20], full[10:20]))
+
+    # Indices are calculated the same as searching the full array, including inside the gap and outside the data
+    for t in [start - timedelta(seconds=1), start, start + timedelta(seconds=1, microseconds=1), start + timedelta(seconds=65), gap_start, full[-1], full[-1] + timedelta(seconds=1)]:
+        assert(timestamps.get_index(t) == np.searchsorted(full, np.datetime64(t, "us")))
+
+    # A full array of such timestamps is recognised
+    recognised = Channel.regular_timestamps(full, frequency)
+    assert(recognised.gaps == [(gap_index, gap_start)])
+
+    # Summarising a regular Channel gives the same as with every timestamp stored
+    regular = Channel.Channel("X")
+    regular.set_contents(data, timestamps)
+    normal = Channel.Channel("X")
+    normal.set_contents(data, full)
+
+    assert(regular.timestamp_policy == "regular")
+    assert(regular.timeframe == normal.timeframe)
+
+    regular_results = regular.piecewise_statistics(timedelta(seconds=5), [("generic", ["mean", "n"])])
+    normal_results = normal.piecewise_statistics(timedelta(seconds=5), [("generic", ["mean", "n"])])
+    for a, b in zip(regular_results.channels, normal_results.channels):
+        assert(np.array_equal(a.data, b.data))
+
+def test_save_regular():
+
+    channel = Channel.Channel("X")
+    channel.set_contents(data, timestamps)
+    ts = Time_Series.Time_Series("")
+    ts.add_channel(channel)
+
+    hdf5.save(ts, filename, groups=[("Raw", ["X"])])
+
+    # Only the start of each run of samples is saved, not a timestamp per sample
+    ts_loaded, header = data_loading.load(filename, "HDF5")
+    f = header["hdf5_file"]
+    assert("timestamps" not in f["Raw"])
+    assert(f["Raw"]["segments"].shape == (2, 2))
+
+    loaded = ts_loaded["X"]
+    f.close()
+
+    assert(loaded.timestamp_policy == "regular")
+    assert(loaded.frequency == frequency)
+    assert(np.array_equal(loaded.data, data))
+    assert(np.array_equal(np.asarray(loaded.timestamps), np.asarray(timestamps)))
+
+
+test_save_regular.teardown = teardown_func
@@ -1,5 +1,5 @@
 
-from pampro import Channel, Time_Series
+from pampro import Channel, Time_Series, Bout
 import numpy as np
 from datetime import datetime, timedelta
 import copy
@@ -99,9 +99,120 @@ def test_timestamp_inference():
         assert(c.infer_timestamp(i) == ts)
 
 
+def test_datetime64_timestamps():
+
+    # Timestamps are stored as datetime64, but timeframe and Bouts stay as datetimes
+    assert(c.timestamps.dtype == np.dtype("datetime64[us]"))
+    assert(c.timeframe == (full_timestamps[0], full_timestamps[-1]))
+    assert(type(c.timeframe[0]) is datetime)
+
+    # Either kind of timestamp can be looked up
+    assert(c.get_data_index(full_timestamps[150]) == 2)
+    assert(c.get_data_index(np.datetime64(full_timestamps[150])) == 2)
+    assert(c.get_data_index(full_timestamps[200]) == 2)
+
+    bout = Bout.Bout(c.timestamps[0], c.timestamps[1])
+    assert(bout.length == timedelta(seconds=1))
+
+    # A bout running to the end of the data finishes 1 sample after the last
+    full = Channel.Channel("")
+    full.set_contents(data, full_timestamps)
+    bouts = full.bouts(1, 1)
+    assert(len(bouts) == 1)
+    assert(bouts[0].start_timestamp == full_timestamps[500])
+    assert(bouts[0].end_timestamp == full_timestamps[-1] + timedelta(seconds=1)/100)
+
+
+def test_set_timestamp_policy():
+
+    sparse = Channel.Channel("")
+    sparse.set_contents(data, sparse_timestamps, timestamp_policy="sparse")
+    sparse.indices = np.array(indices)
+    sparse.frequency = 100
+
+    # Samples are timestamped evenly between their page timestamps
+    converted = sparse.clone()
+    converted.set_timestamp_policy("normal")
+    assert(converted.timestamp_policy == "normal")
+    assert(np.array_equal(converted.timestamps, full_timestamps.astype("datetime64[us]")))
+
+    converted.set_timestamp_policy("offset")
+    assert(converted.start == start)
+    assert(np.array_equal(converted.timestamps, np.arange(len(data)) * 10))
+
+    converted.set_timestamp_policy("regular")
+    assert(converted.timestamps.gaps == [])
+    assert(np.array_equal(np.asarray(converted.timestamps), full_timestamps.astype("datetime64[us]")))
+
+    # 1 second pages, and the last sample
+    converted.set_timestamp_policy("sparse")
+    assert(list(converted.indices) == indices)
+    assert(np.array_equal(converted.timestamps, sparse_timestamps.astype("datetime64[us]")))
+
+    # Every policy finds the same window
+    window = (full_timestamps[250], full_timestamps[750])
+    for policy in ["normal", "offset", "regular", "sparse"]:
+        converted.set_timestamp_policy(policy)
+        assert(converted.get_window(*window) == (250, 750))
+
+
+def test_sparse_index_lookup():
+
+    sparse = Channel.Channel("")
+    sparse.set_contents(data, sparse_timestamps, timestamp_policy="sparse")
+    sparse.indices = np.array(indices)
+    sparse.frequency = 100
+
+    # Every sample's timestamp finds that sample, and a time between samples finds the next one
+    between = full_timestamps[:-1] + timedelta(milliseconds=5)
+    assert(np.array_equal(sparse.get_sparse_data_indices(full_timestamps), np.arange(len(data))))
+    assert(np.array_equal(sparse.get_sparse_data_indices(between), np.arange(1, len(data))))
+    assert([sparse.get_index(t) for t in between] == list(range(1, len(data))))
+
+    # Looking up indices doesn't insert anything
+    assert(len(sparse.timestamps) == 11)
+    assert(list(sparse.indices) == indices)
+
+    # So the same Channel can be summarised by several threads at once
+    from concurrent.futures import ThreadPoolExecutor
+    expected = sparse.piecewise_statistics(timedelta(seconds=0.37), [("generic", ["sum", "n"])]).channels[0].data
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda i: sparse.piecewise_statistics(timedelta(seconds=0.37), [("generic", ["sum", "n"])]).channels[0].data, range(8)))
+    assert(all(np.array_equal(result, expected) for result in results))
+
+
+def test_get_windows():
+
+    sparse = Channel.Channel("")
+    sparse.set_contents(data, sparse_timestamps, timestamp_policy="sparse")
+    sparse.indices = np.array(indices)
+    sparse.frequency = 100
+
+    # Windows that start before, inside and after the data, ending before, inside and after it (scenarios a to f of get_window)
+    first, last = sparse.time_period
+    times = [first - timedelta(seconds=1), first, full_timestamps[123], full_timestamps[500] + timedelta(milliseconds=3), last, last + timedelta(seconds=1)]
+    starts, ends = zip(*[(s, e) for s in times for e in times if s <= e])
+
+    for policy in ["sparse", "normal", "offset", "regular"]:
+
+        sparse.set_timestamp_policy(policy)
+        start_indices, end_indices = sparse.get_windows(starts, ends)
+
+        assert(list(zip(start_indices, end_indices)) == [sparse.get_window(s, e) for s, e in zip(starts, ends)])
+        assert(list(sparse.get_indices(times)) == [-1, 0, 123, 501, 999, -1])
+
+
 test_ensure_timestamped_at.setup = setup_func
 test_ensure_timestamped_at.teardown = teardown_func
 test_piecewise_secondly.setup = setup_func
 test_piecewise_secondly.teardown = teardown_func
 test_timestamp_inference.setup = setup_func
 test_timestamp_inference.teardown = teardown_func
+test_datetime64_timestamps.setup = setup_func
+test_datetime64_timestamps.teardown = teardown_func
+test_set_timestamp_policy.setup = setup_func
+test_set_timestamp_policy.teardown = teardown_func
+test_sparse_index_lookup.setup = setup_func
+test_sparse_index_lookup.teardown = teardown_func
+test_get_windows.setup = setup_func
+test_get_windows.teardown = teardown_func